@@ -0,0 +1,37 @@
+"""Micro-benchmark of the checksum backends on full data segments
+
+Run with: python -m bench.checksum [rounds]
+"""
+import os
+import sys
+import time
+from lib.checksum import CHECKSUMS
+from lib.segment import Segment
+from lib.util import _CRC_TABLE
+
+
+def crc16_bytewise(header, data):
+    """The old byte per byte crc16 loop, kept here as the baseline"""
+    crc = 0xFFFF
+    for b in bytes(header) + bytes(data):
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ b) & 0xFF]
+    return crc
+
+
+def run(rounds=200):
+    """Function to time every backend over `rounds` segments of Segment.DATA_SIZE bytes"""
+    header = os.urandom(Segment.HEADER_SIZE - 2)
+    data = memoryview(os.urandom(Segment.DATA_SIZE))
+    backends = dict(CHECKSUMS, **{"crc16 (byte loop)": crc16_bytewise})
+
+    print(f"{'backend':<20}{'us/segment':>12}{'MB/s':>10}")
+    for name, algorithm in backends.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            algorithm(header, data)
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{name:<20}{elapsed * 1e6:>12.1f}{len(data) / elapsed / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,197 @@
+"""UDP impairment proxy: sits between client and server and drops, delays, duplicates, reorders or corrupts datagrams
+
+Run standalone with: python -m bench.proxy <listen port> <server port> [--loss 0.05] [--delay 0.01] ...
+Client talks to the listen port, every client gets its own upstream socket so the server still sees one
+address per client.
+"""
+import argparse
+import heapq
+import itertools
+import random
+import selectors
+import socket
+import threading
+import time
+
+
+class Impairment:
+    """Class to hold the impairment settings, probabilities are per datagram and per direction"""
+    def __init__(self, loss=0.0, delay=0.0, jitter=0.0, duplicate=0.0, reorder=0.0, reorder_gap=0.01,
+                 corrupt=0.0, mtu=None, seed=None):
+        self.loss = loss
+        # Seconds, every datagram waits delay +- jitter (never below 0)
+        self.delay = delay
+        self.jitter = jitter
+        self.duplicate = duplicate
+        # Reordered datagrams are held reorder_gap seconds longer so the next ones overtake them
+        self.reorder = reorder
+        self.reorder_gap = reorder_gap
+        # One random bit flipped
+        self.corrupt = corrupt
+        # Link MTU, bigger datagrams are dropped like a DF packet would be (no fragmentation)
+        self.mtu = mtu
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __str__(self):
+        return ", ".join(f"{key}={value}" for key, value in vars(self).items() if value)
+
+
+class ImpairmentProxy:
+    """Class to forward datagrams between listen_port and the server through an Impairment"""
+    BUFFER_SIZE = 65536
+
+    def __init__(self, listen_port, server_address, impairment=None, ip="127.0.0.1"):
+        self.ip = ip
+        self.server_address = server_address
+        self.impairment = impairment or Impairment()
+        self.random = random.Random(self.impairment.seed)
+        self.front = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.front.bind((ip, listen_port))
+        self.front.setblocking(False)
+        self.port = self.front.getsockname()[1]
+        # client address -> upstream socket
+        self.upstreams = {}
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.front, selectors.EVENT_READ, None)
+        # (send time, tie breaker, data, socket, destination)
+        self.queue = []
+        self.counter = itertools.count()
+        self.forwarded = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.reordered = 0
+        self.corrupted = 0
+        self.too_big = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Function to run the proxy in a background thread"""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.close()
+
+    def close(self):
+        self.selector.close()
+        self.front.close()
+        for upstream in self.upstreams.values():
+            upstream.close()
+
+    def run(self):
+        """Function to forward datagrams until stop()"""
+        while not self._stop.is_set():
+            timeout = 0.1
+            if self.queue:
+                timeout = min(timeout, max(self.queue[0][0] - time.monotonic(), 0))
+            for key, _ in self.selector.select(timeout):
+                self._read(key.fileobj, key.data)
+            now = time.monotonic()
+            while self.queue and self.queue[0][0] <= now:
+                _, _, data, sock, destination = heapq.heappop(self.queue)
+                try:
+                    sock.sendto(data, destination)
+                    self.forwarded += 1
+                except OSError:
+                    self.dropped += 1
+
+    def _read(self, sock, client_address):
+        while True:
+            try:
+                data, address = sock.recvfrom(ImpairmentProxy.BUFFER_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # ICMP port unreachable from an endpoint that already quit
+                continue
+            if sock is self.front:
+                self._forward(data, self._upstream(address), self.server_address)
+            else:
+                self._forward(data, self.front, client_address)
+
+    def _upstream(self, client_address):
+        upstream = self.upstreams.get(client_address)
+        if upstream is None:
+            upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            upstream.bind((self.ip, 0))
+            upstream.setblocking(False)
+            self.upstreams[client_address] = upstream
+            self.selector.register(upstream, selectors.EVENT_READ, client_address)
+        return upstream
+
+    def _forward(self, data, sock, destination):
+        impairment = self.impairment
+        # 20 byte IP + 8 byte UDP header on top of the payload
+        if impairment.mtu and len(data) + 28 > impairment.mtu:
+            self.too_big += 1
+            return
+        if self.random.random() < impairment.loss:
+            self.dropped += 1
+            return
+        copies = 1
+        if self.random.random() < impairment.duplicate:
+            copies = 2
+            self.duplicated += 1
+        for _ in range(copies):
+            payload = data
+            if data and self.random.random() < impairment.corrupt:
+                payload = bytearray(data)
+                bit = self.random.randrange(len(payload) * 8)
+                payload[bit // 8] ^= 1 << (bit % 8)
+                payload = bytes(payload)
+                self.corrupted += 1
+            delay = impairment.delay
+            if impairment.jitter:
+                delay = max(delay + self.random.uniform(-impairment.jitter, impairment.jitter), 0)
+            if self.random.random() < impairment.reorder:
+                delay += impairment.reorder_gap
+                self.reordered += 1
+            heapq.heappush(self.queue, (time.monotonic() + delay, next(self.counter), payload, sock, destination))
+
+    def stats(self):
+        return {"forwarded": self.forwarded, "dropped": self.dropped, "duplicated": self.duplicated,
+                "reordered": self.reordered, "corrupted": self.corrupted, "too_big": self.too_big}
+
+
+def add_impairment_arguments(parser):
+    """Function to add the --loss / --delay / ... flags shared by the proxy and the benchmark"""
+    parser.add_argument("--loss", type=float, default=0.0, help="drop probability")
+    parser.add_argument("--delay", type=float, default=0.0, help="one way delay (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +- jitter on the delay (seconds)")
+    parser.add_argument("--duplicate", type=float, default=0.0, help="duplication probability")
+    parser.add_argument("--reorder", type=float, default=0.0, help="probability to hold a datagram back")
+    parser.add_argument("--reorder-gap", type=float, default=0.01, help="how long reordered datagrams are held")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="probability to flip one bit")
+    parser.add_argument("--mtu", type=int, help="drop datagrams that don't fit this link MTU (like DF packets)")
+    parser.add_argument("--seed", type=int, help="random seed, same seed gives the same impairment pattern")
+
+
+def impairment_from_args(args):
+    return Impairment(loss=args.loss, delay=args.delay, jitter=args.jitter, duplicate=args.duplicate,
+                      reorder=args.reorder, reorder_gap=args.reorder_gap, corrupt=args.corrupt, mtu=args.mtu,
+                      seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UDP impairment proxy")
+    parser.add_argument("listen_port", type=int)
+    parser.add_argument("server_port", type=int)
+    add_impairment_arguments(parser)
+    args = parser.parse_args()
+
+    proxy = ImpairmentProxy(args.listen_port, ("127.0.0.1", args.server_port), impairment_from_args(args))
+    print(f"[!] Proxy {proxy.ip}:{proxy.port} -> {args.server_port} ({proxy.impairment or 'no impairment'})")
+    try:
+        proxy.run()
+    except KeyboardInterrupt:
+        print(f"\n[!] {proxy.stats()}")
+    finally:
+        proxy.close()
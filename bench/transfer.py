@@ -0,0 +1,182 @@
+"""Scripted server / client runs through the impairment proxy, reports goodput, retransmissions, time and CPU
+
+Run with: python -m bench.transfer [--sizes 64K,1M,8M] [--scenarios clean,loss1,loss5,rough] [--arq gbn,sr]
+    [--repeat N] [--json FILE] [--server-args "..."] [--client-args "..."]
+
+Server and client run as subprocesses (like a real run), so their CPU time comes from the child rusage
+(this includes interpreter startup, so CPU per byte is only meaningful for bigger files).
+Every run uses the same seed, so a scenario drops the same datagrams as long as the protocol sends the same ones.
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from bench.proxy import Impairment, ImpairmentProxy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "clean": Impairment(),
+    "loss1": Impairment(loss=0.01, delay=0.002, seed=1),
+    "loss5": Impairment(loss=0.05, delay=0.005, seed=1),
+    "rough": Impairment(loss=0.02, delay=0.01, jitter=0.005, duplicate=0.01, reorder=0.02, corrupt=0.005, seed=1),
+}
+
+# Seconds before a run counts as failed and both processes are killed
+RUN_TIMEOUT = 300
+
+
+def parse_size(text):
+    """Function to parse "64K" / "8M" / "1G" / "1000" into bytes"""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_file(directory, size):
+    path = os.path.join(directory, f"src_{size}.bin")
+    if not os.path.exists(path):
+        with open(path, "wb") as file:
+            remaining = size
+            while remaining > 0:
+                chunk = os.urandom(min(remaining, 1 << 20))
+                file.write(chunk)
+                remaining -= len(chunk)
+    return path
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_transfer(source, directory, impairment, arq, server_args=(), client_args=()):
+    """Function to send source once through the proxy, returns a result dict"""
+    server_port, client_port = free_port(), free_port()
+    output = os.path.join(directory, "out.bin")
+    if os.path.exists(output):
+        os.remove(output)
+    stats_path = os.path.join(directory, "server_stats.json")
+    if os.path.exists(stats_path):
+        os.remove(stats_path)
+
+    proxy = ImpairmentProxy(0, ("127.0.0.1", server_port), impairment).start()
+    cpu_before = _children_cpu()
+    # Server asks "Listen more?" after the first SYN, the answer is already waiting on stdin
+    server = subprocess.Popen([sys.executable, "server.py", str(server_port), source, "--log-level", "WARNING",
+                               "--stats-file", stats_path, *server_args],
+                              cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server.stdin.write(b"n\n")
+    server.stdin.flush()
+    time.sleep(0.2)
+
+    started = time.monotonic()
+    client = subprocess.Popen([sys.executable, "client.py", str(client_port), str(proxy.port), output, "--arq", arq,
+                               "--log-level", "WARNING", *client_args],
+                              cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    completed = True
+    try:
+        client.wait(RUN_TIMEOUT)
+        elapsed = time.monotonic() - started
+        server.wait(RUN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        completed = False
+        elapsed = time.monotonic() - started
+        client.kill()
+        server.kill()
+        client.wait()
+        server.wait()
+    finally:
+        proxy.stop()
+    cpu = _children_cpu() - cpu_before
+
+    size = os.path.getsize(source)
+    valid = completed and os.path.exists(output) and file_hash(output) == file_hash(source)
+    server_stats = {}
+    if os.path.exists(stats_path):
+        with open(stats_path) as file:
+            server_stats = json.load(file)
+    # Handshake to FIN ACK as seen by the server, wall_time adds interpreter startup and the client's linger
+    clients = server_stats.get("clients") or [{}]
+    completion_time = clients[0].get("elapsed") or elapsed
+    return {
+        "size": size,
+        "arq": arq,
+        "valid": valid,
+        "completion_time": round(completion_time, 4),
+        "wall_time": round(elapsed, 4),
+        "goodput": round(size / completion_time, 1) if valid else 0.0,
+        "retransmission_ratio": server_stats.get("retransmission_ratio"),
+        "segments_sent": server_stats.get("segments_sent"),
+        "retransmissions": server_stats.get("retransmissions"),
+        "cpu_seconds": round(cpu, 4),
+        "cpu_ns_per_byte": round(cpu / size * 1e9, 2) if size else None,
+        "proxy": proxy.stats(),
+    }
+
+
+def run(sizes, scenarios, arqs, repeat=1, server_args=(), client_args=()):
+    """Function to run every size x scenario x arq combination, prints one line per run"""
+    results = []
+    print(f"{'scenario':<8}{'arq':>5}{'size':>11}{'ok':>4}{'time s':>9}{'MB/s':>8}{'retx %':>8}{'cpu ns/B':>10}")
+    with tempfile.TemporaryDirectory(prefix="tcp_over_udp_bench_") as directory:
+        for size in sizes:
+            source = make_file(directory, size)
+            for scenario in scenarios:
+                for arq in arqs:
+                    for _ in range(repeat):
+                        result = run_transfer(source, directory, SCENARIOS[scenario], arq, server_args, client_args)
+                        result["scenario"] = scenario
+                        results.append(result)
+                        ratio = result["retransmission_ratio"]
+                        print(f"{scenario:<8}{arq:>5}{size:>11}{'y' if result['valid'] else 'n':>4}"
+                              f"{result['completion_time']:>9.3f}{result['goodput'] / 1e6:>8.2f}"
+                              f"{ratio * 100 if ratio is not None else float('nan'):>8.2f}"
+                              f"{result['cpu_ns_per_byte']:>10.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TCP over UDP transfer benchmark")
+    parser.add_argument("--sizes", default="64K,1M,8M", help="comma separated file sizes (K/M/G suffix)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--arq", default="gbn,sr", help="comma separated ARQ modes")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--server-args", default="", help="extra server.py flags, e.g. \"--congestion cubic\"")
+    parser.add_argument("--client-args", default="", help="extra client.py flags, e.g. \"--checksum crc32\"")
+    parser.add_argument("--json", metavar="FILE", help="write every result as JSON")
+    args = parser.parse_args()
+
+    unknown = [scenario for scenario in args.scenarios.split(",") if scenario not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    all_results = run([parse_size(size) for size in args.sizes.split(",")], args.scenarios.split(","),
+                      args.arq.split(","), args.repeat, shlex.split(args.server_args), shlex.split(args.client_args))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(all_results, json_file, indent=2)
@@ -1,47 +1,279 @@
+import argparse
+import asyncio
 import os
+import random
+import socket
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from lib.connection import Connection
 from lib.segment import Segment
+from lib.options import encode_options, decode_options
+from lib.rtt import RttEstimator
+from lib.checksum import CHECKSUMS, DEFAULT_CHECKSUM, get_checksum
+from lib.compression import CODECS, decompress
+from lib.ack import DelayedAck
+from lib.trace import EventTrace
+from lib.metrics import TransferMetrics, StatsReporter
+from lib.manifest import ManifestWriter
+from lib.resume import Checkpoint, prefix_hash
+from lib.stripe import RangeWriter, worker_path
+from lib.writer import WriteBehind
+from lib.stream import StreamWriter
+from lib.fec import ParityDecoder
+from lib.integrity import HASHES, DEFAULT_HASH, StreamHasher, decode_digests
+from lib import aio, log, trace, pmtu
+
+_log = log.get_logger("client")
 
 
 class Client:
     """Class to represent Client side"""
-    def __init__(self,port,server_ip,server_port) -> None:
+    # Max out of order segments kept for selective repeat
+    REORDER_BUFFER_SIZE = 64
+    # Max seq nums reported in one SACK
+    MAX_SACK_BLOCKS = 64
+    # Min time (seconds) to keep answering FIN after sending FIN ACK
+    MIN_LINGER = 0.5
+
+    def __init__(self,port,server_ip,server_port,arq=Segment.GO_BACK_N,checksum=DEFAULT_CHECKSUM,
+                 ack_policy=None,trace_path=None,stats_interval=None,stats_path=None,multicast=False,
+                 resume=False,stripe=None,compress=None,writer_thread=False,
+                 segment_size=Segment.MAX_SEGMENT_SIZE,fec=False,verify=None,fetch=None) -> None:
         self.client_port = port
         self.server_ip = server_ip
         self.server_port = server_port
-        self.conn = Connection(self.server_ip,self.client_port)
+        self.arq = arq
+        self.checksum = checksum
+        self.algorithm = get_checksum(checksum)
+        # Biggest datagram we take (mss option), the server's answer after the handshake, then the biggest path MTU
+        # probe we answered (the server settles on that one at most)
+        self.segment_size = segment_size
+        self.probed_size = 0
+        # Codec we ask for, None after the handshake if the server sends raw segments
+        self.compress = compress
+        # Ask for parity segments (fec), fec_decoder rebuilds lost segments if the server agreed
+        self.fec = fec
+        self.fec_decoder = None
+        # Hash we ask for (verify), the hasher exists if the server agreed and sends its digest in the FIN.
+        # verified: None = not checked, bad_ranges: (start, end) bytes to fetch again after a mismatch
+        self.verify = verify
+        self.hasher = None
+        self.verified = None
+        self.bad_ranges = []
+        self.refetch_allowed = False
+        self._fin_ack_data = b""
+        # (start, end) bytes asked for again, the answer lands in stripe_range like a stripe's
+        self.fetch = fetch
+        self.ack_policy = ack_policy or DelayedAck()
+        # Multicast datagrams only reach a socket bound to 0.0.0.0, so bind there when we offer to join
+        self.multicast = multicast
+        self.conn = Connection("" if multicast else self.server_ip,self.client_port)
+        self.rtt = RttEstimator()
+        self.handshake_ack_num = 0
+        # SYN seq num, new for every connection: the server tells a client starting over on the same port from
+        # a late copy of the old SYN. The handshake ACK is seq num + 1, data phase ACKs use 0
+        self.syn_seq_num = random.randrange(1 << 31)
+        self.log = log.connection_logger("client", "Server", (server_ip, server_port))
+        # Events are keyed by our own port, the same port the server's trace uses for us
+        self.trace_path = trace_path
+        self.trace = EventTrace() if trace_path else None
+        self.metrics = TransferMetrics((server_ip, server_port))
+        self.stats = StatsReporter(self.metrics, stats_interval, stats_path, self.log)
+        # Resume: ask to continue from the last checkpoint, the server checks our prefix hash
+        self.resume = resume
+        self.checkpoint = None
+        self.resume_from = None
+        self.resume_hash = None
+        self.resume_offset = 0
+        # Output file writes are gathered by a WriteBehind, optionally written from a background thread
+        self.writer_thread = writer_thread
+        # Single file output and bytes written in order (what the checkpoint records)
+        self.output_path = None
+        self.written = 0
+        # Striped transfer: (index, count) we ask for, the (start, end) bytes the server gives us
+        self.stripe = stripe
+        self.stripe_range = None
+        self.stripe_output = None
+        # Streaming receive: in-order payloads go to sink(bytes) instead of an output file
+        self.sink = None
+        # Server answered but declined the stripe / fetch we need, the connection was reset instead of used
+        self.declined = False
+        self.completed = False
+        # ACKs are packed into one preallocated buffer (header + biggest SACK list) instead of new bytes each time
+        self._ack_segment = Segment()
+        self._ack_buffer = bytearray(Segment.HEADER_SIZE + 4 * Client.MAX_SACK_BLOCKS)
+        self._ack_view = memoryview(self._ack_buffer)
 
     def receive_udp_message(self, path_output):
         """Function used to receive udp message"""
         self.conn.bind()
-        print(f"[!] Client started at {self.server_ip}:{self.client_port}")
+        self.log.info("Client started at %s:%d", self.server_ip, self.client_port)
+        self._load_checkpoint(path_output)
+
+        if self.perform_handshake():
+            self.receive_file(path_output)
+        self.close()
+        if self.bad_ranges and self.refetch_allowed and not self.fetch:
+            self.refetch(path_output)
+
+    def refetch(self, path_output):
+        """Function to fetch the chunks that failed verification again, one connection each (from an
+        ephemeral port, ours is in the server's TIME_WAIT). True once every range arrived and verified"""
+        for start, end in self.bad_ranges:
+            self.log.info("Fetching bytes %d-%d again", start, end)
+            client = self._refetch_client(start, end)
+            client.receive_udp_message(path_output)
+            if not (client.completed and client.verified):
+                self.log.warning("Bytes %d-%d still not verified, %s is corrupt", start, end, path_output)
+                return False
+        self.log.info("Every bad chunk fetched again, %s verified", path_output)
+        self.verified = True
+        self.bad_ranges = []
+        return True
+
+    def _refetch_client(self, start, end):
+        return type(self)(0, self.server_ip, self.server_port, arq=self.arq, checksum=self.checksum,
+                          compress=self.compress, segment_size=self.segment_size, fec=self.fec,
+                          verify=self.verify, fetch=(start, end))
 
-        print(f"[!] [Handshake] (Sending) Broadcast SYN Request to port {self.server_port}")
-        # Initiating handshake... SENDING SYN
-        self.conn.send_syn_segment((self.server_ip, self.server_port))
+    def receive_stream(self, callback):
+        """Function to receive the server's data as in-order chunks passed to callback(bytes), no file written
+
+        Returns True once the whole stream (the FIN) is in. Chunks are segment payloads, a few KB each.
+        """
+        if self.stripe or self.resume:
+            raise ValueError("a stream can't be striped or resumed")
+        self.sink = callback
+        self.receive_udp_message(None)
+        return self.completed
+
+    def close(self):
+        """Function to close the socket and write the final stats / trace"""
+        self.conn.close()
+        self.metrics.finish()
+        self.stats.report()
+        if self.trace is not None:
+            self.trace.dump(self.trace_path)
+        self.log.info("Connection closed.")
+
+    def _load_checkpoint(self, path_output):
+        # No output path (streaming receive), nothing to checkpoint
+        if path_output is None:
+            return
+        self.checkpoint = Checkpoint(path_output)
+        if self.resume:
+            self.resume_from = self.checkpoint.load()
+            if self.resume_from is None:
+                self.log.info("No checkpoint at %s, starting from scratch", self.checkpoint.path)
+            elif self.resume_from[1] > 0:
+                # Hashed once here, not on every SYN retry
+                self.resume_hash = prefix_hash(*self.resume_from)
 
-        print(f"[!] [Handshake] Waiting for response...")
-        # Waiting for SYN-ACK from Server
-        syn_ack_from_server, _ = self.conn.recvfrom()
+    def perform_handshake(self):
+        """Function to do the client side of the handshake, SYN is resent every RTO"""
+        idle_timeout = self.conn.gettimeout()
+        give_up_at = time.monotonic() + idle_timeout
+        retries = 0
+        try:
+            while time.monotonic() < give_up_at:
+                self.log.info("[Handshake] (Sending) Broadcast SYN Request to port %d", self.server_port)
+                # Initiating handshake... SENDING SYN
+                sent_at = time.monotonic()
+                self.conn.send_syn_segment((self.server_ip, self.server_port), self._handshake_options(),
+                                           self.syn_seq_num)
+
+                self.log.info("[Handshake] Waiting for response...")
+                # Waiting for SYN-ACK from Server
+                self.conn.settimeout(max(min(self.rtt.rto, give_up_at - sent_at), 0.001))
+                syn_ack_from_server, _ = self.conn.recvfrom(quiet=True)
+                if not syn_ack_from_server:
+                    self.rtt.backoff()
+                    retries += 1
+                    continue
+
+                if self._on_syn_ack(syn_ack_from_server, None if retries else sent_at):
+                    return not self.declined
+
+            self.log.warning("[Handshake-Error] No SYN ACK from server. Giving up.")
+            return False
+        finally:
+            self.conn.settimeout(idle_timeout)
+
+    def _on_syn_ack(self, syn_ack_from_server, sent_at=None):
+        # SYN ACK received: take the server's options and send the last ACK. sent_at = SYN time for an
+        # RTT sample, None when the SYN was retried (Karn's algorithm)
         # When received kita lakukan unpacking segmentnya, buat ack_numnya dan send the server
-        if syn_ack_from_server:
-            print(f"[!] [Handshake] (Received) SYN ACK from server")
-            syn_ack_segment = Segment()
-            syn_ack_segment.unpack(syn_ack_from_server)
-            if syn_ack_segment.flags == (Segment.SYN | Segment.ACK):
-                ack_num = syn_ack_segment.seq_num + 1
-                print(f"[!] [Handshake] (Sending) Last ACK to server")
-                self.conn.send_ack_segment((self.server_ip, self.server_port), ack_num)
+        self.log.info("[Handshake] (Received) SYN ACK from server")
+        syn_ack_segment = Segment.from_bytes(syn_ack_from_server)
+        if syn_ack_segment.flags != (Segment.SYN | Segment.ACK) or not syn_ack_segment.validate_checksum():
+            self.log.warning("[Handshake-Error] SYN ACK from server is not valid.")
+            return False
+        if sent_at is not None:
+            rtt = time.monotonic() - sent_at
+            self.rtt.sample(rtt)
+            self.metrics.on_rtt(rtt)
+        # Server might not agree to what we asked for
+        options = decode_options(syn_ack_segment.data)
+        self.arq = options.get("arq", Segment.GO_BACK_N)
+        self.checksum = options.get("checksum", DEFAULT_CHECKSUM)
+        self.algorithm = get_checksum(self.checksum)
+        self.compress = options.get("compress")
+        self.segment_size = int(options.get("mss", self.segment_size))
+        self.fec_decoder = ParityDecoder() if "fec" in options else None
+        self.hasher = StreamHasher(options["verify"], int(options.get("chunk", 0))) \
+            if options.get("verify") in HASHES else None
+        self.refetch_allowed = "refetch" in options
+        self.resume_offset = int(options.get("resume", 0)) if self.resume_from else 0
+        if "range" in options:
+            self.stripe_range = tuple(int(value) for value in options["range"].split("-"))
+        if self.resume_from and not self.resume_offset:
+            self.log.info("[Handshake] Server declined to resume, receiving the whole file")
+        if self.verify and self.hasher is None:
+            self.log.warning("[Handshake] Server declined to verify, the data is not checked end to end")
+        if self.multicast and options.get("multicast"):
+            self.log.info("[Handshake] Joining multicast group %s", options["multicast"])
+            self.conn.join_multicast(options["multicast"], self._local_ip())
+        self.handshake_ack_num = syn_ack_segment.seq_num + 1
+        if self.stripe_range is None and ((self.stripe and self.stripe[0] > 0) or self.fetch):
+            # Server would send the whole file (stripe 0 takes that one), reset so it drops this session right away
+            if self.fetch:
+                self.log.warning("Server did not agree to send bytes %d-%d again", *self.fetch)
             else:
-                # Implement retry
-                print(f"[!] [Handshake-Error] SYN ACK from server is not valid.")
+                self.log.warning("Server did not agree to stripe %d/%d, leaving the file to stripe 0", *self.stripe)
+            self.declined = True
+            self.conn.sendto(Segment(ack_num=self.handshake_ack_num, flags=Segment.RST).pack(),
+                             (self.server_ip, self.server_port))
+            return True
+        self.log.info("[Handshake] (Sending) Last ACK to server")
+        self.conn.send_ack_segment((self.server_ip, self.server_port), self.handshake_ack_num,
+                                   self.advertised_window(), self.syn_seq_num + 1)
+        return True
 
-        self.receive_file(path_output)
+    def _handshake_options(self):
+        options = {"arq": self.arq, "checksum": self.checksum, "mss": self.segment_size}
+        if self.compress:
+            options["compress"] = self.compress
+        if self.fec:
+            options["fec"] = 1
+        if self.multicast:
+            options["multicast"] = 1
+        if self.stripe:
+            options["stripe"] = f"{self.stripe[0]}/{self.stripe[1]}"
+        if self.verify:
+            options["verify"] = self.verify
+        if self.fetch:
+            options["fetch"] = f"{self.fetch[0]}-{self.fetch[1]}"
+        if self.resume_hash:
+            options["resume"] = self.resume_from[1]
+            options["resume_hash"] = self.resume_hash
+        return encode_options(options)
 
-        # Close the socket
-        self.conn.close()
-        print("[!] Connection closed.")
+    def _local_ip(self):
+        # Interface that routes to the server, the group is joined there
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.connect((self.server_ip, self.server_port))
+            return probe.getsockname()[0]
 
     def _process_output_path(self, path_output, filename):
         if path_output == "." or path_output == ".." or os.path.isdir(path_output):
@@ -51,89 +283,617 @@ class Client:
 
     def receive_file(self,path_output):
         """Function to receive file"""
-        expected_seq_num = 0
-        last_seq_num = 0
-        # get file metadata
-        while True:
-            segment_data, _ = self.conn.recvfrom()
-            if not segment_data:
-                print("[!] No data received. Ending file reception.")
-                break
-            segment = Segment()
-            segment.unpack(segment_data)
-            valid = segment.validate_checksum()
-            if segment.seq_num == expected_seq_num and valid:
-                if segment.segment_type == Segment.METADATA:
-                    path_output = self._process_output_path(path_output, segment.data.strip(b"\0").decode())
-                    self.send_ack(expected_seq_num)
-                    last_seq_num = expected_seq_num
-                    expected_seq_num += 1
-                    break
-            elif not valid:
-                print(f"[!] Corrupted checksum in segment {expected_seq_num}.")
-                self.send_ack(last_seq_num)
-            else:
-                print(f"[!] Missed segment {expected_seq_num}.")
-                self.send_ack(last_seq_num)
-        with open(path_output, 'wb') as file:
-            while True:
-                segment_data, _ = self.conn.recvfrom()
+        self._start_receive(path_output)
+        try:
+            for segment_data in self._datagrams(self._send_cumulative_ack):
                 if not segment_data:
-                    print("[!] No data received. Ending file reception.")
+                    self.log.warning("No data received. Ending file reception.")
                     break
+                if self._on_datagram(segment_data):
+                    if self.completed:
+                        self._linger(self._expected_seq_num)
+                    break
+        finally:
+            self._finish_receive()
+
+    def _start_receive(self, path_output):
+        # Receive state, kept on the client so datagrams can come from the blocking loop or an event loop
+        self._path_output = path_output
+        self._expected_seq_num = 0
+        self._last_seq_num = 0
+        # Reorder buffer (selective repeat only): seq num -> segment
+        self._buffered = {}
+        self._selective = self.arq == Segment.SELECTIVE_REPEAT
+        self._file = None
 
-                segment = Segment()
-                segment.unpack(segment_data)
-                valid = segment.validate_checksum()
-                if segment.seq_num == expected_seq_num and valid:
-                    if segment.flags & Segment.FIN:
-                        print(f"[!] Received FIN in segment {segment.seq_num}.")
-                        self.send_fin_ack(expected_seq_num+1)
-                        print("[!] End of file transmission. Closing connection.")
-                        break
-
-                    #marker = f"\n===== SEGMENT MARK, NUM = {segment.seq_num} =====\n"
-                    file.write(segment.data)
-                    print("[!] Writing data to file.")
-                    self.send_ack(expected_seq_num)
-                    last_seq_num = expected_seq_num
-                    expected_seq_num += 1
-                elif not valid:
-                    print(f"[!] Corrupted checksum in segment {expected_seq_num}.")
-                    self.send_ack(last_seq_num)
+    def _finish_receive(self):
+        if self.fec_decoder is not None:
+            self.log.info("FEC: %d lost segments rebuilt from parity (%d of %d covered segments missing)",
+                          self.metrics.parity_recovered, self.fec_decoder.missing, self.fec_decoder.covered)
+        if not self.completed and self.output_path is not None:
+            # Interrupted, keep what we have for a later --resume. After a failed write the writer is broken,
+            # only what it got on disk counts
+            try:
+                self._file.flush()
+            except OSError as error:
+                self.log.warning("Writing %s failed: %s", self.output_path, error)
+                self.written = self._file.on_disk
+            self.checkpoint.update(self.output_path, self.written, force=True)
+            self.log.info("Checkpoint saved at %d bytes (%s)", self.written, self.checkpoint.path)
+        if not self.completed:
+            # Stopped before the FIN (interrupt, idle timeout, write error): the server drops the session now
+            # instead of retrying it for MAX_RETRIES, a --resume from this port gets through right away
+            self._send_control(0, Segment.RST)
+        if self._file:
+            try:
+                if isinstance(self._file, ManifestWriter):
+                    # Interrupted: files not reached yet are left out instead of created empty
+                    self._file.close(self.completed)
                 else:
-                    print(segment.segment_type)
-                    print(f"[!] Missed segment {expected_seq_num}.")
-                    self.send_ack(last_seq_num)
+                    self._file.close()
+            except OSError:
+                # Write error of an interrupted transfer, logged with the checkpoint above
+                if self.completed or self.output_path is None:
+                    raise
+
+    def _send_cumulative_ack(self):
+        if self._selective:
+            self.send_sack(self._last_seq_num, self._buffered)
+        else:
+            self.send_ack(self._last_seq_num)
+
+    def _on_datagram(self, segment_data):
+        """Function to handle one datagram of the transfer, True once it is over (FIN answered, or reset)"""
+        buffered = self._buffered
+        selective = self._selective
+        segment = Segment.from_bytes(segment_data)
+        if segment.flags & Segment.SYN and segment.validate_checksum():
+            # SYN ACK again means our last handshake ACK got lost
+            self.conn.send_ack_segment((self.server_ip, self.server_port), self.handshake_ack_num,
+                                       self.advertised_window(), self.syn_seq_num + 1)
+            return False
+        valid = segment.validate_checksum(self.algorithm)
+        if valid:
+            self.metrics.on_received(len(segment.data))
+        else:
+            self.metrics.checksum_failures += 1
+        if self.trace is not None:
+            self.trace.record(trace.RECEIVED if valid else trace.CORRUPT, self.client_port,
+                              segment.seq_num, len(segment.data))
+        if segment.flags & Segment.RST:
+            # Server gave up on the connection (path MTU too small), its reason rides in the data
+            if valid:
+                self.log.warning("Server reset the connection: %s", bytes(segment.data).decode(errors="replace"))
+            return valid
+        if segment.segment_type == Segment.PROBE:
+            # Path MTU probe, its seq num is its size. Answered right away, never part of the file
+            if valid:
+                self._send_control(segment.seq_num, Segment.ACK, Segment.PROBE)
+                # Smaller data segments from now on, the advertised window counts more of them
+                self.probed_size = max(self.probed_size, segment.seq_num)
+                self.segment_size = self.probed_size
+            return False
+        if segment.segment_type == Segment.PARITY:
+            # Never part of the file, it may stand in for one lost segment of its block
+            if valid and self.fec_decoder is not None:
+                self._on_parity(segment)
+            return False
+        if segment.seq_num == self._expected_seq_num and valid:
+            if segment.flags & Segment.FIN:
+                self.log.info("Received FIN in segment %d.", segment.seq_num)
+                if self.hasher is not None:
+                    self._check_digests(segment.data)
+                self.send_fin_ack(self._expected_seq_num+1)
+                self.log.info("End of file transmission. Closing connection.")
+                self.completed = True
+                if self.checkpoint is not None:
+                    self.checkpoint.remove()
+                return True
+
+            self._deliver(segment)
+            self._expected_seq_num += 1
+            # Filling a gap (or the metadata) is ACKed at once, the rest follows the ACK policy
+            immediate = self._expected_seq_num in buffered or segment.segment_type in (Segment.METADATA, Segment.MANIFEST)
+            while self._expected_seq_num in buffered:
+                self._deliver(buffered.pop(self._expected_seq_num))
+                self._expected_seq_num += 1
+            self._last_seq_num = self._expected_seq_num - 1
+            if self.ack_policy.on_in_order() or immediate:
+                self._send_cumulative_ack()
+        elif not valid:
+            self.log.warning("Corrupted checksum in segment %d.", self._expected_seq_num)
+            if not selective and self._expected_seq_num > 0:
+                self.send_ack(self._last_seq_num)
+        elif selective and self._expected_seq_num < segment.seq_num < self._expected_seq_num + Client.REORDER_BUFFER_SIZE \
+                and not segment.flags & Segment.FIN:
+            self.log.debug("Buffering out of order segment %d. Expected: %d", segment.seq_num, self._expected_seq_num)
+            if self.trace is not None:
+                self.trace.record(trace.OUT_OF_ORDER, self.client_port, segment.seq_num, self._expected_seq_num)
+            if segment.seq_num in buffered:
+                self.metrics.duplicates += 1
+            else:
+                self.metrics.out_of_order += 1
+            # The datagram is a view into a receive buffer that gets reused, keep our own copy
+            segment.data = bytes(segment.data)
+            buffered[segment.seq_num] = segment
+            if self.fec_decoder is not None:
+                # The block's parity may still fill the gap, SACK on the delayed ACK timer instead of at once
+                self.ack_policy.on_out_of_order()
+            else:
+                self.send_sack(self._last_seq_num if self._expected_seq_num > 0 else None, buffered)
+        elif selective and segment.seq_num < self._expected_seq_num:
+            # Retransmission of something we already have, our ACK got lost
+            self.metrics.duplicates += 1
+            self.send_sack(self._last_seq_num, buffered)
+        else:
+            if segment.seq_num < self._expected_seq_num:
+                self.metrics.duplicates += 1
+            else:
+                self.metrics.out_of_order += 1
+            self.log.debug("Missed segment %d.", self._expected_seq_num)
+            if self.trace is not None:
+                self.trace.record(trace.OUT_OF_ORDER, self.client_port, segment.seq_num, self._expected_seq_num)
+            # Nothing in order yet (metadata lost), let the sender's RTO resend it
+            if self._expected_seq_num > 0:
+                self.send_ack(self._last_seq_num)
+        return False
+
+    def _check_digests(self, fin_data):
+        # Server's digests ride in the FIN, ours goes back in the FIN ACK (and its retransmissions)
+        digest, chunks = decode_digests(fin_data)
+        self._fin_ack_data = self.hasher.digest()
+        if not digest:
+            self.log.warning("Server sent no %s digest, data not verified", self.hasher.name)
+            return
+        self.verified = digest == self._fin_ack_data
+        if self.verified:
+            self.log.info("Verified %d bytes (%s %s)", self.hasher.length, self.hasher.name, digest.hex())
             return
+        start = self.stripe_range[0] if self.stripe_range else self.resume_offset
+        self.bad_ranges = self.hasher.bad_ranges(chunks, start)
+        if self.bad_ranges:
+            self.log.warning("%s mismatch, bad bytes: %s", self.hasher.name,
+                             ", ".join(f"{start}-{end}" for start, end in self.bad_ranges))
+            if not self.refetch_allowed:
+                self.log.warning("Server does not stay up to send them again, receive the file again")
+        else:
+            self.log.warning("%s mismatch and no chunk digests to find it, receive the file again",
+                             self.hasher.name)
+
+    def _deliver(self, segment):
+        # In order segment into the output, FEC keeps a copy for the blocks still open
+        self._file = self._write_segment(self._file, segment, self._path_output)
+        if self.fec_decoder is not None:
+            self.fec_decoder.keep(segment)
+
+    def _on_parity(self, parity):
+        recovered = self.fec_decoder.recover(parity, self._expected_seq_num, self._buffered)
+        # Loss report for the server's block size: covered segments (seq num), missing ones (ack num)
+        self._send_control(self.fec_decoder.missing, 0, Segment.PARITY, seq_num=self.fec_decoder.covered)
+        if recovered is not None:
+            self.log.debug("[Num=%d] Rebuilt from parity.", recovered.seq_num)
+            self.metrics.parity_recovered += 1
+            # Handled like the segment had arrived (its retransmission, if any, is a duplicate then)
+            self._on_datagram(recovered.pack(self.algorithm))
+
+    def _datagrams(self, send_cumulative_ack):
+        # Datagrams one by one, but pulled from the socket in batches (recvmmsg). None on idle timeout.
+        # Waiting is cut short when the delayed ACK timer fires
+        idle_timeout = self.conn.gettimeout()
+        idle_deadline = time.monotonic() + idle_timeout
+        while True:
+            self.conn.settimeout(max(self._wait_until(idle_deadline) - time.monotonic(), 0))
+            try:
+                received = self.conn.recv_batch(quiet=True)
+            finally:
+                self.conn.settimeout(idle_timeout)
+
+            now = time.monotonic()
+            self.stats.poll(now)
+            if not received:
+                if self.ack_policy.due(now):
+                    send_cumulative_ack()
+                    continue
+                if now < idle_deadline:
+                    continue
+                self.log.info("Socket timed out")
+                yield None
+                return
 
+            idle_deadline = now + idle_timeout
+            for segment_data, _ in received:
+                yield segment_data
+
+    def _wait_until(self, idle_deadline):
+        # Next time something is due without any datagram: delayed ACK, stats report or the idle timeout
+        wait_until = idle_deadline
+        for deadline in (self.ack_policy.deadline, self.stats.deadline()):
+            if deadline is not None:
+                wait_until = min(wait_until, deadline)
+        return wait_until
+
+    def _write_segment(self, file, segment, path_output):
+        # Segment 0 isinya metadata (nama file), sisanya data file
+        if segment.segment_type == Segment.METADATA:
+            if self.sink is not None:
+                self.log.info("Receiving %s as a stream", bytes(segment.data).strip(b"\0").decode())
+                return StreamWriter(self.sink)
+            if self.stripe_range:
+                # Every stripe writes its own bytes of the same file
+                self.stripe_output = self._process_output_path(path_output,
+                                                               bytes(segment.data).strip(b"\0").decode())
+                return RangeWriter(self.stripe_output, self.stripe_range[0])
+            if self.resume_offset:
+                # Server starts right after our checkpoint, keep the prefix and drop anything past it
+                self.output_path, self.written = self.resume_from[0], self.resume_offset
+                self.log.info("Resuming %s from byte %d", self.output_path, self.written)
+                file = open(self.output_path, 'r+b', buffering=0)
+                file.seek(self.written)
+                file.truncate()
+                return WriteBehind(file, threaded=self.writer_thread)
+            self.output_path = self._process_output_path(path_output, bytes(segment.data).strip(b"\0").decode())
+            return WriteBehind(open(self.output_path, 'wb', buffering=0), threaded=self.writer_thread)
+        # Multi-file: manifest segments first, path_output jadi direktori tujuan
+        if segment.segment_type == Segment.MANIFEST:
+            if self.sink is not None:
+                raise ValueError("the server sends several files, they need an output directory, not a stream")
+            if file is None:
+                file = ManifestWriter(path_output, self.log)
+            file.add_manifest(segment.data)
+            return file
+        data = segment.data
+        if segment.flags & Segment.COMPRESSED:
+            # A segment never holds more than its payload size of the file
+            data = decompress(self.compress, data, self.segment_size - Segment.HEADER_SIZE)
+        file.write(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        self.log.debug("Writing data to file.")
+        if self.output_path is not None:
+            self.written += len(data)
+            self.checkpoint.update(self.output_path, self.written, file)
+        return file
+
+    def _linger(self, fin_seq_num):
+        # Stay around a bit to answer FIN retransmissions in case our FIN ACK got lost
+        idle_timeout = self.conn.gettimeout()
+        linger_until = time.monotonic() + self._linger_time()
+        try:
+            while time.monotonic() < linger_until:
+                self.conn.settimeout(linger_until - time.monotonic())
+                segment_data, _ = self.conn.recvfrom(quiet=True)
+                if not segment_data:
+                    break
+                self._answer_fin(segment_data, fin_seq_num)
+        finally:
+            self.conn.settimeout(idle_timeout)
+
+    def _linger_time(self):
+        return max(2 * self.rtt.rto, Client.MIN_LINGER)
+
+    def _answer_fin(self, segment_data, fin_seq_num):
+        # Only the header matters here
+        seq_num, _, flags, _, _, _ = Segment.unpack_header(segment_data)
+        if flags & Segment.FIN and seq_num == fin_seq_num:
+            self.send_fin_ack(fin_seq_num+1)
+
+    def advertised_window(self):
+        """Function to get how many segments past the last ACK we can take in"""
+        if self.arq == Segment.SELECTIVE_REPEAT:
+            return Client.REORDER_BUFFER_SIZE
+        # Go-back-N drops everything out of order, so only the socket buffer counts, in segments of the negotiated
+        # (or probed) size
+        return min(max(self.conn.receive_buffer_size() // self.segment_size, 1), 0xFFFF)
 
     def send_ack(self,ack_num):
         """Function used to send ACK"""
-        ack_segment = Segment(ack_num=ack_num, flags=Segment.ACK)
-        self.conn.sendto(ack_segment.pack(), (self.server_ip, self.server_port))
-        print(f"[!] Sending ACK for segment {ack_num}.")
+        self.ack_policy.sent()
+        self.metrics.acks_sent += 1
+        window = self._send_control(ack_num, Segment.ACK)
+        self.log.debug("Sending ACK for segment %d.", ack_num)
+        if self.trace is not None:
+            self.trace.record(trace.ACK_SENT, self.client_port, ack_num, window)
+
+    def send_sack(self,ack_num,buffered):
+        """Function used to send cumulative ACK plus the out of order segments we hold"""
+        self.ack_policy.sent()
+        self.metrics.acks_sent += 1
+        # ack_num None berarti belum ada segment in order, jadi ACK flag nggak dinyalain
+        flags = Segment.ACK if ack_num is not None else 0
+        window = self._send_control(ack_num or 0, flags, Segment.SACK,
+                                    Segment.encode_sack(sorted(buffered)[:Client.MAX_SACK_BLOCKS]))
+        self.log.debug("Sending SACK for segment %s with %d buffered.", ack_num, len(buffered))
+        if self.trace is not None:
+            self.trace.record(trace.ACK_SENT, self.client_port, ack_num or 0, window)
 
     def send_fin_ack(self,ack_num):
         """Function used to send FIN ACK"""
-        ack_segment = Segment(ack_num=ack_num, flags=Segment.FIN|Segment.ACK)
-        self.conn.sendto(ack_segment.pack(), (self.server_ip, self.server_port))
-        print(f"[!] Sending FIN ACK for segment {ack_num}.")
+        self._send_control(ack_num, Segment.FIN|Segment.ACK, data=self._fin_ack_data)
+        self.log.info("Sending FIN ACK for segment %d.", ack_num)
+
+    def _send_control(self, ack_num, flags, segment_type=0, data=b"", seq_num=0):
+        # Reuses the one ACK Segment and buffer, returns the advertised window
+        segment = self._ack_segment
+        segment.seq_num = seq_num
+        segment.ack_num = ack_num
+        segment.flags = flags
+        segment.segment_type = segment_type
+        segment.window = self.advertised_window()
+        segment.data = data
+        length = segment.pack_into(self._ack_buffer, 0, self.algorithm)
+        self.conn.sendto(self._ack_view[:length], (self.server_ip, self.server_port))
+        return segment.window
+
+class AsyncClient(Client):
+    """Class to receive from an asyncio event loop: await connect() then receive_file(), close() at the end
+
+    Same receive path as Client (_on_datagram per segment), but datagrams come from lib.aio.ReceiverProtocol
+    and the SYN, delayed ACK and idle timers are loop timers, so many clients can share one loop.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.protocol = None
+
+    async def connect(self, path_output=None):
+        """Function to bind and do the handshake (SYN resent every RTO), True once the server answered
+        (False if it declined the stripe / fetch we asked for)
+
+        path_output only matters with resume, the checkpoint next to it goes into the SYN.
+        """
+        loop = asyncio.get_running_loop()
+        idle_timeout = self.conn.gettimeout()
+        self.conn.bind()
+        self.log.info("Client started at %s:%d", self.server_ip, self.client_port)
+        _, self.protocol = await loop.create_datagram_endpoint(aio.ReceiverProtocol, sock=self.conn.socket)
+        self.conn = aio.DatagramConnection(self.protocol.transport, idle_timeout)
+        if path_output is not None:
+            self._load_checkpoint(path_output)
+
+        give_up_at = time.monotonic() + idle_timeout
+        retries = 0
+        while time.monotonic() < give_up_at:
+            self.log.info("[Handshake] (Sending) Broadcast SYN Request to port %d", self.server_port)
+            sent_at = time.monotonic()
+            self.conn.send_syn_segment((self.server_ip, self.server_port), self._handshake_options(),
+                                       self.syn_seq_num)
+            self.log.info("[Handshake] Waiting for response...")
+            try:
+                syn_ack_from_server = await asyncio.wait_for(self.protocol.next_datagram(),
+                                                             max(min(self.rtt.rto, give_up_at - sent_at), 0.001))
+            except asyncio.TimeoutError:
+                self.rtt.backoff()
+                retries += 1
+                continue
+            if self._on_syn_ack(syn_ack_from_server, None if retries else sent_at):
+                return not self.declined
+        self.log.warning("[Handshake-Error] No SYN ACK from server. Giving up.")
+        return False
+
+    async def receive_file(self, path_output):
+        """Function to receive the file after connect(), returns True once the FIN is in"""
+        loop = asyncio.get_running_loop()
+        if self.checkpoint is None and path_output is not None:
+            self.checkpoint = Checkpoint(path_output)
+        self._start_receive(path_output)
+        finished = loop.create_future()
+        idle_timeout = self.conn.gettimeout()
+        last_received = time.monotonic()
+
+        def on_datagram(segment_data):
+            nonlocal last_received
+            last_received = time.monotonic()
+            if finished.done():
+                return
+            try:
+                if self._on_datagram(segment_data):
+                    finished.set_result(True)
+                    return
+            except Exception as error:
+                # Raised in the protocol callback it would only be logged by the loop, hand it to the caller
+                finished.set_exception(error)
+                return
+            timer.arm(self._wait_until(last_received + idle_timeout))
+
+        def on_timer():
+            now = time.monotonic()
+            self.stats.poll(now)
+            if self.ack_policy.due(now):
+                self._send_cumulative_ack()
+            if now >= last_received + idle_timeout:
+                self.log.info("Socket timed out")
+                self.log.warning("No data received. Ending file reception.")
+                if not finished.done():
+                    finished.set_result(False)
+                return
+            timer.arm(self._wait_until(last_received + idle_timeout))
+
+        timer = aio.Timer(loop, on_timer)
+        timer.arm(self._wait_until(last_received + idle_timeout))
+        self.protocol.set_handler(on_datagram)
+        try:
+            if await finished and self.completed:
+                # Stay around a bit to answer FIN retransmissions in case our FIN ACK got lost
+                fin_seq_num = self._expected_seq_num
+                self.protocol.set_handler(lambda segment_data: self._answer_fin(segment_data, fin_seq_num))
+                await asyncio.sleep(self._linger_time())
+        finally:
+            timer.cancel()
+            self.protocol.set_handler(None)
+            self._finish_receive()
+        return self.completed
+
+    async def refetch(self, path_output):
+        """Function to fetch the chunks that failed verification again after receive_file(), like Client.refetch"""
+        for start, end in self.bad_ranges:
+            self.log.info("Fetching bytes %d-%d again", start, end)
+            client = self._refetch_client(start, end)
+            try:
+                if await client.connect():
+                    await client.receive_file(path_output)
+            finally:
+                client.close()
+            if not (client.completed and client.verified):
+                self.log.warning("Bytes %d-%d still not verified, %s is corrupt", start, end, path_output)
+                return False
+        self.log.info("Every bad chunk fetched again, %s verified", path_output)
+        self.verified = True
+        self.bad_ranges = []
+        return True
+
+    async def receive_stream(self, callback):
+        """Function to receive after connect() into callback(bytes) (in-order chunks), True once the FIN is in"""
+        if self.stripe or self.resume:
+            raise ValueError("a stream can't be striped or resumed")
+        self.sink = callback
+        return await self.receive_file(None)
+
+    async def chunks(self):
+        """Function to receive after connect() as an async iterator: async for chunk in client.chunks()
+
+        Chunks wait in memory until the consumer takes them. ConnectionError at the end if the server went
+        quiet before the FIN, so a cut stream never looks complete.
+        """
+        queue = asyncio.Queue()
+        receiving = asyncio.ensure_future(self.receive_stream(queue.put_nowait))
+        # None marks the end, also when receiving failed
+        receiving.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+            if not await receiving:
+                raise ConnectionError("stream ended before the server's FIN")
+        finally:
+            receiving.cancel()
+
+
+def client_from_args(args, ip, index=0, stripe=None, client_class=Client):
+    """Function to build a Client from the command line, stripe workers use port + index on both ends"""
+    return client_class(args.client_port + index,ip,args.broadcast_port + index,arq=args.arq,checksum=args.checksum,
+                  ack_policy=DelayedAck(args.ack_every, args.ack_delay),trace_path=worker_path(args.trace, index),
+                  stats_interval=args.stats_interval,stats_path=worker_path(args.stats_file, index),
+                  multicast=args.multicast,resume=args.resume,stripe=stripe,compress=args.compress,
+                  writer_thread=args.writer_thread,segment_size=args.segment_size,fec=args.fec,verify=args.verify)
+
+
+async def receive_async(client, path_output):
+    """Function to run an AsyncClient from the command line (--asyncio), - streams to stdout"""
+    try:
+        if path_output == "-":
+            if await client.connect():
+                await client.receive_stream(sys.stdout.buffer.write)
+                sys.stdout.buffer.flush()
+        elif await client.connect(path_output):
+            await client.receive_file(path_output)
+            if client.bad_ranges and client.refetch_allowed:
+                await client.refetch(path_output)
+    finally:
+        client.close()
+
+
+def receive_stripe(index, ip, args):
+    """Function to receive one stripe in a worker process, returns (output path, (start, end), completed)"""
+    log.setup(args.log_level)
+    client = client_from_args(args, ip, index, (index, args.stripes))
+    client.receive_udp_message(args.path_output)
+    # A stripe that failed verification (and its re-fetch) counts as not completed
+    return client.stripe_output, client.stripe_range, client.completed and client.verified is not False
+
+
+def receive_striped(ip, args):
+    """Function to receive one file as args.stripes byte ranges in parallel, one process (and port) each"""
+    count = args.stripes
+    with ProcessPoolExecutor(count) as pool:
+        results = list(pool.map(receive_stripe, range(count), [ip] * count, [args] * count))
+
+    if results[0][1] is None:
+        # Server didn't stripe, stripe 0 got the whole file
+        _log.info("Server sent the whole file to stripe 0")
+        return results[0][2]
+    failed = [index for index, (_, _, completed) in enumerate(results) if not completed]
+    if failed:
+        _log.warning("Stripe(s) %s did not complete (or verify), the output file has holes", ", ".join(map(str, failed)))
+        return False
+    # An older, longer file at the output path would keep its tail otherwise
+    output = results[0][0]
+    os.truncate(output, max(end for _, (_, end), _ in results))
+    _log.info("All %d stripes received into %s", count, output)
+    return True
+
 
 if __name__ == "__main__":
     DEFAULT_IP_ADDRESS = "127.0.0.1"
 
-    if len(sys.argv) != 4:
-        print("Format: python client.py <client port> [broadcast port] [path output]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="TCP over UDP file receiver")
+    parser.add_argument("client_port", type=int)
+    parser.add_argument("broadcast_port", type=int)
+    parser.add_argument("path_output", help="output file or directory, - to write the received data to stdout")
+    parser.add_argument("--arq", choices=[Segment.GO_BACK_N, Segment.SELECTIVE_REPEAT], default=Segment.GO_BACK_N,
+                        help="retransmission mode to ask the server for")
+    parser.add_argument("--checksum", choices=list(CHECKSUMS), default=DEFAULT_CHECKSUM,
+                        help="checksum to ask the server for")
+    parser.add_argument("--compress", choices=list(CODECS),
+                        help="ask the server to compress segment payloads (sent raw when a segment doesn't shrink)")
+    parser.add_argument("--ack-every", type=int, default=DelayedAck.DEFAULT_EVERY,
+                        help="ACK after this many in order segments (1 = ACK every segment)")
+    parser.add_argument("--ack-delay", type=float, default=DelayedAck.DEFAULT_DELAY,
+                        help="max seconds an in order segment waits for its ACK")
+    parser.add_argument("--log-level", choices=log.LEVELS, default="INFO",
+                        help="DEBUG prints every segment, slow on big files")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write a binary event trace (read it with python -m lib.trace FILE)")
+    parser.add_argument("--multicast", action="store_true",
+                        help="join the server's multicast group if it offers one (fan-out mode)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted transfer from its checkpoint (<path output>.resume)")
+    parser.add_argument("--segment-size", type=int, default=Segment.MAX_SEGMENT_SIZE, metavar="BYTES",
+                        help="largest datagram to ask the server for (header included)")
+    parser.add_argument("--fec", action="store_true",
+                        help="ask for XOR parity segments that rebuild lost segments without a retransmission "
+                             "(selective repeat, redundancy adapts to the loss rate)")
+    parser.add_argument("--verify", nargs="?", const=DEFAULT_HASH, choices=list(HASHES),
+                        help="check the data end to end against the server's digest (default sha256), chunks "
+                             "that don't match are fetched again")
+    parser.add_argument("--writer-thread", action="store_true",
+                        help="write the output file from a background thread (gathered 1 MB writes either way)")
+    parser.add_argument("--stripes", type=int, default=1,
+                        help="receive the file as N byte ranges in parallel processes, stripe i uses both ports + i "
+                             "(server needs --daemon --workers N)")
+    parser.add_argument("--stats-interval", type=float, metavar="S",
+                        help="log a stats line (and rewrite --stats-file) every S seconds")
+    parser.add_argument("--stats-file", metavar="FILE",
+                        help="JSON snapshot of the transfer counters, rewritten on every report")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="receive through the asyncio transport (AsyncClient) instead of the blocking loop")
+    args = parser.parse_args()
+    streaming = args.path_output == "-"
+    # stdout carries the data, logs go to stderr
+    log.setup(args.log_level, sys.stderr if streaming else None)
+    if streaming and (args.resume or args.stripes > 1):
+        parser.error("- (stdout) can't be combined with --resume / --stripes")
+    if not pmtu.BASE_SIZE <= args.segment_size <= Connection.MAX_DATAGRAM_SIZE:
+        parser.error(f"--segment-size must be between {pmtu.BASE_SIZE} and {Connection.MAX_DATAGRAM_SIZE}")
+    if args.stripes < 1 or (args.stripes > 1 and (args.resume or args.multicast)):
+        parser.error("--stripes needs at least 1 stripe and can't be combined with --resume / --multicast")
+    if args.asyncio and args.stripes > 1:
+        parser.error("--asyncio receives one stream, not --stripes")
 
-    try:
-        CLIENT_PORT = int(sys.argv[1])
-        BROADCAST_PORT = int(sys.argv[2])
-    except ValueError:
-        print("Error: Port number must be an integer.")
-        sys.exit(1)
-
-    PATH_OUTPUT = sys.argv[3]
-    client = Client(CLIENT_PORT,DEFAULT_IP_ADDRESS,BROADCAST_PORT)
-    client.receive_udp_message(PATH_OUTPUT)
+    if args.stripes > 1:
+        receive_striped(DEFAULT_IP_ADDRESS, args)
+    elif args.asyncio:
+        asyncio.run(receive_async(client_from_args(args, DEFAULT_IP_ADDRESS, client_class=AsyncClient),
+                                  args.path_output))
+    elif streaming:
+        client = client_from_args(args, DEFAULT_IP_ADDRESS)
+        try:
+            client.receive_stream(sys.stdout.buffer.write)
+        except ValueError as error:
+            _log.error("%s", error)
+            sys.exit(1)
+        finally:
+            sys.stdout.buffer.flush()
+    else:
+        client = client_from_args(args, DEFAULT_IP_ADDRESS)
+        client.receive_udp_message(args.path_output)
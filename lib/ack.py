@@ -0,0 +1,40 @@
+"""Receiver side ACK coalescing (delayed / cumulative ACK)"""
+import time
+
+
+class DelayedAck:
+    """Class to decide when the receiver sends its cumulative ACK
+
+    In order segments are ACKed every `every` segments or `delay` seconds after the first
+    unACKed one, whichever comes first. Gaps, retransmissions and FIN are ACKed at once by
+    the caller, which then calls sent().
+    """
+    DEFAULT_EVERY = 2
+    # Has to stay well below the sender's minimum RTO
+    DEFAULT_DELAY = 0.04
+
+    def __init__(self, every=DEFAULT_EVERY, delay=DEFAULT_DELAY):
+        self.every = max(every, 1)
+        self.delay = delay
+        self.pending = 0
+        self.deadline = None
+
+    def on_in_order(self):
+        """Function to count one in order segment, True if the ACK should go out now"""
+        self.pending += 1
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.delay
+        return self.pending >= self.every
+
+    def on_out_of_order(self):
+        """Function to have an ACK go out within delay without counting a segment (gap FEC may still fill)"""
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.delay
+
+    def due(self, now):
+        return self.deadline is not None and now >= self.deadline
+
+    def sent(self):
+        """Function to reset the counter after any ACK went out"""
+        self.pending = 0
+        self.deadline = None
@@ -0,0 +1,61 @@
+"""Admission control for the daemon server: concurrent client limit, SYN queue and TIME-WAIT"""
+import time
+from collections import OrderedDict
+
+
+class AdmissionQueue:
+    """Class to decide which SYNs become sessions, extra clients wait in a bounded FIFO"""
+    DEFAULT_MAX_CLIENTS = 16
+    DEFAULT_QUEUE_DEPTH = 64
+    # Seconds a closed client's SYN seq num is ignored, so a late duplicate SYN doesn't start the transfer again
+    # (a new connection from the same address has a new seq num and gets in)
+    TIME_WAIT = 5.0
+    # Seconds a queued SYN stays valid, the client gives up after its idle timeout anyway
+    QUEUE_TIMEOUT = 30.0
+
+    def __init__(self, max_clients=DEFAULT_MAX_CLIENTS, queue_depth=DEFAULT_QUEUE_DEPTH):
+        self.max_clients = max_clients
+        self.queue_depth = queue_depth
+        # client address -> (seq num, requested options, queued at)
+        self.pending = OrderedDict()
+        # client address -> (SYN seq num of the closed connection, closed at)
+        self.time_wait = {}
+        self.rejected = 0
+
+    def request(self, client_address, seq_num, options, now=None):
+        """Function to queue a SYN, returns False if it was a duplicate, too late or the queue is full"""
+        now = now if now is not None else time.monotonic()
+        closed_seq_num, closed_at = self.time_wait.get(client_address, (None, None))
+        if closed_seq_num == seq_num and now - closed_at < AdmissionQueue.TIME_WAIT:
+            return False
+        if client_address in self.pending:
+            # Client retrying its SYN while waiting, or starting over (new seq num): keeps its place in the queue
+            if self.pending[client_address][0] != seq_num:
+                self.pending[client_address] = (seq_num, options, now)
+            return False
+        if len(self.pending) >= self.queue_depth:
+            self.rejected += 1
+            return False
+        self.pending[client_address] = (seq_num, options, now)
+        return True
+
+    def admit(self, active, now=None):
+        """Function to pop the queued clients that fit next to `active` running sessions"""
+        now = now if now is not None else time.monotonic()
+        admitted = []
+        while self.pending and active + len(admitted) < self.max_clients:
+            client_address, (seq_num, options, queued_at) = self.pending.popitem(last=False)
+            if now - queued_at < AdmissionQueue.QUEUE_TIMEOUT:
+                admitted.append((client_address, seq_num, options))
+        return admitted
+
+    def release(self, client_address, seq_num, now=None):
+        """Function to mark a client's session (opened by the SYN with seq_num) as finished"""
+        now = now if now is not None else time.monotonic()
+        self.time_wait[client_address] = (seq_num, now)
+        for address in [address for address, (_, closed_at) in self.time_wait.items()
+                        if now - closed_at >= AdmissionQueue.TIME_WAIT]:
+            del self.time_wait[address]
+
+    def __len__(self):
+        return len(self.pending)
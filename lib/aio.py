@@ -0,0 +1,195 @@
+"""asyncio transport: server sessions and the client receive path driven by an event loop
+
+The protocol logic is the same ServerSession / Client code the blocking loops use, only where datagrams
+come from and how timers fire changes: datagrams arrive through a DatagramProtocol, retransmission and
+delayed ACK timers are loop.call_later handles. One loop can run any number of transfers, no threads.
+"""
+import asyncio
+import collections
+import time
+from lib.connection import Connection, Sender
+from lib.segment import Segment
+from lib.session import ServerSession
+from lib.options import decode_options
+from lib import log
+
+_log = log.get_logger("aio")
+
+
+class DatagramConnection(Sender):
+    """Class to give sessions and the client the send side (Sender) on top of an asyncio DatagramTransport
+
+    Receiving is the protocol's job, there is no bind / recvfrom / recv_batch here.
+    """
+    def __init__(self, transport, timeout=Connection.DEFAULT_TIMEOUT):
+        self.transport = transport
+        # asyncio's socket wrapper, still good for setsockopt / getsockopt (DF, multicast, buffer size)
+        self.socket = transport.get_extra_info("socket")
+        self.ip, self.port = transport.get_extra_info("sockname")[:2]
+        self.timeout = timeout
+
+    def sendto(self, message, addr):
+        # Data the transport can't send right away is copied into its buffer, reused buffers are safe
+        self.transport.sendto(message, addr)
+
+    def send_batch(self, messages, addr):
+        # No sendmmsg / sendmsg through a transport, (header, payload) pairs become one datagram each
+        for message in messages:
+            self.transport.sendto(b"".join(message) if isinstance(message, (list, tuple)) else message, addr)
+
+    def sendmsg(self, buffers, addr):
+        self.transport.sendto(b"".join(buffers), addr)
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def close(self):
+        self.transport.close()
+
+
+class Timer:
+    """Class to run callback at a time.monotonic() deadline through loop.call_later
+
+    arm() only reschedules when the deadline moves earlier. A later deadline (every ACK pushes the RTO
+    out) is picked up by the callback, which finds nothing due yet and arms again, so there is no
+    cancel + call_later per datagram.
+    """
+    def __init__(self, loop, callback):
+        self.loop = loop
+        self.callback = callback
+        self.deadline = None
+        self._handle = None
+
+    def arm(self, deadline):
+        if deadline is None or (self._handle is not None and self.deadline <= deadline):
+            return
+        self.cancel()
+        self.deadline = deadline
+        self._handle = self.loop.call_later(max(deadline - time.monotonic(), 0), self._fire)
+
+    def cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            self.deadline = None
+
+    def _fire(self):
+        self._handle = None
+        self.deadline = None
+        self.callback()
+
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    """Class to feed ACKs to server sessions and queue SYNs of new clients for accept()"""
+    def __init__(self):
+        self.conn = None
+        self.sessions = {}
+        # (client address, seq num, requested options) of SYNs nobody accepted yet
+        self.syns = asyncio.Queue()
+        self._queued = set()
+        # session -> (Timer, future done when the session closes)
+        self._watched = {}
+        # Scratch Segment every datagram is unpacked into (header + payload view), sessions never keep it
+        # and still check the full checksum
+        self._segment = Segment()
+
+    def connection_made(self, transport):
+        self.conn = DatagramConnection(transport)
+
+    def datagram_received(self, data, addr):
+        session = self.sessions.get(addr)
+        # Header only, a SYN is the one thing worth building a Segment for
+        seq_num, _, flags = Segment.unpack_header(data)[:3]
+        if flags == Segment.SYN and (session is None or seq_num != session.client_seq_num):
+            self._on_syn(session, addr, data)
+            return
+        if session is None or (flags == Segment.SYN and session.state != ServerSession.HANDSHAKE):
+            # Unknown client, or a late copy of the SYN this session was opened with
+            return
+        self._segment.unpack(data)
+        session.on_segment(self._segment)
+        session.pump()
+        self._update(session)
+
+    def _on_syn(self, session, addr, data):
+        # New client, or one starting over on the same port (new SYN seq num): its old session is dead
+        segment = Segment.from_bytes(data)
+        if not segment.validate_checksum() or addr in self._queued:
+            return
+        if session is not None and not session.is_closed():
+            session.reset()
+            self._update(session)
+        _log.info("Received request from %s:%d", addr[0], addr[1])
+        self._queued.add(addr)
+        self.syns.put_nowait((addr, segment.seq_num, decode_options(segment.data)))
+
+    def error_received(self, exc):
+        # ICMP errors (port unreachable, ...) surface here, the RTO deals with the lost datagram
+        _log.debug("Socket error: %s", exc)
+
+    def watch(self, session):
+        """Function to drive an open session's timers, returns a future done once the session is closed"""
+        self._queued.discard(session.client_address)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._watched[session] = (Timer(loop, lambda: self._on_timer(session)), future)
+        self._update(session)
+        return future
+
+    def _on_timer(self, session):
+        session.on_timer(time.monotonic())
+        self._update(session)
+
+    def _update(self, session):
+        timer, future = self._watched[session]
+        if session.is_closed():
+            timer.cancel()
+            del self._watched[session]
+            if self.sessions.get(session.client_address) is session:
+                del self.sessions[session.client_address]
+            if not future.done():
+                future.set_result(session)
+            return
+        timer.arm(session.next_deadline())
+
+
+class ReceiverProtocol(asyncio.DatagramProtocol):
+    """Class to hand a client's datagrams to its handler, or keep them for next_datagram() until there is one"""
+    # Datagrams kept while nobody handles them, like a socket receive buffer that overflows
+    BACKLOG = 1024
+
+    def __init__(self):
+        self.transport = None
+        self._handler = None
+        self._backlog = collections.deque(maxlen=ReceiverProtocol.BACKLOG)
+        self._waiter = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self._handler is not None:
+            self._handler(data)
+        elif self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(data)
+        else:
+            self._backlog.append(data)
+
+    def error_received(self, exc):
+        _log.debug("Socket error: %s", exc)
+
+    def set_handler(self, handler):
+        """Function to send every datagram (the queued ones first) to handler, None to queue them again"""
+        self._handler = handler
+        while handler is not None and self._backlog and self._handler is handler:
+            handler(self._backlog.popleft())
+
+    def next_datagram(self):
+        """Function to get a future for the next datagram (for request / response steps like the handshake)"""
+        self._waiter = asyncio.get_running_loop().create_future()
+        if self._backlog:
+            self._waiter.set_result(self._backlog.popleft())
+        return self._waiter
@@ -0,0 +1,152 @@
+"""sendmmsg / recvmmsg through ctypes (Linux only), many datagrams per syscall"""
+import ctypes
+import errno
+import os
+import select
+import socket
+import struct
+import sys
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+# struct sockaddr_in: family (native), port (big endian), address (big endian), 8 byte padding
+_SOCKADDR_IN = struct.Struct("=H2s4s8x")
+MSG_DONTWAIT = 0x40
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int,
+                                  ctypes.c_void_p]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+AVAILABLE = _libc is not None
+
+
+def _pack_sockaddr(addr):
+    return _SOCKADDR_IN.pack(socket.AF_INET, struct.pack("!H", addr[1]), socket.inet_aton(addr[0]))
+
+
+def _buffer_pointer(buf):
+    # Returns (address, length, object keeping the memory alive) without copying if possible
+    if isinstance(buf, bytes):
+        return ctypes.cast(ctypes.c_char_p(buf), ctypes.c_void_p).value, len(buf), buf
+    view = memoryview(buf)
+    if view.readonly:
+        view = bytes(view)
+        return ctypes.cast(ctypes.c_char_p(view), ctypes.c_void_p).value, len(view), view
+    holder = (ctypes.c_char * view.nbytes).from_buffer(view)
+    return ctypes.addressof(holder), view.nbytes, holder
+
+
+def sendmmsg(sock, messages, addr):
+    """Function to send every message (a buffer or a list of buffers) to addr, returns how many were sent"""
+    name = ctypes.create_string_buffer(_pack_sockaddr(addr), _SOCKADDR_IN.size)
+    headers = (_MMsgHdr * len(messages))()
+    keepalive = []
+    for i, message in enumerate(messages):
+        parts = [message] if not isinstance(message, (list, tuple)) else message
+        iovecs = (_IoVec * len(parts))()
+        for j, part in enumerate(parts):
+            address, length, holder = _buffer_pointer(part)
+            iovecs[j].iov_base = address
+            iovecs[j].iov_len = length
+            keepalive.append(holder)
+        keepalive.append(iovecs)
+        hdr = headers[i].msg_hdr
+        hdr.msg_name = ctypes.addressof(name)
+        hdr.msg_namelen = _SOCKADDR_IN.size
+        hdr.msg_iov = iovecs
+        hdr.msg_iovlen = len(parts)
+
+    sent = 0
+    fd = sock.fileno()
+    timeout = sock.gettimeout()
+    while sent < len(messages):
+        pending = ctypes.cast(ctypes.addressof(headers) + sent * ctypes.sizeof(_MMsgHdr), ctypes.POINTER(_MMsgHdr))
+        result = _libc.sendmmsg(fd, pending, len(messages) - sent, 0)
+        if result < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                # Socket has a timeout so the fd is non blocking, wait until the send buffer drains
+                if not select.select([], [fd], [], timeout)[1]:
+                    raise socket.timeout("sendmmsg timed out")
+                continue
+            if err == errno.EINTR:
+                continue
+            raise OSError(err, os.strerror(err))
+        sent += result
+    return sent
+
+
+class RecvBuffers:
+    """Class to hold the preallocated recvmmsg buffers, reused across calls (a ring of count slots)"""
+    def __init__(self, count, size):
+        self.count = count
+        self.size = size
+        self.data = ctypes.create_string_buffer(count * size)
+        self.names = ctypes.create_string_buffer(count * _SOCKADDR_IN.size)
+        self.iovecs = (_IoVec * count)()
+        self.headers = (_MMsgHdr * count)()
+        # Byte views over the slots, received datagrams are handed out as slices of these
+        self.view = memoryview(self.data).cast("B")
+        self.names_view = memoryview(self.names).cast("B")
+        base = ctypes.addressof(self.data)
+        for i in range(count):
+            self.iovecs[i].iov_base = base + i * size
+            self.iovecs[i].iov_len = size
+            hdr = self.headers[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self.names) + i * _SOCKADDR_IN.size
+            hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+            hdr.msg_iovlen = 1
+
+
+def recvmmsg(sock, buffers, max_n):
+    """Function to take up to max_n queued datagrams without blocking, returns [(memoryview, addr)]
+
+    The views point into buffers, they are only valid until the next recvmmsg with the same buffers.
+    """
+    max_n = min(max_n, buffers.count)
+    for i in range(max_n):
+        buffers.headers[i].msg_hdr.msg_namelen = _SOCKADDR_IN.size
+    result = _libc.recvmmsg(sock.fileno(), buffers.headers, max_n, MSG_DONTWAIT, None)
+    if result < 0:
+        err = ctypes.get_errno()
+        if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+            return []
+        raise OSError(err, os.strerror(err))
+
+    received = []
+    for i in range(result):
+        start = i * buffers.size
+        data = buffers.view[start:start + buffers.headers[i].msg_len]
+        _, port, ip = _SOCKADDR_IN.unpack_from(buffers.names_view, i * _SOCKADDR_IN.size)
+        received.append((data, (socket.inet_ntoa(ip), struct.unpack("!H", port)[0])))
+    return received
@@ -0,0 +1,166 @@
+"""Packed segment cache shared by every session of a server (and by server runs, with a sidecar directory)
+
+A cached stream is one file as a client sees it: same file version (path, mtime, size), payload size,
+checksum, codec and byte range. It keeps every segment's packed header (the checksum work) and, for
+compressed segments, the compressed payload. Raw payloads are still sliced from the mapped file, that
+costs nothing. Streams live in an LRU bounded by max_bytes; with a directory, a fully packed stream is
+written there as a sidecar file and loaded back by the next server run.
+"""
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+from lib.segment import Segment
+from lib.source import FileSource
+from lib import log
+
+_log = log.get_logger("cache")
+
+MAGIC = b"SEGC1"
+COUNT = struct.Struct("!L")
+# Per segment in a sidecar file: packed header, payload length (RAW: payload comes from the file)
+RECORD = struct.Struct(f"!{Segment.HEADER_SIZE}sL")
+RAW = 0xFFFFFFFF
+
+
+class CachedStream:
+    """Class to hold the packed segments of one stream, seq num -> (packed header, stored payload or None)"""
+    def __init__(self, key, cache):
+        self.key = key
+        self.cache = cache
+        self.segments = {}
+        self.size = 0
+        # Evicted streams keep serving what they have to whoever holds them, but stop growing
+        self.evicted = False
+        self.saved = False
+
+    def packed(self, seq_num, data):
+        """Function to get (packed header, payload) of seq_num, None if it was never packed"""
+        entry = self.segments.get(seq_num)
+        if entry is None:
+            return None
+        header, payload = entry
+        return header, data if payload is None else payload
+
+    def store(self, seq_num, header, payload=None):
+        """Function to keep a packed segment, payload only if it differs from the file data (compressed)"""
+        if self.evicted or seq_num in self.segments:
+            return
+        self.segments[seq_num] = (header, payload)
+        self.saved = False
+        self.cache.grow(self, SegmentCache.ENTRY_OVERHEAD + len(header) + (len(payload) if payload else 0))
+
+    def is_complete(self, count):
+        return all(seq_num in self.segments for seq_num in range(count))
+
+
+class SegmentCache:
+    """Class to hand out CachedStreams, least recently used ones are dropped above max_bytes"""
+    DEFAULT_SIZE = 64 << 20
+    # Rough Python overhead of one cached segment (dict slot, tuple, bytes object)
+    ENTRY_OVERHEAD = 128
+
+    def __init__(self, max_bytes=DEFAULT_SIZE, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.streams = OrderedDict()
+        self.size = 0
+
+    def stream(self, source, checksum, codec=None):
+        """Function to get the cached stream of an open source, None for sources without a file version"""
+        # Multi-file streams have no single mtime to key on, they are packed per session
+        if not isinstance(source, FileSource):
+            return None
+        try:
+            stat = os.stat(source.filename)
+        except OSError:
+            return None
+        path = os.path.abspath(source.filename)
+        key = (path, stat.st_mtime_ns, stat.st_size, source.segment_size, checksum, codec or "",
+               source.offset, source.end)
+        stream = self.streams.get(key)
+        if stream is not None:
+            self.streams.move_to_end(key)
+            return stream
+        # Older versions of the file are never asked for again
+        for old_key in [old_key for old_key in self.streams if old_key[0] == path and old_key[1:3] != key[1:3]]:
+            self._evict(old_key)
+        stream = CachedStream(key, self)
+        self.streams[key] = stream
+        if self.directory:
+            self._load(stream)
+        return stream
+
+    def grow(self, stream, length):
+        stream.size += length
+        self.size += length
+        while self.size > self.max_bytes and self.streams:
+            self._evict(next(iter(self.streams)))
+
+    def save(self, stream, count):
+        """Function to write a stream to its sidecar file once segments 0 .. count-1 are all packed"""
+        if not self.directory or stream.saved or stream.evicted or not stream.is_complete(count):
+            return
+        path = self._sidecar_path(stream.key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(MAGIC + COUNT.pack(count))
+                for seq_num in range(count):
+                    header, payload = stream.segments[seq_num]
+                    file.write(RECORD.pack(header, RAW if payload is None else len(payload)))
+                    if payload is not None:
+                        file.write(payload)
+            # Atomic, other workers may be reading or writing the same sidecar
+            os.replace(temp_path, path)
+            stream.saved = True
+            _log.debug("Saved %d packed segments to %s", count, path)
+        except OSError as error:
+            _log.warning("Can't write segment cache %s: %s", path, error)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _load(self, stream):
+        path = self._sidecar_path(stream.key)
+        try:
+            if os.path.getsize(path) > self.max_bytes:
+                return
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return
+        view = memoryview(data)
+        entries = []
+        try:
+            if bytes(view[:len(MAGIC)]) != MAGIC:
+                raise ValueError("bad magic")
+            offset = len(MAGIC)
+            (count,) = COUNT.unpack_from(view, offset)
+            offset += COUNT.size
+            for _ in range(count):
+                header, length = RECORD.unpack_from(view, offset)
+                offset += RECORD.size
+                payload = None
+                if length != RAW:
+                    if offset + length > len(view):
+                        raise ValueError("truncated payload")
+                    payload = bytes(view[offset:offset + length])
+                    offset += length
+                entries.append((header, payload))
+        except (struct.error, ValueError) as error:
+            _log.warning("Ignoring broken segment cache %s: %s", path, error)
+            return
+        for seq_num, (header, payload) in enumerate(entries):
+            stream.store(seq_num, header, payload)
+        stream.saved = True
+        _log.debug("Loaded %d packed segments from %s", count, path)
+
+    def _evict(self, key):
+        stream = self.streams.pop(key)
+        stream.evicted = True
+        self.size -= stream.size
+
+    def _sidecar_path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(repr(key).encode()).hexdigest()[:32] + ".segcache")
@@ -0,0 +1,59 @@
+"""Checksum backends, the one used after the handshake is negotiated in the SYN options"""
+import binascii
+import zlib
+from lib.util import crc16 as _crc16
+
+# Every backend takes the packed header fields and the payload separately (so the payload
+# is never concatenated) and returns a 16 bit value for the header checksum field.
+
+
+def crc16(header, data):
+    """CRC-16/MODBUS, slicing-by-8 (the original checksum, always used for the handshake)"""
+    return _crc16(data, _crc16(header))
+
+
+def crc_hqx(header, data):
+    """CRC-16/CCITT from binascii (C implementation)"""
+    return binascii.crc_hqx(data, binascii.crc_hqx(header, 0xFFFF))
+
+
+def crc32(header, data):
+    """CRC-32 from zlib folded to 16 bits"""
+    crc = zlib.crc32(data, zlib.crc32(header))
+    return (crc >> 16) ^ (crc & 0xFFFF)
+
+
+def _fold(total):
+    """Function to fold a one's complement sum to 16 bits with end-around carry (RFC 1071)"""
+    # Split at a word boundary near the middle so a whole payload folds in a few big int steps, the
+    # last ones are the usual (total & 0xFFFF) + (total >> 16). A non-zero sum never folds to 0
+    while total >> 16:
+        half = (total.bit_length() + 31) // 32 * 16
+        total = (total & ((1 << half) - 1)) + (total >> half)
+    return total
+
+
+def inet(header, data):
+    """Internet one's complement sum (RFC 1071), header has an even length"""
+    # Big endian value of the bytes = sum of its 16 bit words shifted by multiples of 16, folding adds them
+    data_sum = int.from_bytes(data, 'big')
+    if len(data) % 2:
+        # Odd length is padded with a zero byte
+        data_sum <<= 8
+    total = _fold(_fold(int.from_bytes(header, 'big')) + _fold(data_sum))
+    return ~total & 0xFFFF
+
+
+DEFAULT_CHECKSUM = "crc16"
+
+CHECKSUMS = {
+    "crc16": crc16,
+    "crc-hqx": crc_hqx,
+    "crc32": crc32,
+    "inet": inet,
+}
+
+
+def get_checksum(name):
+    """Function to get a checksum backend by name, unknown names fall back to the default"""
+    return CHECKSUMS.get(name, CHECKSUMS[DEFAULT_CHECKSUM])
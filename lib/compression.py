@@ -0,0 +1,72 @@
+"""Segment payload compression, the codec is negotiated in the SYN options (compress=<name>)
+
+Every segment is compressed on its own so it can still be retransmitted, reordered and decoded
+without the others. Compressed segments carry the Segment.COMPRESSED flag.
+"""
+import bz2
+import lzma
+import zlib
+
+# Raw LZMA2 (no .xz container), a per segment header would eat most of the gain on small segments
+_LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 1}]
+
+# name -> (compress(data), decompressor factory), the factories give objects with decompress(data, max_length)
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompressobj),
+    "lzma": (lambda data: lzma.compress(data, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS),
+             lambda: lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)),
+    "bz2": (lambda data: bz2.compress(data, 9), bz2.BZ2Decompressor),
+}
+
+
+class Compressor:
+    """Class to compress outgoing payloads, adaptive: blocks that don't shrink are sent raw
+
+    After MISS_LIMIT blocks in a row that didn't shrink (already compressed data), compression is
+    skipped for the next SKIP blocks before trying again, so incompressible files cost little CPU.
+    """
+    MISS_LIMIT = 4
+    SKIP = 64
+
+    def __init__(self, name):
+        self.name = name
+        self._compress = CODECS[name][0]
+        self.misses = 0
+        self.skipping = 0
+        # Payload bytes in / on the wire, for the summary line
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+
+    def compress(self, data):
+        """Function to get (payload, compressed?) for one segment"""
+        self.raw_bytes += len(data)
+        if self.skipping:
+            self.skipping -= 1
+            self.sent_bytes += len(data)
+            return data, False
+        compressed = self._compress(data)
+        if len(compressed) < len(data):
+            self.misses = 0
+            self.sent_bytes += len(compressed)
+            return compressed, True
+        self.misses += 1
+        if self.misses >= Compressor.MISS_LIMIT:
+            self.misses = 0
+            self.skipping = Compressor.SKIP
+        self.sent_bytes += len(data)
+        return data, False
+
+    def count(self, raw_length, sent_length):
+        """Function to count a segment compressed earlier (segment cache hit) in the summary"""
+        self.raw_bytes += raw_length
+        self.sent_bytes += sent_length
+
+    def summary(self):
+        ratio = self.sent_bytes / self.raw_bytes if self.raw_bytes else 1.0
+        return f"{self.name}: {self.raw_bytes} B -> {self.sent_bytes} B ({ratio:.1%})"
+
+
+def decompress(name, data, max_length):
+    """Function to decompress one segment payload, never more than max_length bytes come out"""
+    decompressor = CODECS[name][1]()
+    return decompressor.decompress(bytes(data), max_length)
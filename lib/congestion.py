@@ -0,0 +1,131 @@
+"""Congestion controllers for the sender, cwnd is counted in segments"""
+import time
+
+
+class CongestionController:
+    """Base class, also a fixed window that never reacts to loss"""
+    name = "fixed"
+    INITIAL_WINDOW = 6
+    MIN_WINDOW = 1
+
+    def __init__(self, initial_window=None):
+        self.cwnd = float(initial_window or self.INITIAL_WINDOW)
+        self.ssthresh = float("inf")
+        self.in_recovery = False
+
+    @property
+    def window(self):
+        """Segments the sender may have in flight"""
+        return max(int(self.cwnd), self.MIN_WINDOW)
+
+    def on_ack(self, acked, rtt=None):
+        """Function called when `acked` new segments are cumulatively acknowledged"""
+
+    def on_duplicate_ack(self):
+        """Function called for duplicate ACKs after the loss was already detected"""
+
+    def on_loss(self, rtt=None):
+        """Function called when duplicate ACKs signal a lost segment (fast retransmit)"""
+
+    def on_timeout(self):
+        """Function called when the retransmission timer expired"""
+
+    def __str__(self):
+        return f'{self.name} cwnd: {self.cwnd:.2f}, ssthresh: {self.ssthresh:.2f}'
+
+
+class RenoController(CongestionController):
+    """Class for slow start, congestion avoidance and fast recovery (RFC 5681)"""
+    name = "reno"
+    INITIAL_WINDOW = 4
+    MIN_SSTHRESH = 2
+
+    def on_ack(self, acked, rtt=None):
+        if self.in_recovery:
+            # Deflate window after fast recovery
+            self.in_recovery = False
+            self.cwnd = self.ssthresh
+        elif self.cwnd < self.ssthresh:
+            self.cwnd += acked
+        else:
+            self.cwnd += acked / self.cwnd
+
+    def on_duplicate_ack(self):
+        if self.in_recovery:
+            self.cwnd += 1
+
+    def on_loss(self, rtt=None):
+        if self.in_recovery:
+            return
+        self.ssthresh = max(self.cwnd / 2, self.MIN_SSTHRESH)
+        self.cwnd = self.ssthresh + 3
+        self.in_recovery = True
+
+    def on_timeout(self):
+        self.ssthresh = max(self.cwnd / 2, self.MIN_SSTHRESH)
+        self.cwnd = 1
+        self.in_recovery = False
+
+
+class CubicController(RenoController):
+    """Class for CUBIC window growth (RFC 8312) on top of Reno's slow start and recovery"""
+    name = "cubic"
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, initial_window=None):
+        super().__init__(initial_window)
+        self.w_max = 0.0
+        self.k = 0.0
+        self.epoch_start = None
+
+    def on_ack(self, acked, rtt=None):
+        if self.in_recovery or self.cwnd < self.ssthresh:
+            super().on_ack(acked, rtt)
+            return
+
+        now = time.monotonic()
+        if self.epoch_start is None:
+            self.epoch_start = now
+            if self.w_max < self.cwnd:
+                self.w_max = self.cwnd
+                self.k = 0.0
+            else:
+                self.k = ((self.w_max - self.cwnd) / CubicController.C) ** (1 / 3)
+
+        # Target window one RTT from now
+        t = now - self.epoch_start + (rtt or 0)
+        target = CubicController.C * (t - self.k) ** 3 + self.w_max
+        if target > self.cwnd:
+            self.cwnd += acked * (target - self.cwnd) / self.cwnd
+        else:
+            self.cwnd += acked * 0.01 / self.cwnd
+
+    def on_loss(self, rtt=None):
+        if self.in_recovery:
+            return
+        self._reduce()
+        self.cwnd = self.ssthresh + 3
+        self.in_recovery = True
+
+    def on_timeout(self):
+        self._reduce()
+        self.cwnd = 1
+        self.in_recovery = False
+
+    def _reduce(self):
+        self.epoch_start = None
+        self.w_max = self.cwnd
+        self.ssthresh = max(self.cwnd * CubicController.BETA, self.MIN_SSTHRESH)
+
+
+CONTROLLERS = {
+    CongestionController.name: CongestionController,
+    RenoController.name: RenoController,
+    CubicController.name: CubicController,
+}
+
+
+def create_controller(name):
+    """Function to build a congestion controller by name"""
+    return CONTROLLERS[name]()
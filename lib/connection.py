@@ -1,17 +1,73 @@
+import select
 import socket
+import time
+from lib import batch, log
 from lib.segment import Segment
 
+_log = log.get_logger("connection")
+
+
+class Sender:
+    """Class with the send side sessions and the client use, on top of the transport's socket and sendto
+
+    Subclasses are transports: Connection (blocking socket, also receives) and lib.aio.DatagramConnection
+    (asyncio, the protocol receives). Both give socket, sendto, sendmsg, send_batch, settimeout,
+    gettimeout and close.
+    """
+    def send_syn_segment(self, addr, options=b'', seq_num=0):
+        syn_segment = Segment(seq_num=seq_num, ack_num=0, flags=Segment.SYN, data=options)
+        packed_segment = syn_segment.pack()
+        self.sendto(packed_segment, addr)
+
+    def send_ack_segment(self, addr, ack_num, window=0, seq_num=0):
+        ack_segment = Segment(seq_num=seq_num, ack_num=ack_num, flags=Segment.ACK, window=window)
+        packed_segment = ack_segment.pack()
+        self.sendto(packed_segment, addr)
+
+    # Multicast keluar lewat interface ip (atau default route kalau kosong), loop biar receiver di host yang sama dapet
+    def enable_multicast(self, interface_ip="", ttl=1):
+        interface = socket.inet_aton(interface_ip) if interface_ip else socket.inet_aton("0.0.0.0")
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, interface)
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+
+    # Socket harus di-bind ke 0.0.0.0 (atau alamat group) biar datagram multicast masuk
+    def join_multicast(self, group, interface_ip=""):
+        membership = socket.inet_aton(group) + socket.inet_aton(interface_ip or "0.0.0.0")
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+
+    # Linux reports double of what is usable (the other half is bookkeeping)
+    def receive_buffer_size(self):
+        return self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) // 2
+
 
 # Wrapper class buat UDP Connection
-class Connection:
+class Connection(Sender):
     # BUFFER SIZE (2^16)
     BUFFER_SIZE = 65536
+    # Biggest UDP payload over IPv4 (65535 - 20 byte IP header - 8 byte UDP header)
+    MAX_DATAGRAM_SIZE = 65507
+    # Idle timeout (seconds), loss recovery is driven by the RTO not by this
+    DEFAULT_TIMEOUT = 30
+    # Kernel receive buffer we ask for, the OS may cap it (net.core.rmem_max)
+    RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+    # Max datagrams per send_batch / recv_batch syscall
+    BATCH_SIZE = 32
 
-    def __init__(self, ip, port):
+    def __init__(self, ip, port, timeout=DEFAULT_TIMEOUT):
         self.ip = ip
         self.port = port
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.settimeout(30)
+        self.socket.settimeout(timeout)
+        try:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, Connection.RECEIVE_BUFFER_SIZE)
+        except OSError:
+            pass
+        # Preallocated receive buffers (recvmmsg slots, or recvfrom_into slots without it) and the
+        # single datagram one for recvfrom. Received data are views into these, valid until the next receive
+        self._recv_buffers = None
+        self._recv_slots = None
+        self._recv_view = None
 
     # Binding ip and port to this conn
     def bind(self):
@@ -21,25 +77,74 @@ class Connection:
     def sendto(self, message, addr):
         self.socket.sendto(message, addr)
 
-    # Socket masuknya datagram
-    def recvfrom(self, buffer_size=BUFFER_SIZE):
+    def settimeout(self, timeout):
+        self.socket.settimeout(timeout)
+
+    def gettimeout(self):
+        return self.socket.gettimeout()
+
+    # Scatter/gather send, buffers (header, payload view) jadi satu datagram tanpa digabung di Python
+    def sendmsg(self, buffers, addr):
+        if hasattr(self.socket, "sendmsg"):
+            self.socket.sendmsg(buffers, [], 0, addr)
+        else:
+            self.socket.sendto(b"".join(buffers), addr)
+
+    # Banyak datagram sekaligus (sendmmsg), tiap message bisa berupa buffer atau list of buffers
+    def send_batch(self, messages, addr):
+        if not messages:
+            return
+        if batch.AVAILABLE:
+            batch.sendmmsg(self.socket, messages, addr)
+            return
+        for message in messages:
+            if isinstance(message, (list, tuple)):
+                self.sendmsg(message, addr)
+            else:
+                self.sendto(message, addr)
+
+    # Tunggu datagram pertama (sampai timeout), lalu ambil yang udah antri tanpa blocking (recvmmsg).
+    # Datagram-nya view ke buffer yang dipakai ulang, copy kalau mau disimpan lewat recv_batch berikutnya
+    def recv_batch(self, max_n=BATCH_SIZE, quiet=False):
+        timeout = self.gettimeout()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            remaining = max(deadline - time.monotonic(), 0) if deadline is not None else None
+            if not select.select([self.socket], [], [], remaining)[0]:
+                if not quiet:
+                    _log.info("Socket timed out")
+                return []
+
+            if batch.AVAILABLE:
+                if self._recv_buffers is None:
+                    self._recv_buffers = batch.RecvBuffers(Connection.BATCH_SIZE, Connection.BUFFER_SIZE)
+                received = batch.recvmmsg(self.socket, self._recv_buffers, max_n)
+            else:
+                if self._recv_slots is None:
+                    self._recv_slots = memoryview(bytearray(Connection.BATCH_SIZE * Connection.BUFFER_SIZE))
+                received = []
+                while len(received) < min(max_n, Connection.BATCH_SIZE) and \
+                        select.select([self.socket], [], [], 0)[0]:
+                    slot = self._recv_slots[len(received) * Connection.BUFFER_SIZE:
+                                            (len(received) + 1) * Connection.BUFFER_SIZE]
+                    length, addr = self.socket.recvfrom_into(slot)
+                    received.append((slot[:length], addr))
+            # Empty means someone else took the datagram between select and recv, wait again
+            if received:
+                return received
+
+    # Socket masuknya datagram, hasilnya view ke buffer yang sama (valid sampai recvfrom berikutnya)
+    def recvfrom(self, buffer_size=BUFFER_SIZE, quiet=False):
+        if self._recv_view is None or len(self._recv_view) < buffer_size:
+            self._recv_view = memoryview(bytearray(buffer_size))
         try:
-            segment, addr = self.socket.recvfrom(buffer_size)
-            return segment, addr
+            length, addr = self.socket.recvfrom_into(self._recv_view, buffer_size)
+            return self._recv_view[:length], addr
         except socket.timeout:
-            print("Socket timed out")
+            if not quiet:
+                _log.info("Socket timed out")
             return None, None
 
-    def send_syn_segment(self, addr):
-        syn_segment = Segment(seq_num=0, ack_num=0, flags=Segment.SYN)
-        packed_segment = syn_segment.pack()
-        self.sendto(packed_segment, addr)
-
-    def send_ack_segment(self, addr, ack_num):
-        ack_segment = Segment(seq_num=0, ack_num=ack_num, flags=Segment.ACK)
-        packed_segment = ack_segment.pack()
-        self.sendto(packed_segment, addr)
-
     # Jelas lah ya buat nutup koneksi
     def close(self):
         self.socket.close()
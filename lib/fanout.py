@@ -0,0 +1,129 @@
+"""Fan-out distribution: one file to many receivers, every segment is read, packed and checksummed once"""
+import time
+from lib.segment import Segment
+from lib.session import ServerSession, SelectiveRepeatSession
+from lib.source import open_source
+from lib.checksum import get_checksum, DEFAULT_CHECKSUM
+from lib.congestion import RenoController
+
+
+class FanOutGroup:
+    """Class to send each new segment once to every receiver (or once per port to a multicast group)
+
+    Receivers move in lockstep: new data goes out only as far as the slowest receiver's window allows.
+    Repair is per receiver, each one is a FanOutSession (selective repeat) resending from the shared
+    packed segments to its own address.
+    """
+    def __init__(self, conn, filename, checksum=None, multicast_group=None, segment_size=Segment.MAX_SEGMENT_SIZE,
+                 cache=None):
+        self.conn = conn
+        self.filename = filename
+        # Same packed datagrams for everyone, so one segment size for the whole group (no probing)
+        self.segment_size = segment_size
+        self.checksum = checksum or DEFAULT_CHECKSUM
+        self.algorithm = get_checksum(checksum)
+        # Optional SegmentCache of the server, a group packs the same stream as a plain session from byte 0
+        self.cache = cache
+        self.cached = None
+        self.multicast_group = multicast_group
+        self.members = []
+        self.source = None
+        self.next_seq = 0
+        self.eof_reached = False
+
+    def add(self, session):
+        self.members.append(session)
+
+    def open_source(self):
+        if self.source is None:
+            self.source = open_source(self.filename, self.segment_size - Segment.HEADER_SIZE)
+            if self.cache is not None:
+                self.cached = self.cache.stream(self.source, self.checksum)
+        return self.source
+
+    def close(self):
+        if self.source is not None:
+            self.source.close()
+
+    def pump(self):
+        """Function to send the new segments every receiver has room for"""
+        # Wait until every handshake is done (or given up) so nobody misses the start
+        if any(member.state == ServerSession.HANDSHAKE for member in self.members):
+            return
+        active = [member for member in self.members if member.state == ServerSession.TRANSFER]
+        if not active:
+            return
+
+        limit = min(member.sequence_base + member._window() for member in active)
+        batch = []
+        while self.next_seq < limit and not self.eof_reached:
+            data, segment_type = self.source.segment_data(self.next_seq)
+            if not data:
+                self.eof_reached = True
+                break
+            packed = self.cached.packed(self.next_seq, data) if self.cached is not None else None
+            if packed is None:
+                segment = Segment(seq_num=self.next_seq, data=data, segment_type=segment_type)
+                packed = (segment.pack_header(self.algorithm), segment.data)
+                if self.cached is not None:
+                    self.cached.store(self.next_seq, packed[0])
+            batch.append(packed)
+            for member in active:
+                member.register(self.next_seq, packed)
+            self.next_seq += 1
+
+        if batch:
+            self._send(batch, active)
+        if self.eof_reached and self.cached is not None:
+            self.cache.save(self.cached, self.next_seq)
+        for member in active:
+            member.eof_reached = self.eof_reached
+            member.metrics.on_window(len(member.unacked), member._window())
+            if self.eof_reached and not member.unacked:
+                member._start_close()
+
+    def _send(self, batch, active):
+        # Same packed buffers for everyone, multicast receivers get one copy per distinct port
+        multicast_ports = set()
+        for member in active:
+            if self.multicast_group and member.multicast:
+                multicast_ports.add(member.client_address[1])
+            else:
+                self.conn.send_batch(batch, member.client_address)
+        for port in sorted(multicast_ports):
+            self.conn.send_batch(batch, (self.multicast_group, port))
+
+
+class FanOutSession(SelectiveRepeatSession):
+    """Class to represent one receiver of a FanOutGroup: own handshake, ACKs, repair and close"""
+    def __init__(self, conn, client_address, seq_num, filename, options=None, congestion=RenoController.name,
+                 trace=None, group=None):
+        super().__init__(conn, client_address, seq_num, filename, options, congestion, trace)
+        self.group = group
+        # Client said it joined the group (multicast=<group> in the SYN ACK)
+        self.multicast = "multicast" in self.options
+        group.add(self)
+
+    def register(self, seq_num, packed):
+        """Function to track a segment the group just sent to this receiver"""
+        self.unacked[seq_num] = packed
+        self._mark_sent(seq_num, len(packed[1]))
+        self.timers[seq_num] = time.monotonic() + self.rtt.rto
+        self.sequence_num = seq_num + 1
+
+    def _open_source(self):
+        return self.group.open_source()
+
+    def _close_source(self):
+        # The group owns the source, it is closed once everyone is done
+        pass
+
+    def _abort(self):
+        super()._abort()
+        # The group may have been waiting on this receiver
+        self.group.pump()
+
+    def _fill_window(self):
+        self.group.pump()
+        if self.state == ServerSession.TRANSFER and self.eof_reached and not self.unacked:
+            self._start_close()
@@ -0,0 +1,133 @@
+"""Forward error correction: one XOR parity segment per block of k data segments (fec option)
+
+The parity of a block rebuilds any one lost segment of it without waiting a round trip for the
+retransmission. A PARITY segment carries the block in its header fields: seq num = first seq num,
+ack num = segments in the block, window = XOR of their payload lengths, flags = XOR of their flags
+(COMPRESSED). Only FILEDATA segments are covered, the metadata / manifest still rely on ARQ.
+The receiver reports how many covered segments it was missing, the sender picks k from that loss rate.
+"""
+from lib.segment import Segment
+
+
+class ParityEncoder:
+    """Class to build the parity of the data segments a session sends for the first time, k adapts to loss
+
+    k is picked so a block expects about TARGET losses: XOR rebuilds one loss per block, two in the same
+    block still need ARQ.
+    """
+    MIN_K = 4
+    MAX_K = 64
+    DEFAULT_K = 16
+    TARGET = 0.25
+    # Weight of a new loss sample in the moving average
+    ALPHA = 0.25
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = min(max(k, ParityEncoder.MIN_K), ParityEncoder.MAX_K)
+        self.loss = ParityEncoder.TARGET / self.k
+        # Receiver's last report (segments covered, segments it was missing), both cumulative
+        self.reported_covered = 0
+        self.reported_missing = 0
+        self._reset()
+
+    def _reset(self):
+        self.first = None
+        self.count = 0
+        self.length = 0
+        self.flags = 0
+        self.max_length = 0
+        self.accumulator = 0
+
+    def add(self, seq_num, header, payload):
+        """Function to add a packed data segment to the current block, True once the block is full"""
+        if self.first is None:
+            self.first = seq_num
+        self.count += 1
+        self.length ^= len(payload)
+        self.flags ^= Segment.unpack_header(header)[2]
+        self.max_length = max(self.max_length, len(payload))
+        # Shorter payloads are zero padded at the end, little endian ints do that for free
+        self.accumulator ^= int.from_bytes(payload, "little")
+        return self.count >= self.k
+
+    def holds(self, seq_num):
+        """Function to tell if seq_num is in the block still being filled"""
+        return self.first is not None and self.first <= seq_num
+
+    def parity(self):
+        """Function to get the PARITY Segment of the current block (None if it is empty) and start a new one"""
+        if not self.count:
+            return None
+        segment = Segment(seq_num=self.first, ack_num=self.count, flags=self.flags, segment_type=Segment.PARITY,
+                          window=self.length, data=self.accumulator.to_bytes(self.max_length, "little"))
+        self._reset()
+        return segment
+
+    def on_report(self, covered, missing):
+        """Function to take the receiver's cumulative counters and adapt k to the loss since the last report"""
+        if covered <= self.reported_covered:
+            # Old report overtaken by a newer one
+            return
+        sample = (missing - self.reported_missing) / (covered - self.reported_covered)
+        self.reported_covered = covered
+        self.reported_missing = missing
+        self.loss += ParityEncoder.ALPHA * (sample - self.loss)
+        k = int(ParityEncoder.TARGET / self.loss) if self.loss > 0 else ParityEncoder.MAX_K
+        self.k = min(max(k, ParityEncoder.MIN_K), ParityEncoder.MAX_K)
+
+
+class ParityDecoder:
+    """Class to rebuild a block's one lost data segment from its parity and the segments that did arrive
+
+    Delivered (in order) payloads of the last MAX_K segments are kept, a block can't reach further back
+    than that from a segment that is still missing.
+    """
+    HISTORY = ParityEncoder.MAX_K
+
+    def __init__(self):
+        # seq num -> (flags, payload) of delivered FILEDATA segments
+        self.delivered = {}
+        # Cumulative counters the receiver reports back
+        self.covered = 0
+        self.missing = 0
+
+    def keep(self, segment):
+        """Function to remember a delivered segment's payload (a copy, receive buffers get reused)"""
+        if segment.segment_type != Segment.FILEDATA:
+            return
+        self.delivered[segment.seq_num] = (segment.flags, bytes(segment.data))
+        self.delivered.pop(segment.seq_num - ParityDecoder.HISTORY, None)
+
+    def recover(self, parity, expected_seq_num, buffered):
+        """Function to count a parity's block and rebuild its lost segment, None if nothing (or too much) is lost
+
+        expected_seq_num: next in order seq num, buffered: seq num -> Segment held out of order.
+        """
+        first, count = parity.seq_num, parity.ack_num
+        block = range(first, first + count)
+        missing = [seq_num for seq_num in block if seq_num >= expected_seq_num and seq_num not in buffered]
+        self.covered += count
+        self.missing += len(missing)
+        if len(missing) != 1:
+            return None
+        lost = missing[0]
+        accumulator = int.from_bytes(parity.data, "little")
+        length = parity.window
+        flags = parity.flags
+        for seq_num in block:
+            if seq_num == lost:
+                continue
+            if seq_num < expected_seq_num:
+                entry = self.delivered.get(seq_num)
+                if entry is None:
+                    return None
+                segment_flags, payload = entry
+            else:
+                segment_flags, payload = buffered[seq_num].flags, buffered[seq_num].data
+            accumulator ^= int.from_bytes(payload, "little")
+            length ^= len(payload)
+            flags ^= segment_flags
+        if length > len(parity.data) or accumulator.bit_length() > 8 * len(parity.data):
+            return None
+        return Segment(seq_num=lost, flags=flags, segment_type=Segment.FILEDATA,
+                       data=accumulator.to_bytes(len(parity.data), "little")[:length])
@@ -0,0 +1,111 @@
+"""End-to-end integrity (verify option): both sides hash the data as it streams, the digests meet in the FIN
+
+The sender hashes every data byte the first time it reads it, the receiver every byte it writes, so nothing
+is read twice. The FIN carries the sender's whole digest plus one short digest per chunk (chunk option,
+single files only), the FIN ACK carries the receiver's whole digest back. On a mismatch the receiver
+compares the chunk digests and fetches just the bad chunks again (fetch option, one connection each).
+
+Digests cover the bytes of this connection only: from the resume offset, or the stripe / fetch range.
+"""
+import hashlib
+from lib.segment import Segment
+from lib import pmtu
+
+HASHES = {
+    "sha256": hashlib.sha256,
+    "blake2b": lambda: hashlib.blake2b(digest_size=32),
+}
+DEFAULT_HASH = "sha256"
+DIGEST_SIZE = 32
+# Chunk digests are truncated, they only have to tell a bad chunk from a good one
+CHUNK_DIGEST_SIZE = 8
+# Chunk digests that fit one FIN next to the whole digest at the smallest segment size
+MAX_CHUNKS = (pmtu.BASE_SIZE - Segment.HEADER_SIZE - DIGEST_SIZE) // CHUNK_DIGEST_SIZE
+MIN_CHUNK_SIZE = 1 << 20
+
+
+def chunk_size_for(size):
+    """Function to pick the chunk size for size bytes: MIN_CHUNK_SIZE, bigger if the file needs more than MAX_CHUNKS"""
+    return max(MIN_CHUNK_SIZE, -(-size // MAX_CHUNKS))
+
+
+def decode_digests(data):
+    """Function to split a FIN payload into (whole digest, [chunk digests]), (b"", []) if it has none"""
+    data = bytes(data)
+    if len(data) < DIGEST_SIZE:
+        return b"", []
+    chunks = data[DIGEST_SIZE:]
+    return data[:DIGEST_SIZE], [chunks[i:i + CHUNK_DIGEST_SIZE]
+                                for i in range(0, len(chunks) - CHUNK_DIGEST_SIZE + 1, CHUNK_DIGEST_SIZE)]
+
+
+def parse_fetch(value):
+    """Function to parse a fetch=<start>-<end> option, None if it is not a valid range"""
+    start, sep, end = (value or "").partition("-")
+    try:
+        start, end = int(start), int(end)
+    except ValueError:
+        return None
+    if not sep or not 0 <= start < end:
+        return None
+    return start, end
+
+
+class StreamHasher:
+    """Class to hash a byte stream incrementally: one whole digest and, with chunk_size, one per chunk"""
+    def __init__(self, name=DEFAULT_HASH, chunk_size=0):
+        self.name = name
+        self.chunk_size = chunk_size
+        self.length = 0
+        self._whole = HASHES[name]()
+        self._chunk = HASHES[name]() if chunk_size else None
+        self._chunk_fill = 0
+        self.chunks = []
+        self._digest = None
+
+    def update(self, data):
+        self._whole.update(data)
+        self.length += len(data)
+        if not self.chunk_size:
+            return
+        view = memoryview(data).cast("B")
+        while view:
+            part = view[:self.chunk_size - self._chunk_fill]
+            self._chunk.update(part)
+            self._chunk_fill += len(part)
+            view = view[len(part):]
+            if self._chunk_fill == self.chunk_size:
+                self._end_chunk()
+
+    def _end_chunk(self):
+        self.chunks.append(self._chunk.digest()[:CHUNK_DIGEST_SIZE])
+        self._chunk = HASHES[self.name]()
+        self._chunk_fill = 0
+
+    def digest(self):
+        """Function to finish hashing (the last, shorter chunk too) and get the whole digest"""
+        if self._digest is None:
+            if self._chunk_fill:
+                self._end_chunk()
+            self._digest = self._whole.digest()
+        return self._digest
+
+    def encode(self):
+        """Function to get the FIN payload: whole digest then the chunk digests"""
+        return self.digest() + b"".join(self.chunks)
+
+    def bad_ranges(self, chunks, start=0):
+        """Function to compare the sender's chunk digests with ours, returns the (start, end) byte ranges to
+        fetch again (adjacent bad chunks merged, offsets from start). The last end may run past the data,
+        the sender clips it."""
+        self.digest()
+        ranges = []
+        for index, theirs in enumerate(chunks):
+            if index < len(self.chunks) and self.chunks[index] == theirs:
+                continue
+            chunk_start = start + index * self.chunk_size
+            if ranges and ranges[-1][1] == chunk_start:
+                ranges[-1] = (ranges[-1][0], chunk_start + self.chunk_size)
+            else:
+                ranges.append((chunk_start, chunk_start + self.chunk_size))
+        return ranges
@@ -0,0 +1,45 @@
+"""Logging setup, per connection context and level gating for the hot path"""
+import logging
+import sys
+
+LOGGER_NAME = "tcp_over_udp"
+
+# Shortcuts so callers don't need to import logging just for the levels
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+
+class _Formatter(logging.Formatter):
+    # Same "[!]" look as the old prints, debug lines get their own mark
+    MARKS = {logging.DEBUG: "[-]", logging.INFO: "[!]", logging.WARNING: "[!]", logging.ERROR: "[x]"}
+
+    def format(self, record):
+        return f"{_Formatter.MARKS.get(record.levelno, '[!]')} {super().format(record)}"
+
+
+class ConnectionLogger(logging.LoggerAdapter):
+    """Logger adapter that tags every message with the peer (e.g. "[Client 127.0.0.1:9101]")"""
+    def process(self, msg, kwargs):
+        return f"[{self.extra['role']} {self.extra['peer'][0]}:{self.extra['peer'][1]}] {msg}", kwargs
+
+
+def get_logger(name):
+    """Function to get a module logger under the package logger"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def connection_logger(name, role, peer):
+    """Function to get a logger for one connection, role is "Client" or "Server" """
+    return ConnectionLogger(get_logger(name), {"role": role, "peer": peer})
+
+
+def setup(level="INFO", stream=None):
+    """Function to send package logs to stdout (or stream) at the given level"""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(_Formatter("%(message)s"))
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
@@ -0,0 +1,178 @@
+"""Manifest for multi-file / directory transfers
+
+The files are sent as one byte stream (small files share segments), the manifest in front of it
+lists the relative path and size of every file so the receiver can cut the stream back into files.
+"""
+import os
+import struct
+
+# entry count
+_HEADER = struct.Struct("!L")
+# file size, path length (path bytes follow)
+_ENTRY = struct.Struct("!QH")
+
+
+class Manifest:
+    """Class to describe the files of one transfer, entries are (relative path, size, local path)"""
+    def __init__(self, entries):
+        self.entries = entries
+        self.total_size = sum(size for _, size, _ in entries)
+        # segment size -> encoded manifest cut into payloads, sessions may use different sizes
+        self._segments = {}
+
+    @classmethod
+    def from_paths(cls, paths):
+        """Function to build a manifest from files and directories (walked, named relative to their parent)"""
+        entries = []
+        for path in paths:
+            path = os.path.normpath(path)
+            if os.path.isdir(path):
+                parent = os.path.dirname(os.path.abspath(path))
+                for directory, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    for filename in sorted(filenames):
+                        local_path = os.path.join(directory, filename)
+                        if os.path.isfile(local_path):
+                            name = os.path.relpath(os.path.abspath(local_path), parent)
+                            entries.append((name.replace(os.sep, "/"),
+                                            os.path.getsize(local_path), local_path))
+            else:
+                entries.append((os.path.basename(path), os.path.getsize(path), path))
+        return cls(entries)
+
+    def encode(self):
+        """Function to encode the manifest (without local paths) for the MANIFEST segments"""
+        parts = [_HEADER.pack(len(self.entries))]
+        for name, size, _ in self.entries:
+            name = name.encode()
+            parts.append(_ENTRY.pack(size, len(name)) + name)
+        return b"".join(parts)
+
+    @staticmethod
+    def decode(data):
+        """Function to decode a received manifest, returns [(relative path, size)]"""
+        data = bytes(data)
+        (count,) = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        entries = []
+        for _ in range(count):
+            size, name_length = _ENTRY.unpack_from(data, offset)
+            offset += _ENTRY.size
+            entries.append((data[offset:offset + name_length].decode(errors="replace"), size))
+            offset += name_length
+        return entries
+
+    def segments(self, segment_size):
+        """Function to get the encoded manifest cut into segment payloads (computed once per size)"""
+        if segment_size not in self._segments:
+            encoded = self.encode()
+            self._segments[segment_size] = [encoded[i:i + segment_size] for i in range(0, len(encoded), segment_size)]
+        return self._segments[segment_size]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return f"{len(self.entries)} files"
+
+
+def safe_path(root, name):
+    """Function to resolve a manifest path under root, None if it would escape root"""
+    name = name.replace("\\", "/")
+    if not name or name.startswith("/") or os.path.isabs(name):
+        return None
+    path = os.path.normpath(os.path.join(root, name))
+    if os.path.commonpath([os.path.abspath(root), os.path.abspath(path)]) != os.path.abspath(root):
+        return None
+    return path
+
+
+class ManifestWriter:
+    """Class to write the received stream back into files, file-like (write / close) like the single file case"""
+    def __init__(self, root, log=None):
+        self.root = root
+        self.log = log
+        self._manifest = bytearray()
+        self.entries = None
+        self.index = 0
+        self.remaining = 0
+        self.file = None
+        self.written = 0
+
+    def add_manifest(self, data):
+        self._manifest += data
+
+    def write(self, data):
+        if self.entries is None:
+            self._start()
+        view = memoryview(data)
+        while view:
+            if self.file is None and not self._next_file():
+                if self.log is not None:
+                    self.log.warning("Received %d bytes past the last file in the manifest", len(view))
+                return
+            length = min(self.remaining, len(view))
+            self.file.write(view[:length])
+            self.remaining -= length
+            self.written += length
+            view = view[length:]
+            if self.remaining == 0:
+                self._close_file()
+
+    def close(self, completed=True):
+        """Function to finish the transfer, empty files at the end of the manifest are created here
+
+        Interrupted transfer (completed=False): the files not reached yet are left out, an empty file
+        would look complete (and could replace one that is already there).
+        """
+        if not completed:
+            if self.file is not None:
+                name, size = self.entries[self.index]
+                if self.log is not None:
+                    self.log.warning("File %s is incomplete (%d of %d bytes)", name, size - self.remaining, size)
+                self._close_file()
+            missing = len(self.entries) - self.index if self.entries is not None else 0
+            if missing and self.log is not None:
+                self.log.warning("Transfer interrupted, %d files not received", missing)
+            return
+        if self.entries is None:
+            self._start()
+        if self.file is not None:
+            self._close_file()
+        while self.index < len(self.entries):
+            name, size = self.entries[self.index]
+            if size and self.log is not None:
+                self.log.warning("File %s is missing from the stream", name)
+            self._open(name).close()
+            self.index += 1
+
+    def _start(self):
+        self.entries = Manifest.decode(self._manifest)
+        os.makedirs(self.root, exist_ok=True)
+        if self.log is not None:
+            self.log.info("Manifest: %d files, %d bytes", len(self.entries), sum(size for _, size in self.entries))
+
+    def _next_file(self):
+        # Empty files have nothing in the stream, create them while passing by
+        while self.index < len(self.entries):
+            name, size = self.entries[self.index]
+            self.file = self._open(name)
+            self.remaining = size
+            if size:
+                return True
+            self._close_file()
+        return False
+
+    def _open(self, name):
+        path = safe_path(self.root, name)
+        if path is None:
+            if self.log is not None:
+                self.log.warning("Skipping unsafe path %s", name)
+            return open(os.devnull, "wb")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return open(path, "wb")
+
+    def _close_file(self):
+        self.file.close()
+        self.file = None
+        self.index += 1
@@ -0,0 +1,193 @@
+"""Transfer counters per connection, server aggregate and the periodic stats reporter"""
+import json
+import os
+import time
+
+
+class TransferMetrics:
+    """Class to count one connection's segments, bytes, losses and RTT (sender and receiver side)"""
+    COUNTERS = [
+        "segments_sent", "bytes_sent", "retransmissions", "timeouts", "duplicate_acks", "acks_received",
+        "segments_received", "bytes_received", "out_of_order", "duplicates", "acks_sent", "checksum_failures",
+        "parity_sent", "parity_recovered",
+    ]
+
+    def __init__(self, peer=None):
+        self.peer = peer
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        for counter in TransferMetrics.COUNTERS:
+            setattr(self, counter, 0)
+        # RTT samples (seconds)
+        self.rtt_samples = 0
+        self.rtt_sum = 0.0
+        self.rtt_min = None
+        self.rtt_max = None
+        # Window occupancy: segments in flight vs. the window allowed, sampled after every send
+        self.window_samples = 0
+        self.in_flight_sum = 0
+        self.in_flight_max = 0
+        self.window_sum = 0
+
+    def on_sent(self, length, retransmit=False):
+        self.segments_sent += 1
+        self.bytes_sent += length
+        if retransmit:
+            self.retransmissions += 1
+
+    def on_received(self, length):
+        self.segments_received += 1
+        self.bytes_received += length
+
+    def on_rtt(self, rtt):
+        self.rtt_samples += 1
+        self.rtt_sum += rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+
+    def on_window(self, in_flight, window):
+        self.window_samples += 1
+        self.in_flight_sum += in_flight
+        self.window_sum += window
+        self.in_flight_max = max(self.in_flight_max, in_flight)
+
+    def finish(self):
+        """Function to stop the clock, elapsed time stays fixed after this"""
+        if self.finished_at is None:
+            self.finished_at = time.monotonic()
+
+    def elapsed(self):
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def snapshot(self):
+        """Function to get every counter plus derived rates as a JSON friendly dict"""
+        elapsed = self.elapsed()
+        result = {counter: getattr(self, counter) for counter in TransferMetrics.COUNTERS}
+        result["elapsed"] = round(elapsed, 6)
+        result["finished"] = self.finished_at is not None
+        if self.peer is not None:
+            result["peer"] = f"{self.peer[0]}:{self.peer[1]}"
+        result["send_rate"] = round(self.bytes_sent / elapsed, 1) if elapsed > 0 else 0.0
+        result["receive_rate"] = round(self.bytes_received / elapsed, 1) if elapsed > 0 else 0.0
+        result["retransmission_ratio"] = round(self.retransmissions / self.segments_sent, 6) \
+            if self.segments_sent else 0.0
+        result["rtt_samples"] = self.rtt_samples
+        result["rtt_avg"] = round(self.rtt_sum / self.rtt_samples, 6) if self.rtt_samples else None
+        result["rtt_min"] = round(self.rtt_min, 6) if self.rtt_min is not None else None
+        result["rtt_max"] = round(self.rtt_max, 6) if self.rtt_max is not None else None
+        result["in_flight_avg"] = round(self.in_flight_sum / self.window_samples, 2) if self.window_samples else 0.0
+        result["in_flight_max"] = self.in_flight_max
+        result["window_avg"] = round(self.window_sum / self.window_samples, 2) if self.window_samples else 0.0
+        return result
+
+    def summary(self):
+        """Function to get a one line human readable summary"""
+        snapshot = self.snapshot()
+        rtt = f"{snapshot['rtt_avg'] * 1000:.1f}ms" if snapshot["rtt_avg"] is not None else "-"
+        return (f"sent {snapshot['segments_sent']} seg / {snapshot['bytes_sent']} B, "
+                f"received {snapshot['segments_received']} seg / {snapshot['bytes_received']} B, "
+                f"retransmit {snapshot['retransmissions']}, dup ack {snapshot['duplicate_acks']}, "
+                f"bad checksum {snapshot['checksum_failures']}, rtt {rtt}, "
+                f"{max(snapshot['send_rate'], snapshot['receive_rate']) / 1e6:.2f} MB/s")
+
+
+class ServerMetrics:
+    """Class to aggregate the metrics of every connection the server handles"""
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.connections = []
+        # Finished connections folded into one total (daemon mode), so memory doesn't grow per client
+        self.retired = TransferMetrics()
+        self.retired_count = 0
+
+    def add(self, metrics):
+        self.connections.append(metrics)
+        return metrics
+
+    def retire(self, metrics):
+        """Function to fold a finished connection into the totals and stop listing it per client"""
+        self.connections.remove(metrics)
+        _merge(self.retired, metrics)
+        self.retired_count += 1
+
+    def snapshot(self):
+        total = TransferMetrics()
+        total.started_at = self.started_at
+        _merge(total, self.retired)
+        for metrics in self.connections:
+            _merge(total, metrics)
+
+        result = total.snapshot()
+        del result["finished"]
+        result["connections"] = len(self.connections) + self.retired_count
+        result["active"] = sum(1 for metrics in self.connections if metrics.finished_at is None)
+        result["clients"] = [metrics.snapshot() for metrics in self.connections]
+        return result
+
+    def summary(self):
+        snapshot = self.snapshot()
+        return f"{snapshot['active']}/{snapshot['connections']} active, " \
+               f"{snapshot['bytes_sent']} B sent, retransmit {snapshot['retransmissions']}, " \
+               f"dup ack {snapshot['duplicate_acks']}, {snapshot['send_rate'] / 1e6:.2f} MB/s"
+
+
+def _merge(total, metrics):
+    # Add metrics' counters into total
+    for counter in TransferMetrics.COUNTERS:
+        setattr(total, counter, getattr(total, counter) + getattr(metrics, counter))
+    total.rtt_samples += metrics.rtt_samples
+    total.rtt_sum += metrics.rtt_sum
+    for attr, pick in (("rtt_min", min), ("rtt_max", max)):
+        values = [v for v in (getattr(total, attr), getattr(metrics, attr)) if v is not None]
+        setattr(total, attr, pick(values) if values else None)
+    total.window_samples += metrics.window_samples
+    total.in_flight_sum += metrics.in_flight_sum
+    total.window_sum += metrics.window_sum
+    total.in_flight_max = max(total.in_flight_max, metrics.in_flight_max)
+
+
+class StatsReporter:
+    """Class to periodically hand a metrics snapshot to callbacks, the log and / or a JSON file
+
+    metrics is anything with snapshot() and summary() (TransferMetrics or ServerMetrics).
+    Callbacks get the snapshot dict. Nothing happens before the first poll() past the interval.
+    """
+    def __init__(self, metrics, interval=None, path=None, log=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.path = path
+        self.log = log
+        self.callbacks = []
+        self.next_report = time.monotonic() + interval if interval else None
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def deadline(self):
+        """Function to get when the next report is due, None if there is no periodic report"""
+        return self.next_report
+
+    def poll(self, now=None):
+        """Function to report if the interval has passed"""
+        if self.next_report is None:
+            return
+        now = now if now is not None else time.monotonic()
+        if now >= self.next_report:
+            self.report()
+            self.next_report = now + self.interval
+
+    def report(self):
+        """Function to report right now (also used for the final report)"""
+        if not (self.callbacks or self.path or self.log):
+            return
+        snapshot = self.metrics.snapshot()
+        for callback in self.callbacks:
+            callback(snapshot)
+        if self.log is not None:
+            self.log.info("[Stats] %s", self.metrics.summary())
+        if self.path:
+            # Write then rename, readers never see a half written file
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump(snapshot, file, indent=2)
+            os.replace(temp_path, self.path)
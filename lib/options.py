@@ -0,0 +1,16 @@
+"""Handshake options carried in the SYN / SYN ACK payload"""
+
+
+def encode_options(options):
+    """Function to encode handshake options as key=value pairs"""
+    return ";".join(f"{key}={value}" for key, value in options.items()).encode()
+
+
+def decode_options(data):
+    """Function to decode handshake options, unknown garbage is ignored"""
+    options = {}
+    for item in bytes(data).decode(errors="ignore").split(";"):
+        key, sep, value = item.partition("=")
+        if sep:
+            options[key] = value
+    return options
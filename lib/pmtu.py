@@ -0,0 +1,45 @@
+"""Path MTU discovery (PLPMTUD style, RFC 8899): probe segments of candidate sizes with DF set
+
+The server sends one PROBE segment per candidate datagram size right after the handshake, the client
+answers each probe it receives, and the largest answered size becomes the connection's segment size.
+BASE_SIZE is probed too, nothing answered after MAX_PROBES rounds means the path can't carry even that,
+the connection is reset then.
+"""
+import errno
+import socket
+import sys
+
+# Linux values, the socket module doesn't export them
+IP_MTU_DISCOVER = getattr(socket, "IP_MTU_DISCOVER", 10)
+# Set DF and ignore the kernel's cached path MTU, too big datagrams fail with EMSGSIZE (or get dropped on the way)
+IP_PMTUDISC_PROBE = getattr(socket, "IP_PMTUDISC_PROBE", 3)
+
+# Datagram sizes worth trying below the negotiated max (MTU minus 20 byte IP and 8 byte UDP header):
+# jumbo frames, Ethernet, PPPoE, IPv6 minimum MTU
+PROBE_SIZES = (8972, 1472, 1464, 1252)
+# Smallest size we send, small enough for practically any path (probed last)
+BASE_SIZE = 1200
+# Rounds of probes (one per RTO) before settling
+MAX_PROBES = 3
+
+
+def candidates(max_size):
+    """Function to list the datagram sizes to probe, largest first, max_size and BASE_SIZE included"""
+    return sorted({max_size, BASE_SIZE, *(size for size in PROBE_SIZES if BASE_SIZE < size < max_size)},
+                  reverse=True)
+
+
+def enable_dont_fragment(sock):
+    """Function to set DF on every datagram of sock, False where that isn't supported (non Linux)"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_PROBE)
+        return True
+    except OSError:
+        return False
+
+
+def is_too_big(error):
+    """Function to tell a datagram over the local MTU (DF set) apart from other send errors"""
+    return isinstance(error, OSError) and error.errno == errno.EMSGSIZE
@@ -0,0 +1,104 @@
+"""Resumable transfers: the receiver's checkpoint and the prefix hash both sides compare in the handshake"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Bytes hashed per read
+_CHUNK = 1 << 20
+
+
+def prefix_hash(path, length):
+    """Function to hash the first `length` bytes of a file (sha256 hex), None if the file is shorter"""
+    digest = hashlib.sha256()
+    remaining = length
+    with open(path, "rb") as file:
+        while remaining > 0:
+            chunk = file.read(min(remaining, _CHUNK))
+            if not chunk:
+                return None
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+class PrefixCheck:
+    """Class to compare a file's prefix with a client's resume_hash on a worker thread
+
+    Hashing a multi-GB prefix takes seconds, the server's receive loop keeps serving the other clients
+    meanwhile (hashlib releases the GIL on big updates). The session asks done() until it can answer the SYN.
+    """
+    # Threads shared by every server of the process, started on the first resume request
+    WORKERS = 2
+    _executor = None
+
+    def __init__(self, path, offset, resume_hash):
+        if PrefixCheck._executor is None:
+            PrefixCheck._executor = ThreadPoolExecutor(PrefixCheck.WORKERS, thread_name_prefix="resume")
+        self.offset = offset
+        self.resume_hash = resume_hash
+        self._future = PrefixCheck._executor.submit(prefix_hash, path, offset)
+
+    def done(self):
+        return self._future.done()
+
+    def result(self):
+        """Function to get the offset to resume from once done(), 0 if the prefix does not match"""
+        try:
+            matches = self._future.result() == self.resume_hash
+        except OSError:
+            matches = False
+        return self.offset if matches else 0
+
+
+class Checkpoint:
+    """Class to persist how much of the output file has been written in order
+
+    Saved next to the output path (`<path output>.resume`) as JSON, rewritten at most every INTERVAL seconds
+    and when the transfer stops, removed once the transfer completes.
+    """
+    # Seconds between checkpoint writes while receiving
+    INTERVAL = 1.0
+
+    def __init__(self, path_output):
+        self.path = os.path.normpath(path_output) + ".resume"
+        # Output file and bytes of it known to be written
+        self.output = None
+        self.offset = 0
+        self._saved_at = 0.0
+
+    def load(self):
+        """Function to read a previous checkpoint, returns (output path, offset) or None"""
+        try:
+            with open(self.path) as file:
+                state = json.load(file)
+            output, offset = state["output"], int(state["offset"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if not os.path.isfile(output):
+            return None
+        # The checkpoint may be newer than what actually reached the file
+        return output, min(offset, os.path.getsize(output))
+
+    def update(self, output, offset, file=None, force=False):
+        """Function to record progress, written to disk only every INTERVAL seconds unless forced"""
+        self.output = output
+        self.offset = offset
+        now = time.monotonic()
+        if not force and now - self._saved_at < Checkpoint.INTERVAL:
+            return
+        self._saved_at = now
+        if file is not None:
+            # The data must be in the file before the checkpoint claims it
+            file.flush()
+        # Write then rename like the stats file, a crash never leaves half a checkpoint
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as checkpoint_file:
+            json.dump({"output": self.output, "offset": self.offset}, checkpoint_file)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        for path in (self.path, f"{self.path}.tmp"):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,41 @@
+"""Round trip time estimation and retransmission timeout (Jacobson/Karels, RFC 6298)"""
+
+
+class RttEstimator:
+    """Class to keep SRTT / RTTVAR and derive the retransmission timeout"""
+    # Gain buat SRTT dan RTTVAR
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+
+    # Seconds
+    INITIAL_RTO = 1.0
+    MIN_RTO = 0.2
+    MAX_RTO = 60.0
+    # Clock granularity
+    GRANULARITY = 0.001
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = RttEstimator.INITIAL_RTO
+
+    def sample(self, rtt):
+        """Function to feed one RTT measurement (never from a retransmitted segment)"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RttEstimator.BETA) * self.rttvar + RttEstimator.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RttEstimator.ALPHA) * self.srtt + RttEstimator.ALPHA * rtt
+        self.rto = self._clamp(self.srtt + max(RttEstimator.GRANULARITY, RttEstimator.K * self.rttvar))
+
+    def backoff(self):
+        """Function to double the timeout after a retransmission timer expired"""
+        self.rto = self._clamp(self.rto * 2)
+
+    def _clamp(self, rto):
+        return min(max(rto, RttEstimator.MIN_RTO), RttEstimator.MAX_RTO)
+
+    def __str__(self):
+        return f'SRTT: {self.srtt}, RTTVAR: {self.rttvar}, RTO: {self.rto}'
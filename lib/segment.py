@@ -1,53 +1,118 @@
 import struct
-from lib.util import crc16
+from lib.checksum import DEFAULT_CHECKSUM, CHECKSUMS
+
+# Penjelasan "!LLBBHH": ! itu untuk menunjukkan kalau dia big endian (byte order)
+# L buat unsigned long (4 bytes for seq num and ack num)
+# B buat unsigned char (1 byte for flags and segment type)
+# H buat unsigned short (2 byes for window and check sum)
+# Jadi kalo dicompile jadinya 4 byte for sq num, 4 byte for ack nm, 1 byte for flag, 1 byte for type,
+# 2 byte for window, 2 byte for checksum
+# Dicompile sekali di sini, bukan di-parse ulang tiap pack / unpack
+HEADER = struct.Struct('!LLBBHH')
+# Header tanpa checksum field, ini yang di-checksum bareng data
+CHECKSUM_FIELDS = struct.Struct('!LLBBH')
 
 
 class Segment:
-    # MAX Segment Size
+    # No per instance __dict__, one Segment per datagram adds up
+    __slots__ = ("seq_num", "ack_num", "flags", "segment_type", "window", "checksum", "data")
+
+    # MAX Segment Size, the default; each connection negotiates its own (mss option, path MTU probe)
     MAX_SEGMENT_SIZE = 32768
     
-    HEADER_SIZE = 12
+    HEADER_SIZE = HEADER.size
     DATA_SIZE = MAX_SEGMENT_SIZE - HEADER_SIZE
     
     # FLAGS
     SYN = 0x02
     ACK = 0x10
     FIN = 0x01
+    # Connection dropped: by the receiver (it can't use what the SYN ACK offered), or by the sender (path MTU
+    # too small, reason in the data). The other side closes too
+    RST = 0x04
+    # Payload compressed with the codec from the handshake (see lib/compression.py)
+    COMPRESSED = 0x20
 
     # SEGMENT TYPE
     FILEDATA = 0x01
     METADATA = 0x02
+    SACK = 0x03
+    # Multi-file transfer: file list in front of the stream (see lib/manifest.py)
+    MANIFEST = 0x04
+    # Path MTU probe (seq num = datagram size) and its answer (ack num = that size), see lib/pmtu.py
+    PROBE = 0x05
+    # XOR parity of a block of data segments (fec option), and the receiver's loss report, see lib/fec.py
+    PARITY = 0x06
+
+    # ARQ MODES (negotiated in the handshake)
+    GO_BACK_N = "gbn"
+    SELECTIVE_REPEAT = "sr"
 
-    def __init__(self, seq_num=0, ack_num=0, flags=0, segment_type=0, checksum=0, data=b''):
+    def __init__(self, seq_num=0, ack_num=0, flags=0, segment_type=0, checksum=0, data=b'', window=0):
         self.seq_num = seq_num
         self.ack_num = ack_num
         self.flags = flags
         self.segment_type = segment_type
+        # Receiver advertised window (segments), 0 berarti nggak di-advertise
+        self.window = window
         self.checksum = checksum
         self.data = data
 
-    # Penjelasan "!LLHH": ! itu untuk menunjukkan kalau dia big endian (byte order)
-    # L buat unsigned long (4 bytes for seq num and ack num)
-    # H buat unsigned short (2 byes for flags and check sum)
-    # Jadi kalo dicompile jadinya 4 byte for sq num, 4 byte for ack nm, 2 byte for flag, 2 byte for checksum
-    def pack(self):
-        self.checksum = self.calculate_checksum()
-        header = struct.pack('!LLBBH', self.seq_num, self.ack_num, self.flags, self.segment_type, self.checksum)
-        return header + self.data
+    # algorithm = checksum backend dari lib.checksum, default crc16 (dipakai juga buat handshake)
+    def pack(self, algorithm=None):
+        return self.pack_header(algorithm) + self.data
+
+    # Header only, buat scatter/gather send (data dikirim terpisah tanpa di-copy)
+    def pack_header(self, algorithm=None):
+        self.checksum = self.calculate_checksum(algorithm)
+        return HEADER.pack(self.seq_num, self.ack_num, self.flags, self.segment_type, self.window, self.checksum)
+
+    def pack_into(self, buffer, offset=0, algorithm=None):
+        """Function to pack header + data into a preallocated buffer (reused per send), returns the length"""
+        self.checksum = self.calculate_checksum(algorithm)
+        HEADER.pack_into(buffer, offset, self.seq_num, self.ack_num, self.flags, self.segment_type, self.window,
+                         self.checksum)
+        end = offset + Segment.HEADER_SIZE + len(self.data)
+        buffer[offset + Segment.HEADER_SIZE:end] = self.data
+        return end - offset
 
-    # Total byte dari header adalah 12, jadi kita mulai pembacaan dari 12 byte ke atas
+    # Total byte dari header adalah 14, jadi kita mulai pembacaan dari 14 byte ke atas.
+    # Data jadi memoryview ke datagram-nya, payload nggak di-copy
     def unpack(self, segment):
-        header = segment[:Segment.HEADER_SIZE]
-        self.seq_num, self.ack_num, self.flags, self.segment_type, self.checksum = struct.unpack('!LLBBH', header)
-        self.data = segment[Segment.HEADER_SIZE:]
+        view = memoryview(segment)
+        self.seq_num, self.ack_num, self.flags, self.segment_type, self.window, self.checksum = \
+            HEADER.unpack_from(view)
+        self.data = view[Segment.HEADER_SIZE:]
+
+    @classmethod
+    def from_bytes(cls, segment):
+        """Function to build a Segment straight from a received datagram"""
+        unpacked = cls.__new__(cls)
+        unpacked.unpack(segment)
+        return unpacked
+
+    @staticmethod
+    def unpack_header(segment):
+        """Function to read only the header, (seq, ack, flags, type, window, checksum) without a Segment"""
+        return HEADER.unpack_from(segment)
+
+    def calculate_checksum(self, algorithm=None):
+        algorithm = algorithm or CHECKSUMS[DEFAULT_CHECKSUM]
+        s = CHECKSUM_FIELDS.pack(self.seq_num, self.ack_num, self.flags, self.segment_type, self.window)
+        return algorithm(s, self.data)
+
+    def validate_checksum(self, algorithm=None):
+        return self.calculate_checksum(algorithm) == self.checksum
 
-    def calculate_checksum(self):
-        s = struct.pack('!LLBB', self.seq_num, self.ack_num, self.flags, self.segment_type) + self.data
-        return crc16(s)
+    # SACK payload isinya list seq num yang udah diterima tapi out of order, 4 byte per seq num
+    @staticmethod
+    def encode_sack(seq_nums):
+        return struct.pack(f'!{len(seq_nums)}L', *seq_nums)
 
-    def validate_checksum(self):
-        return self.calculate_checksum() == self.checksum
+    @staticmethod
+    def decode_sack(data):
+        return struct.unpack(f'!{len(data) // 4}L', data[:len(data) // 4 * 4])
 
     def __str__(self):
-        return (f'SeqNum: {self.seq_num}, AckNum: {self.ack_num}, Flags: {self.flags}, Checksum: {self.checksum}, Data '
-                f'Length: {len(self.data)}')
+        return (f'SeqNum: {self.seq_num}, AckNum: {self.ack_num}, Flags: {self.flags}, Window: {self.window}, '
+                f'Checksum: {self.checksum}, Data Length: {len(self.data)}')
@@ -0,0 +1,606 @@
+"""Per-client connection state for the Server"""
+import time
+from lib.segment import Segment
+from lib.options import encode_options
+from lib.rtt import RttEstimator
+from lib.congestion import RenoController, create_controller
+from lib.source import open_source
+from lib.checksum import get_checksum, DEFAULT_CHECKSUM
+from lib.compression import Compressor
+from lib.metrics import TransferMetrics
+from lib.fec import ParityEncoder
+from lib.integrity import StreamHasher
+from lib import log, trace, pmtu
+
+
+class ServerSession:
+    """Class to represent one client's handshake, transfer and close state"""
+    # STATES
+    HANDSHAKE = 0
+    TRANSFER = 1
+    CLOSING = 2
+    CLOSED = 3
+    # Path MTU probes between the handshake and the data
+    PROBING = 4
+
+    # Retransmissions of SYN ACK / FIN (or of the window without any progress) before giving up
+    MAX_RETRIES = 8
+    # Seconds between looks at a resume prefix hash still running on its worker thread
+    RESUME_POLL = 0.01
+
+    def __init__(self, conn, client_address, seq_num, filename, options=None, congestion=RenoController.name,
+                 trace=None, cache=None):
+        self.conn = conn
+        self.client_address = client_address
+        self.log = log.connection_logger("session", "Client", client_address)
+        # Optional EventTrace shared by every session of the server
+        self.trace = trace
+        self.metrics = TransferMetrics(client_address)
+        self.filename = filename
+        self.options = options or {}
+        self.algorithm = get_checksum(self.options.get("checksum"))
+        self.compressor = Compressor(self.options["compress"]) if "compress" in self.options else None
+        # XOR parity per block of data segments (fec option, selective repeat only)
+        self.fec = ParityEncoder(int(self.options["fec"])) if "fec" in self.options else None
+        # Digest of the data as it is first read (verify option), goes into the FIN
+        self.hasher = StreamHasher(self.options["verify"], int(self.options.get("chunk", 0))) \
+            if "verify" in self.options else None
+        self.hashed_through = -1
+        # Datagram size from the mss option, lowered to what the probes confirm when pmtud is on
+        self.segment_size = int(self.options.get("mss", Segment.MAX_SEGMENT_SIZE))
+        self.pmtud = "pmtud" in self.options
+        self.probe_sizes = []
+        self.probe_confirmed = 0
+        self.probe_rounds = 0
+        self.state = ServerSession.HANDSHAKE
+        # Pending lib.resume.PrefixCheck, the SYN ACK goes out once it is done
+        self.resume_check = None
+
+        # Handshake
+        # Client's SYN seq num (new per connection), its last ACK is seq num + 1 and acks our SYN ACK (seq 0)
+        self.client_seq_num = seq_num
+        self.expected_ack_num = 1
+
+        # Go-back-N window
+        self.source = None
+        # Optional SegmentCache shared by every session of the server, cached = this file's stream in it
+        self.cache = cache
+        self.cached = None
+        self.cache_hits = 0
+        self.sequence_base = 0
+        self.sequence_num = 0
+        self.eof_reached = False
+        self.last_ack_received = -1
+        self.recovering = False
+
+        # Retransmission timer (SYN ACK, oldest unacked segment, FIN)
+        self.rtt = RttEstimator()
+        self.deadline = None
+        self.retries = 0
+        # seq num -> first transmission time, retransmitted ones are dropped (Karn's algorithm)
+        self.send_times = {}
+        self.highest_sent = -1
+        self.handshake_sent_at = None
+
+        # Window = min(cwnd, receiver advertised window)
+        self.cc = create_controller(congestion)
+        self.receive_window = None
+
+    def is_closed(self):
+        return self.state == ServerSession.CLOSED
+
+    def reset(self):
+        """Function to drop the session at once, its client started over with a new SYN"""
+        self.log.info("Client connected again, dropping the old session")
+        self._abort()
+
+    def start(self):
+        """Function to start handshake (send SYN ACK)"""
+        if self.resume_check is not None:
+            if not self.resume_check.done():
+                # SYN ACK carries the resume decision, look again shortly (SYN retries land here too)
+                self.deadline = time.monotonic() + ServerSession.RESUME_POLL
+                return
+            self._on_resume_checked()
+        self.log.info("[Handshake] (Sending SYN ACK) Handshake to client....")
+        syn_ack_segment = Segment(seq_num=0, ack_num=self.client_seq_num + 1, flags=(Segment.SYN | Segment.ACK),
+                                  data=encode_options(self.options))
+        self.conn.sendto(syn_ack_segment.pack(), self.client_address)
+        self.handshake_sent_at = time.monotonic() if self.retries == 0 else None
+        self._restart_timer()
+
+    def _on_resume_checked(self):
+        offset = self.resume_check.result()
+        if offset:
+            self.log.info("Resuming from byte %d", offset)
+            self.options["resume"] = offset
+        else:
+            self.log.info("Resume request for %d bytes does not match the file, sending everything",
+                          self.resume_check.offset)
+        self.resume_check = None
+
+    def on_segment(self, segment):
+        """Function to handle a segment received from this client"""
+        # Handshake segments always use the default checksum, the rest the negotiated one. That includes the
+        # handshake ACK the client sends again after a late duplicate SYN ACK, which can come after the handshake
+        handshake = self.state == ServerSession.HANDSHAKE or self._is_handshake_ack(segment)
+        algorithm = None if handshake else self.algorithm
+        if not segment.validate_checksum(algorithm):
+            self.metrics.checksum_failures += 1
+            self.log.warning("Corrupted checksum in segment from client. Dropped.")
+            if self.trace is not None:
+                self.trace.record(trace.CORRUPT, self.client_address[1], segment.seq_num, segment.ack_num)
+            return
+        self.metrics.on_received(len(segment.data))
+        if segment.flags & Segment.RST:
+            if not self.is_closed():
+                self.log.info("Client reset the connection")
+                self._abort()
+        elif self.state == ServerSession.HANDSHAKE:
+            self._handle_handshake(segment)
+        elif self._is_handshake_ack(segment):
+            # Repeated handshake ACK (the client saw our SYN ACK twice), its ack_num is not about data
+            return
+        elif segment.segment_type == Segment.PROBE:
+            # A late probe answer must not be taken for a data ACK
+            if self.state == ServerSession.PROBING:
+                self._handle_probe_ack(segment)
+        elif segment.segment_type == Segment.PARITY:
+            # Receiver's FEC loss report: segments covered (seq num) and how many of them it was missing (ack num)
+            if self.fec is not None:
+                self.fec.on_report(segment.seq_num, segment.ack_num)
+        elif self.state == ServerSession.TRANSFER:
+            self._handle_ack(segment)
+        elif self.state == ServerSession.CLOSING:
+            self._handle_fin_ack(segment)
+
+    def pump(self):
+        """Function to send whatever the current state allows"""
+        if self.state == ServerSession.TRANSFER:
+            self._fill_window()
+
+    def next_deadline(self):
+        """Function to get the earliest pending timer, None if no timer is running"""
+        return self.deadline
+
+    def on_timer(self, now):
+        """Function to handle expired timers"""
+        if self.deadline is None or now < self.deadline:
+            return
+        if self.resume_check is not None:
+            # Waiting for the prefix hash is not a timeout
+            self.deadline = None
+            self.start()
+            return
+        if self.state == ServerSession.PROBING:
+            # Unanswered probes are the point of probing, not a loss
+            self._on_probe_timeout()
+            return
+        self.retries += 1
+        if self.retries > ServerSession.MAX_RETRIES:
+            self.log.warning("No response after %d retries. Giving up.", ServerSession.MAX_RETRIES)
+            self._abort()
+            return
+
+        self.rtt.backoff()
+        self.metrics.timeouts += 1
+        self.log.info("Timed out, RTO backed off to %.3fs.", self.rtt.rto)
+        if self.trace is not None:
+            self.trace.record(trace.TIMEOUT, self.client_address[1], self.sequence_base, self.state)
+        if self.state == ServerSession.HANDSHAKE:
+            self.start()
+        elif self.state == ServerSession.TRANSFER:
+            self._on_transfer_timeout()
+        elif self.state == ServerSession.CLOSING:
+            self._send_fin()
+
+    def _restart_timer(self):
+        self.deadline = time.monotonic() + self.rtt.rto
+
+    def _stop_timer(self):
+        self.deadline = None
+
+    def _abort(self):
+        self._close_source()
+        self._stop_timer()
+        self.state = ServerSession.CLOSED
+        self.metrics.finish()
+
+    def _sample_rtt(self, ack_num):
+        # Sample the acked segment (if it was sent only once), forget everything up to it
+        sent_at = self.send_times.get(ack_num)
+        if sent_at is not None:
+            self._on_rtt(time.monotonic() - sent_at)
+        for seq_num in [seq_num for seq_num in self.send_times if seq_num <= ack_num]:
+            del self.send_times[seq_num]
+
+    def _on_rtt(self, rtt):
+        self.rtt.sample(rtt)
+        self.metrics.on_rtt(rtt)
+
+    def _window(self):
+        window = self.cc.window
+        if self.receive_window:
+            window = min(window, self.receive_window)
+        # A stream only keeps capacity segments past the base for retransmission
+        if self.source is not None and self.source.capacity:
+            window = min(window, self.source.capacity)
+        return window
+
+    def _on_new_ack(self, segment):
+        # Cumulative ACK for segments [sequence_base, ack_num]
+        if segment.window:
+            self.receive_window = segment.window
+        if self.trace is not None:
+            self.trace.record(trace.ACKED, self.client_address[1], segment.ack_num, segment.window)
+        self._sample_rtt(segment.ack_num)
+        self.metrics.acks_received += 1
+        self.cc.on_ack(segment.ack_num + 1 - self.sequence_base, self.rtt.srtt)
+        self.sequence_base = segment.ack_num + 1
+        self.source.release(self.sequence_base)
+        self.retries = 0
+
+    def _mark_sent(self, seq_num, length):
+        self.metrics.on_sent(length, retransmit=seq_num <= self.highest_sent)
+        if seq_num > self.highest_sent:
+            self.highest_sent = seq_num
+            self.send_times[seq_num] = time.monotonic()
+            event = trace.SENT
+        else:
+            self.send_times.pop(seq_num, None)
+            event = trace.RETRANSMIT
+        if self.trace is not None:
+            self.trace.record(event, self.client_address[1], seq_num, self._window())
+
+    def _is_handshake_ack(self, segment):
+        return segment.flags == Segment.ACK and segment.seq_num == self.client_seq_num + 1 \
+            and segment.ack_num == self.expected_ack_num
+
+    def _handle_handshake(self, segment):
+        # Client retrying the SYN means our SYN ACK got lost
+        if segment.flags == Segment.SYN:
+            self.start()
+            return
+
+        self.log.info("[Handshake] (Received) Last ACK from client")
+        if self._is_handshake_ack(segment):
+            self.log.info("[Handshake] (Completed) Handshake to client")
+            if self.handshake_sent_at is not None:
+                self._on_rtt(time.monotonic() - self.handshake_sent_at)
+            if segment.window:
+                self.receive_window = segment.window
+            self.retries = 0
+            self._stop_timer()
+            if self.pmtud:
+                self._start_probing()
+            else:
+                self._begin_transfer()
+        else:
+            self.log.warning("[Handshake-Error] Incorrect ACK Segment Received")
+
+    def _begin_transfer(self):
+        # Segment size is final here, the source cuts the file with it
+        self.source = self._open_source()
+        if self.cache is not None:
+            self.cached = self.cache.stream(self.source, self.options.get("checksum", DEFAULT_CHECKSUM),
+                                            self.options.get("compress"))
+        self.state = ServerSession.TRANSFER
+
+    def _start_probing(self):
+        self.state = ServerSession.PROBING
+        self.probe_sizes = pmtu.candidates(self.segment_size)
+        self._send_probes()
+
+    def _send_probes(self):
+        # Every size not confirmed yet, biggest first, as one datagram each with DF set
+        for size in [size for size in self.probe_sizes if size > self.probe_confirmed]:
+            probe = Segment(seq_num=size, segment_type=Segment.PROBE, data=bytes(size - Segment.HEADER_SIZE))
+            try:
+                self.conn.sendto(probe.pack(self.algorithm), self.client_address)
+            except OSError as error:
+                if not pmtu.is_too_big(error):
+                    raise
+                # Bigger than our own interface allows, no need to wait for it
+                self.probe_sizes.remove(size)
+        if any(size > self.probe_confirmed for size in self.probe_sizes):
+            self._restart_timer()
+        else:
+            self._finish_probing()
+
+    def _handle_probe_ack(self, segment):
+        if segment.ack_num in self.probe_sizes and segment.ack_num > self.probe_confirmed:
+            self.log.debug("Probe of %d bytes answered.", segment.ack_num)
+            self.probe_confirmed = segment.ack_num
+        if self.probe_confirmed == max(self.probe_sizes, default=0):
+            # Biggest one made it, nothing better to wait for (the receive loop pumps the window next)
+            self._finish_probing()
+
+    def _on_probe_timeout(self):
+        # Bigger probes still missing after an RTO count as too big, unless nothing got through at all
+        self.probe_rounds += 1
+        if self.probe_confirmed or self.probe_rounds >= pmtu.MAX_PROBES:
+            self._finish_probing()
+            self.pump()
+        else:
+            self._send_probes()
+
+    def _finish_probing(self):
+        self._stop_timer()
+        if not self.probe_confirmed:
+            # Not even BASE_SIZE got through, data segments wouldn't either: fail now instead of retrying them
+            reason = f"path MTU below {pmtu.BASE_SIZE} bytes"
+            self.log.warning("Path MTU probe: no probe answered, %s. Resetting the connection.", reason)
+            self.conn.sendto(Segment(flags=Segment.RST, data=reason.encode()).pack(self.algorithm),
+                             self.client_address)
+            self._abort()
+            return
+        self.segment_size = self.probe_confirmed
+        self.log.info("Path MTU probe: %d byte segments", self.segment_size)
+        self._begin_transfer()
+
+    def _open_source(self):
+        # range=<start>-<end> for a stripe, resume=<offset> only if the client's prefix matched our file
+        if "range" in self.options:
+            start, end = (int(value) for value in str(self.options["range"]).split("-"))
+            return open_source(self.filename, self.segment_size - Segment.HEADER_SIZE, start, end)
+        return open_source(self.filename, self.segment_size - Segment.HEADER_SIZE,
+                           int(self.options.get("resume", 0)))
+
+    def _close_source(self):
+        if self.source:
+            self.source.close()
+
+    def _segment_data(self, seq_num):
+        data, segment_type = self.source.segment_data(seq_num)
+        # Hashed on the first read only, go-back-N rereads the same bytes
+        if self.hasher is not None and seq_num > self.hashed_through:
+            self.hashed_through = seq_num
+            if segment_type == Segment.FILEDATA:
+                self.hasher.update(data)
+        return data, segment_type
+
+    def _make_segment(self, seq_num, data, segment_type):
+        # File data goes through the negotiated codec, sent raw when it doesn't shrink
+        flags = 0
+        if self.compressor is not None and segment_type == Segment.FILEDATA:
+            data, compressed = self.compressor.compress(data)
+            if compressed:
+                flags = Segment.COMPRESSED
+        return Segment(seq_num=seq_num, data=data, segment_type=segment_type, flags=flags)
+
+    def _pack_segment(self, seq_num, data, segment_type):
+        # (packed header, payload), from the segment cache when another send (or client) packed it already
+        if self.cached is not None:
+            packed = self.cached.packed(seq_num, data)
+            if packed is not None:
+                self.cache_hits += 1
+                if self.compressor is not None and segment_type == Segment.FILEDATA:
+                    self.compressor.count(len(data), len(packed[1]))
+                return packed
+        segment = self._make_segment(seq_num, data, segment_type)
+        header = segment.pack_header(self.algorithm)
+        if self.cached is not None:
+            self.cached.store(seq_num, header, segment.data if segment.flags & Segment.COMPRESSED else None)
+        return header, segment.data
+
+    def _fill_window(self):
+        if self.log.isEnabledFor(log.DEBUG):
+            self.log.debug("sequence_base=%d, window=%d, eof_reached=%s, sequence_number=%d",
+                           self.sequence_base, self._window(), self.eof_reached, self.sequence_num)
+
+        # Whole window goes out in one send_batch (sendmmsg)
+        batch = []
+        while self.sequence_num < self.sequence_base + self._window() and not self.eof_reached:
+            data, segment_type = self._segment_data(self.sequence_num)
+            if data:
+                self.log.debug("[Num=%d] Sending segment...", self.sequence_num)
+                packed = self._pack_segment(self.sequence_num, data, segment_type)
+                batch.append(packed)
+                self._mark_sent(self.sequence_num, len(packed[1]))
+                if self.deadline is None:
+                    self._restart_timer()
+                self.sequence_num += 1
+            else:
+                self.eof_reached = True
+                self.log.debug("EOF reached.")
+        self.conn.send_batch(batch, self.client_address)
+        self.metrics.on_window(self.sequence_num - self.sequence_base, self._window())
+
+        if self.eof_reached and self.sequence_base >= self.sequence_num:
+            self.log.debug("All segments sent and ACKed.")
+            self._start_close()
+
+    def _go_back(self):
+        # Segments are sliced from the mapped file, rewinding is just moving sequence_num
+        self.sequence_num = self.sequence_base
+        self.eof_reached = False
+
+    def _on_transfer_timeout(self):
+        self.log.info("[Num=%d] Not acked before RTO. Resending frame...", self.sequence_base)
+        self.cc.on_timeout()
+        self._go_back()
+        self._stop_timer()
+        self._fill_window()
+
+    def _handle_ack(self, segment):
+        if not segment.flags & Segment.ACK:
+            return
+        if self.last_ack_received == segment.ack_num and self.last_ack_received != -1:
+            self.metrics.duplicate_acks += 1
+            # Only go back once per loss, the rest of the duplicates are from the old window still in flight
+            if not self.recovering:
+                self.log.info("[Num=%d] Not acked. Found duplicate ack. Resending frame...", self.last_ack_received + 1)
+                if self.trace is not None:
+                    self.trace.record(trace.DUPLICATE_ACK, self.client_address[1], segment.ack_num)
+                self.cc.on_loss(self.rtt.srtt)
+                self._go_back()
+                self.recovering = True
+            else:
+                self.cc.on_duplicate_ack()
+        else:
+            self.recovering = False
+            self.log.debug("[Num=%d] ACK received.", segment.ack_num)
+            if segment.ack_num >= self.sequence_base:
+                self._on_new_ack(segment)
+            self.log.debug("Updated sequence_base=%d", self.sequence_base)
+            if self.sequence_base < self.sequence_num:
+                self._restart_timer()
+            else:
+                self._stop_timer()
+        self.last_ack_received = segment.ack_num
+
+    def _start_close(self):
+        self.log.info("End of file transmission. Closing connection.")
+        if self.compressor is not None:
+            self.log.info("Compression %s", self.compressor.summary())
+        if self.fec is not None:
+            self.log.info("FEC: %d parity segments, last block size %d, loss estimate %.1f%%",
+                          self.metrics.parity_sent, self.fec.k, self.fec.loss * 100)
+        if self.cached is not None:
+            self.log.info("Segment cache: %d of %d sends were packed already", self.cache_hits,
+                          self.metrics.segments_sent)
+            self.cache.save(self.cached, self.sequence_num)
+        self._close_source()
+        self.state = ServerSession.CLOSING
+        self.retries = 0
+        self._send_fin()
+
+    def _send_fin(self):
+        fin_segment = Segment(seq_num=self.sequence_num, flags=Segment.FIN | Segment.ACK,
+                              data=self.hasher.encode() if self.hasher is not None else b"")
+        self.conn.sendto(fin_segment.pack(self.algorithm), self.client_address)
+        self._restart_timer()
+
+    def _handle_fin_ack(self, segment):
+        if segment.flags == (Segment.FIN | Segment.ACK) and segment.ack_num == self.sequence_num + 1:
+            if self.hasher is not None:
+                # The client's digest comes back in the FIN ACK
+                if bytes(segment.data) == self.hasher.digest():
+                    self.log.info("Client verified %d bytes (%s %s)", self.hasher.length, self.hasher.name,
+                                  self.hasher.digest().hex())
+                else:
+                    self.log.warning("Client's %s does not match ours%s", self.hasher.name,
+                                     ", it fetches the bad chunks again" if "refetch" in self.options else "")
+            self.log.info("Closed connection")
+            self._stop_timer()
+            self.state = ServerSession.CLOSED
+            self.metrics.finish()
+
+
+class SelectiveRepeatSession(ServerSession):
+    """Class to represent a client served with selective repeat ARQ"""
+    # Duplicate cumulative ACKs before resending the window base early
+    DUPLICATE_ACK_THRESHOLD = 3
+
+    def __init__(self, conn, client_address, seq_num, filename, options=None, congestion=RenoController.name,
+                 trace=None, cache=None):
+        super().__init__(conn, client_address, seq_num, filename, options, congestion, trace, cache)
+        # seq num -> (packed header, payload view), only segments that have not been acked
+        self.unacked = {}
+        # seq num -> retransmission deadline
+        self.timers = {}
+        self.duplicate_acks = 0
+
+    def next_deadline(self):
+        deadlines = list(self.timers.values())
+        if self.deadline is not None:
+            deadlines.append(self.deadline)
+        return min(deadlines) if deadlines else None
+
+    def on_timer(self, now):
+        super().on_timer(now)
+        expired = [seq_num for seq_num, deadline in self.timers.items() if deadline <= now]
+        if not expired:
+            return
+        # Back off only when the oldest segment times out, like a single TCP timer would
+        if self.sequence_base in expired:
+            self.retries += 1
+            if self.retries > ServerSession.MAX_RETRIES:
+                self.log.warning("No response after %d retries. Giving up.", ServerSession.MAX_RETRIES)
+                self._abort()
+                return
+            self.rtt.backoff()
+            self.cc.on_timeout()
+        self.metrics.timeouts += len(expired)
+        batch = []
+        for seq_num in expired:
+            self.log.debug("[Num=%d] Timed out. Resending segment...", seq_num)
+            self._queue_segment(seq_num, batch)
+        self.conn.send_batch(batch, self.client_address)
+
+    def _abort(self):
+        super()._abort()
+        self.timers.clear()
+
+    def _queue_segment(self, seq_num, batch):
+        batch.append(self.unacked[seq_num])
+        self._mark_sent(seq_num, len(self.unacked[seq_num][1]))
+        self.timers[seq_num] = time.monotonic() + self.rtt.rto
+
+    def _fill_window(self):
+        batch = []
+        while self.sequence_num < self.sequence_base + self._window() and not self.eof_reached:
+            data, segment_type = self._segment_data(self.sequence_num)
+            if data:
+                self.log.debug("[Num=%d] Sending segment...", self.sequence_num)
+                self.unacked[self.sequence_num] = self._pack_segment(self.sequence_num, data, segment_type)
+                self._queue_segment(self.sequence_num, batch)
+                if self.fec is not None and segment_type == Segment.FILEDATA \
+                        and self.fec.add(self.sequence_num, *self.unacked[self.sequence_num]):
+                    self._queue_parity(batch)
+                self.sequence_num += 1
+            else:
+                self.eof_reached = True
+                self.log.debug("EOF reached.")
+        if self.fec is not None and (self.eof_reached or self.fec.holds(self.sequence_base)):
+            # Last, shorter block. Or a window smaller than k: the block can't fill up before its first
+            # segment is acked, so its parity goes now instead of after that segment's ARQ
+            self._queue_parity(batch)
+        self.conn.send_batch(batch, self.client_address)
+        self.metrics.on_window(len(self.unacked), self._window())
+
+        if self.eof_reached and not self.unacked:
+            self._start_close()
+
+    def _queue_parity(self, batch):
+        # Right behind its block, never retransmitted (a lost parity just means ARQ does the work)
+        parity = self.fec.parity()
+        if parity is not None:
+            batch.append((parity.pack_header(self.algorithm), parity.data))
+            self.metrics.parity_sent += 1
+
+    def _acknowledge(self, seq_num):
+        self.unacked.pop(seq_num, None)
+        self.timers.pop(seq_num, None)
+
+    def _handle_ack(self, segment):
+        # ACK flag means ack_num (cumulative) is valid, SACK list can come without it
+        if segment.flags & Segment.ACK:
+            if segment.ack_num >= self.sequence_base:
+                self.log.debug("[Num=%d] ACK received.", segment.ack_num)
+                for seq_num in range(self.sequence_base, segment.ack_num + 1):
+                    self._acknowledge(seq_num)
+                self._on_new_ack(segment)
+                self.duplicate_acks = 0
+            elif segment.ack_num + 1 == self.sequence_base:
+                self.duplicate_acks += 1
+                self.metrics.duplicate_acks += 1
+                if self.duplicate_acks == SelectiveRepeatSession.DUPLICATE_ACK_THRESHOLD \
+                        and self.sequence_base in self.unacked:
+                    self.log.info("[Num=%d] Not acked. Fast retransmit...", self.sequence_base)
+                    if self.trace is not None:
+                        self.trace.record(trace.DUPLICATE_ACK, self.client_address[1], segment.ack_num)
+                    self.cc.on_loss(self.rtt.srtt)
+                    batch = []
+                    self._queue_segment(self.sequence_base, batch)
+                    self.conn.send_batch(batch, self.client_address)
+                elif self.duplicate_acks > SelectiveRepeatSession.DUPLICATE_ACK_THRESHOLD:
+                    self.cc.on_duplicate_ack()
+            if segment.window:
+                self.receive_window = segment.window
+
+        if segment.segment_type == Segment.SACK:
+            for seq_num in Segment.decode_sack(segment.data):
+                self._acknowledge(seq_num)
+                if self.trace is not None:
+                    self.trace.record(trace.SACKED, self.client_address[1], seq_num)
@@ -0,0 +1,169 @@
+"""Sources for the sender: one memory mapped file, many files (manifest) as one stream, or a Stream"""
+import bisect
+import mmap
+import os
+from collections import OrderedDict
+from lib.segment import Segment
+from lib.manifest import Manifest
+from lib.stream import Stream
+
+
+class FileSource:
+    """Class to hand out file segments as memoryview slices, no read() / seek() per segment"""
+    # Segments kept for retransmission, None = any segment can be read again
+    capacity = None
+
+    def __init__(self, filename, segment_size, offset=0, end=None):
+        self.filename = filename
+        self.segment_size = segment_size
+        # Resumed transfer / stripe: segment 0 starts at this byte of the file, the stripe stops at end
+        self.offset = offset
+        self.size = os.path.getsize(filename)
+        self.end = self.size if end is None else min(end, self.size)
+        self._file = open(filename, "rb")
+        # mmap nggak bisa buat file kosong. ACCESS_COPY (private mapping, never written) so the
+        # slices are writable buffers that ctypes (sendmmsg) can point at without copying
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_COPY) if self.size else None
+        self._view = memoryview(self._mmap) if self._mmap else memoryview(b"")
+
+    def segment(self, index):
+        """Function to get the index-th segment (0 based) of the file, empty past EOF"""
+        start = self.offset + index * self.segment_size
+        return self._view[start:min(start + self.segment_size, self.end)]
+
+    def segment_data(self, seq_num):
+        """Function to get (payload, segment type) of seq_num, segment 0 carries the file name"""
+        if seq_num == 0:
+            return os.path.basename(self.filename.encode()), Segment.METADATA
+        return self.segment(seq_num - 1), Segment.FILEDATA
+
+    def release(self, seq_num):
+        """Function to say segments before seq_num are acked, a file can always be read again"""
+        pass
+
+    def close(self):
+        self._view.release()
+        if self._mmap:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A segment still holds a slice, the mapping goes away once it is collected
+                pass
+        self._file.close()
+
+
+class MultiFileSource:
+    """Class to hand out the files of a manifest as one stream, preceded by the MANIFEST segments"""
+    # File descriptors kept open between segments
+    MAX_OPEN_FILES = 64
+    capacity = None
+
+    def __init__(self, manifest, segment_size):
+        self.manifest = manifest
+        self.segment_size = segment_size
+        self.size = manifest.total_size
+        self.manifest_segments = manifest.segments(segment_size)
+        # Stream offset where every file starts
+        self.offsets = []
+        offset = 0
+        for _, size, _ in manifest.entries:
+            self.offsets.append(offset)
+            offset += size
+        self._files = OrderedDict()
+
+    def segment(self, index):
+        """Function to get the index-th segment of the stream, may span several (small) files"""
+        start = index * self.segment_size
+        end = min(start + self.segment_size, self.size)
+        if start >= end:
+            return b""
+        parts = []
+        i = bisect.bisect_right(self.offsets, start) - 1
+        while start < end:
+            _, size, local_path = self.manifest.entries[i]
+            length = min(end, self.offsets[i] + size) - start
+            if length > 0:
+                data = os.pread(self._fd(i, local_path), length, start - self.offsets[i])
+                # File shrank since the manifest was built, pad so the boundaries still line up
+                parts.append(data.ljust(length, b"\0"))
+                start += length
+            i += 1
+        return parts[0] if len(parts) == 1 else b"".join(parts)
+
+    def segment_data(self, seq_num):
+        """Function to get (payload, segment type) of seq_num, manifest first then the stream"""
+        if seq_num < len(self.manifest_segments):
+            return self.manifest_segments[seq_num], Segment.MANIFEST
+        return self.segment(seq_num - len(self.manifest_segments)), Segment.FILEDATA
+
+    def release(self, seq_num):
+        pass
+
+    def _fd(self, index, local_path):
+        fd = self._files.get(index)
+        if fd is None:
+            if len(self._files) >= MultiFileSource.MAX_OPEN_FILES:
+                os.close(self._files.popitem(last=False)[1])
+            fd = os.open(local_path, os.O_RDONLY)
+            self._files[index] = fd
+        else:
+            self._files.move_to_end(index)
+        return fd
+
+    def close(self):
+        for fd in self._files.values():
+            os.close(fd)
+        self._files.clear()
+
+
+class StreamSource:
+    """Class to cut a Stream into segments, keeping the unacked ones for retransmission
+
+    Segments are read as the window reaches them and dropped once acked (release), at most capacity of
+    them are held. Sessions cap their window at capacity, so go-back-N can always rewind to its base.
+    """
+    def __init__(self, stream, segment_size):
+        self.stream = stream
+        self.segment_size = segment_size
+        self.capacity = max(stream.buffer_size // segment_size, 1)
+        # seq num -> payload, for seq nums released_to .. next_seq-1
+        self._segments = {}
+        self._released_to = 1
+        self._next_seq = 1
+        # seq num right after the last data segment, once the stream ran out
+        self._end_seq = None
+
+    def segment_data(self, seq_num):
+        """Function to get (payload, segment type) of seq_num, reading the stream up to it if needed"""
+        if seq_num == 0:
+            return self.stream.name.encode(), Segment.METADATA
+        if seq_num < self._released_to:
+            raise ValueError(f"segment {seq_num} was acked and dropped already")
+        while self._end_seq is None and self._next_seq <= seq_num:
+            data = self.stream.read(self.segment_size)
+            if not data:
+                self._end_seq = self._next_seq
+                break
+            self._segments[self._next_seq] = data
+            self._next_seq += 1
+        if self._end_seq is not None and seq_num >= self._end_seq:
+            return b"", Segment.FILEDATA
+        return self._segments[seq_num], Segment.FILEDATA
+
+    def release(self, seq_num):
+        """Function to drop the segments before seq_num (acked), they are never asked for again"""
+        while self._released_to < min(seq_num, self._next_seq):
+            self._segments.pop(self._released_to, None)
+            self._released_to += 1
+
+    def close(self):
+        self._segments.clear()
+
+
+def open_source(payload, segment_size, offset=0, end=None):
+    """Function to open what the server sends: a file name (optionally a byte range of it), a Manifest or a Stream"""
+    if isinstance(payload, Manifest):
+        return MultiFileSource(payload, segment_size)
+    if isinstance(payload, Stream):
+        return StreamSource(payload, segment_size)
+    return FileSource(payload, segment_size, offset, end)
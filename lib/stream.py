@@ -0,0 +1,75 @@
+"""Streams: send from a pipe / generator instead of a file, receive into a callback instead of a path
+
+A stream can't be sliced or seeked like a mapped file, so the sender keeps the segments it read in a
+bounded retransmission buffer (StreamSource) and the window never runs further ahead of the oldest
+unacked segment than that buffer holds.
+"""
+
+
+class Stream:
+    """Class to describe a byte stream to send: anything with read(n) (stdin, a pipe, socket.makefile("rb"))
+    or any iterable of bytes-like chunks (a generator)
+
+    A stream can only be read once, so it is sent to one client (or one fan-out group). Reads block the
+    sender, a source that stalls stalls the transfer.
+    """
+    # Bytes of the stream kept for retransmission, bounds the window too
+    DEFAULT_BUFFER_SIZE = 8 << 20
+
+    def __init__(self, source, name="stream", buffer_size=DEFAULT_BUFFER_SIZE):
+        if hasattr(source, "read"):
+            self._read = source.read
+            self._chunks = None
+        else:
+            self._read = None
+            self._chunks = iter(source)
+        # Goes into the metadata segment like a file name
+        self.name = name
+        self.buffer_size = buffer_size
+        # Set once a session took the stream, nobody else can get the same bytes
+        self.claimed = False
+        self._pending = memoryview(b"")
+
+    def read(self, size):
+        """Function to read the next size bytes (fewer only at the end), b"" once the stream is over"""
+        parts = []
+        length = 0
+        while length < size:
+            if not self._pending:
+                chunk = self._next_chunk(size - length)
+                if not chunk:
+                    break
+                self._pending = memoryview(chunk).cast("B")
+            part = self._pending[:size - length]
+            self._pending = self._pending[len(part):]
+            parts.append(part)
+            length += len(part)
+        return b"".join(parts)
+
+    def _next_chunk(self, size):
+        if self._read is not None:
+            return self._read(size)
+        # Empty chunks from a generator are not the end of it
+        for chunk in self._chunks:
+            if chunk:
+                return chunk
+        return b""
+
+
+class StreamWriter:
+    """Class to hand in-order payloads to callback(bytes), file-like (write / flush / close) for the client"""
+    def __init__(self, callback):
+        self.callback = callback
+        self.written = 0
+
+    def write(self, data):
+        # Payloads may be views into a receive buffer that gets reused, the callback gets its own copy
+        self.callback(bytes(data))
+        self.written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
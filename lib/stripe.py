@@ -0,0 +1,49 @@
+"""Striped transfers: one file split into byte ranges, each range its own connection (and process)"""
+import os
+
+
+def stripe_range(size, index, count, segment_size):
+    """Function to get the [start, end) bytes of stripe index out of count, starts aligned to whole segments"""
+    segments = -(-size // segment_size)
+    start = min(segments * index // count * segment_size, size)
+    end = min(segments * (index + 1) // count * segment_size, size) if index + 1 < count else size
+    return start, end
+
+
+def parse_stripe(value):
+    """Function to parse a stripe=<index>/<count> option, None if it is not a valid stripe"""
+    index, sep, count = (value or "").partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        return None
+    if not sep or count < 1 or not 0 <= index < count:
+        return None
+    return index, count
+
+
+def worker_path(path, index):
+    """Function to give every worker its own output file (trace, stats), worker 0 keeps the original"""
+    if not path or index == 0:
+        return path
+    return f"{path}.{index}"
+
+
+class RangeWriter:
+    """Class to write one stripe into the shared output file with os.pwrite, file-like (write / close)"""
+    def __init__(self, path, start):
+        # No O_TRUNC, the other stripes are writing the same file
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+        self.position = start
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self.fd, view, self.position)
+            self.position += written
+            view = view[written:]
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,76 @@
+"""Binary event trace (segment sent / acked / retransmitted ...) for analysis after the run
+
+Dump a trace as CSV with: python -m lib.trace <trace file>
+"""
+import struct
+import sys
+import time
+
+MAGIC = b"TOUT"
+VERSION = 1
+# magic, version, wall clock at start
+_HEADER = struct.Struct("<4sBd")
+# seconds since start, event, peer port, seq num, extra (ack num / window / length)
+_RECORD = struct.Struct("<dBHLL")
+
+# EVENTS
+SENT = 1
+RETRANSMIT = 2
+ACKED = 3
+SACKED = 4
+DUPLICATE_ACK = 5
+TIMEOUT = 6
+RECEIVED = 7
+OUT_OF_ORDER = 8
+ACK_SENT = 9
+CORRUPT = 10
+
+EVENT_NAMES = {
+    SENT: "sent", RETRANSMIT: "retransmit", ACKED: "acked", SACKED: "sacked",
+    DUPLICATE_ACK: "duplicate_ack", TIMEOUT: "timeout", RECEIVED: "received",
+    OUT_OF_ORDER: "out_of_order", ACK_SENT: "ack_sent", CORRUPT: "corrupt",
+}
+
+
+class EventTrace:
+    """Class to record fixed size binary events in memory, written out once with dump()"""
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._records = bytearray()
+
+    def record(self, event, port, seq_num=0, extra=0):
+        self._records += _RECORD.pack(time.perf_counter() - self._start, event, port & 0xFFFF,
+                                      seq_num & 0xFFFFFFFF, extra & 0xFFFFFFFF)
+
+    def __len__(self):
+        return len(self._records) // _RECORD.size
+
+    def dump(self, path):
+        """Function to write the trace file"""
+        with open(path, "wb") as file:
+            file.write(_HEADER.pack(MAGIC, VERSION, self.started_at))
+            file.write(self._records)
+
+
+def read_trace(path):
+    """Function to read a trace file, returns (wall clock start, [(t, event name, port, seq, extra)])"""
+    with open(path, "rb") as file:
+        content = file.read()
+    magic, version, started_at = _HEADER.unpack_from(content)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a trace file")
+    events = []
+    for t, event, port, seq_num, extra in _RECORD.iter_unpack(content[_HEADER.size:]):
+        events.append((t, EVENT_NAMES.get(event, str(event)), port, seq_num, extra))
+    return started_at, events
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Format: python -m lib.trace <trace file>")
+        sys.exit(1)
+    _, trace_events = read_trace(sys.argv[1])
+    print("time,event,port,seq_num,extra")
+    for trace_event in trace_events:
+        print("%.6f,%s,%d,%d,%d" % trace_event)
@@ -0,0 +1,115 @@
+"""Write-behind buffer for the receiver: in-order payloads gathered into big writes"""
+import os
+import queue
+import threading
+
+
+class WriteBehind:
+    """Class to gather segment payloads into one write per `size` bytes, file-like (write / flush / close)
+
+    Payloads are copied into a preallocated buffer, so the receive buffers they came from can be reused
+    right away. With threaded=True a full buffer is written by a background thread while the next one
+    fills, there are two buffers so at most one write is pending (bounded memory, the receiver waits
+    only if the disk is slower than the network).
+
+    A failed write breaks the writer: nothing more is written (the bytes after the failure would land in
+    the wrong place), write / flush / close raise the error again. on_disk tells how far the file is good.
+    """
+    DEFAULT_SIZE = 1 << 20
+
+    def __init__(self, file, size=DEFAULT_SIZE, threaded=False):
+        # Unbuffered file (open(path, 'wb', buffering=0)), writes go straight to its fd at the current offset
+        self.file = file
+        self.fd = file.fileno()
+        self.size = size
+        self._buffers = [bytearray(size) for _ in range(2 if threaded else 1)]
+        self._current = 0
+        self._length = 0
+        self.writes = 0
+        # File offset everything before is known to be written (partial writes included)
+        self.on_disk = os.lseek(self.fd, 0, os.SEEK_CUR)
+        self._error = None
+        self._thread = None
+        if threaded:
+            # (buffer index, length) to write, None stops the thread. Written buffers come back through free
+            self._pending = queue.Queue()
+            self._free = queue.Queue()
+            self._free.put(1)
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def write(self, data):
+        self._raise_error()
+        view = memoryview(data)
+        while view:
+            buffer = self._buffers[self._current]
+            length = min(len(view), self.size - self._length)
+            buffer[self._length:self._length + length] = view[:length]
+            self._length += length
+            view = view[length:]
+            if self._length == self.size:
+                self._flush_buffer()
+        return len(data)
+
+    def flush(self):
+        """Function to get everything written so far into the file (waits for the writer thread)"""
+        self._raise_error()
+        if self._length:
+            self._flush_buffer()
+        if self._thread is not None:
+            self._pending.join()
+        self._raise_error()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._thread is not None:
+                self._pending.put(None)
+                self._thread.join()
+            self.file.close()
+
+    def fileno(self):
+        return self.fd
+
+    def _flush_buffer(self):
+        if self._thread is None:
+            try:
+                self._write_all(self._buffers[self._current], self._length)
+            except OSError as error:
+                self._error = error
+                raise
+        else:
+            self._raise_error()
+            self._pending.put((self._current, self._length))
+            # Blocks only while the other buffer is still being written
+            self._current = self._free.get()
+        self._length = 0
+
+    def _write_all(self, buffer, length):
+        view = memoryview(buffer)[:length]
+        while view:
+            written = os.write(self.fd, view)
+            self.on_disk += written
+            view = view[written:]
+        self.writes += 1
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            try:
+                if item is None:
+                    return
+                index, length = item
+                if self._error is None:
+                    try:
+                        self._write_all(self._buffers[index], length)
+                    except OSError as error:
+                        self._error = error
+                self._free.put(index)
+            finally:
+                self._pending.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
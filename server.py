@@ -1,23 +1,78 @@
 """Codee for Server"""
-import sys
+import argparse
+import asyncio
+import configparser
+import multiprocessing
 import os
+import selectors
+import sys
+import time
 from lib.connection import Connection
 from lib.segment import Segment
+from lib.session import ServerSession, SelectiveRepeatSession
+from lib.options import decode_options
+from lib.congestion import CONTROLLERS, RenoController
+from lib.checksum import CHECKSUMS, DEFAULT_CHECKSUM
+from lib.compression import CODECS
+from lib.trace import EventTrace
+from lib.metrics import ServerMetrics, StatsReporter
+from lib.admission import AdmissionQueue
+from lib.fanout import FanOutGroup, FanOutSession
+from lib.manifest import Manifest
+from lib.resume import PrefixCheck
+from lib.stripe import stripe_range, parse_stripe, worker_path
+from lib.cache import SegmentCache
+from lib.stream import Stream
+from lib.fec import ParityEncoder
+from lib.integrity import HASHES, chunk_size_for, parse_fetch
+from lib import aio, log, pmtu
 import lib.util as util
 
+_log = log.get_logger("server")
+
 class Server:
     """Class to represent Server's side """
-    def __init__(self,ip,port) -> None:
+    # Requested options a fan-out group can't give one client
+    FANOUT_IGNORED = ("compress", "fec", "verify", "resume", "stripe", "fetch")
+
+    def __init__(self,ip,port,congestion=RenoController.name,trace_path=None,stats_interval=None,
+                 stats_path=None,fanout=False,multicast_group=None,segment_size=Segment.MAX_SEGMENT_SIZE,
+                 pmtud=False,cache_size=SegmentCache.DEFAULT_SIZE,cache_dir=None) -> None:
         self.ip = ip
         self.port = port
+        self.congestion = congestion
+        # Fan-out: the client list shares one FanOutGroup, optionally sending new data to a multicast group
+        self.fanout = fanout or bool(multicast_group)
+        self.multicast_group = multicast_group
+        self.group = None
+        # Every session records into one trace, written to trace_path when the server closes
+        self.trace_path = trace_path
+        self.trace = EventTrace() if trace_path else None
+        # Counters of every client, server.stats.add_callback(fn) gets a snapshot dict every stats_interval
+        self.metrics = ServerMetrics()
+        self.stats = StatsReporter(self.metrics, stats_interval, stats_path, _log)
         self.conn = Connection(self.ip,self.port)
+        # Largest datagram we send, clients may ask for less (mss option). With pmtud every session
+        # probes the path after its handshake, DF is set on the socket so nothing gets fragmented
+        self.segment_size = segment_size
+        self.pmtud = pmtud and not self.fanout
+        if pmtud and self.fanout:
+            _log.info("Fan-out sends one segment size to every client, --pmtud is off")
+        if self.pmtud and not pmtu.enable_dont_fragment(self.conn.socket):
+            _log.warning("Can't set DF on this platform, path MTU probes may be fragmented")
+        # Packed segments shared by every session (and by runs, with cache_dir), 0 turns it off
+        self.segment_cache = SegmentCache(cache_size, cache_dir) if cache_size else None
+        # Serving until interrupted (daemon, asyncio): clients can come back to fetch chunks that failed verification
+        self.persistent = False
+        # Scratch Segment the receive loop unpacks every datagram into (no allocation per ACK, same full checksum)
+        self._segment = Segment()
 
     def start_udp_server(self,filename):
         """Function to start UDP server"""
         self.conn.bind()
-        print(f"[!] Server started at {self.ip}:{self.port}")
-        print(f"[!] Source file | {filename} | {self.filesize(filename)} bytes")
-        print(f"[!] Listening to broadcast address for clients.")
+        _log.info("Server started at %s:%d", self.ip, self.port)
+        _log.info("Source file | %s | %d bytes", filename, self.filesize(filename))
+        _log.info("Listening to broadcast address for clients.")
 
         # Initializing Client List
         # Send to the server would you like to listen to this client
@@ -28,13 +83,15 @@ class Server:
                 syn_request, client_address = self.conn.recvfrom()
                 if syn_request:
                     # Check the request has SYN flag
-                    unpacked_segment = Segment()
-                    unpacked_segment.unpack(syn_request)
+                    unpacked_segment = Segment.from_bytes(syn_request)
+                    if any(client[0] == client_address for client in client_list):
+                        # Client retrying its SYN while we are still admitting
+                        continue
                     if unpacked_segment.flags == Segment.SYN:
-                        print(f"[!] Received request from {client_address[0]}:{client_address[1]}")
-                        client_list.append((client_address, unpacked_segment.seq_num))
+                        _log.info("Received request from %s:%d", client_address[0], client_address[1])
+                        client_list.append((client_address, unpacked_segment.seq_num, decode_options(unpacked_segment.data)))
                     else:
-                        print("[!] [Received-Request-Error] No SYN Segment Received")
+                        _log.warning("[Received-Request-Error] No SYN Segment Received")
 
                     # Continue Reading Conn after Three way Handshake finish
                     continue_listening = input("[?] Listen more? (y/n): ")
@@ -44,129 +101,543 @@ class Server:
                             print(f"{i}. {client[0][0]}:{client[0][1]}")
                         break
 
-            print(f"\n[!] Commencing file transfer...")
-            for client_address, seq_num in client_list:
-                self.perform_handshake(client_address, seq_num)
-                self.perform_file_transfer(client_address, filename)
+            print()
+            _log.info("Commencing file transfer...")
+            self.serve_clients(client_list, filename)
 
         except KeyboardInterrupt:
             print("\nServer is shutting down.")
         finally:
             self.conn.close()
-            print("Server socket closed.")
-
-
-    def perform_handshake(self,client_address, seq_num):
-        """Function to start handshake"""
-        syn_ack_segment = Segment(seq_num=0, ack_num=seq_num + 1, flags=(Segment.SYN | Segment.ACK))
-        # Second step: Send a SYN + ACK here to the Client
-        print(f"[!] [Handshake] (Sending SYN ACK) Handshake to client {client_address[0]}:{client_address[1]}....")
-        self.conn.sendto(syn_ack_segment.pack(), client_address)
-
-        expected_ack_num = seq_num + 1
-        received = False
-
-        # Third step: Waiting ACK from the Client
-        while not received:
-            ack_from_client, _ = self.conn.recvfrom()
-            if ack_from_client:
-                print(f"[!] [Handshake] (Received) Last ACK from {client_address[0]}:{client_address[1]}")
-                unpacked_segment = Segment()
-                unpacked_segment.unpack(ack_from_client)
-                if unpacked_segment.flags == Segment.ACK and unpacked_segment.ack_num == expected_ack_num:
-                    print(f"[!] [Handshake] (Completed) Handshake to client {client_address[0]}:{client_address[1]}")
-                    return
-                else:
-                    print("[!] [Handshake-Error] Incorrect ACK Segment Received")
-
-
-    def perform_file_transfer(self,client_address, filename, window_size=5):
-        """Function to start performing file transfer"""
-        file = open(filename,"rb")
-        sequence_base = 0
-        sequence_num = 0
-        eof_reached = False
-        last_ack_received = -1
-        sequence_max = sequence_base + window_size
-        
-        while True:
-            print(f"Debug: sequence_base={sequence_base}, sequence_max={sequence_max}, eof_reached={eof_reached}, sequence_number={sequence_num}")
-
-            while sequence_num <= sequence_max and not eof_reached:
-                if sequence_num == 0:
-                    data = os.path.basename(filename.encode())
-                    segment_type = Segment.METADATA
-                else:
-                    data = file.read(Segment.DATA_SIZE)
-                    segment_type = Segment.FILEDATA
-                if data:
-                    print(f"[!] [Client {client_address[0]}:{client_address[1]}] [Num={sequence_num}] Sending segment...")
-                    segment = Segment(seq_num=sequence_num, data=data, segment_type=segment_type)
-                    self.conn.sendto(segment.pack(), client_address)
-                    sequence_num += 1
-                else:
-                    eof_reached = True
-                    print("Debug: EOF reached.")
-
-            # Handle ACKs and adjust window
-            ack_data, _ = self.conn.recvfrom()
-            if ack_data:
-                ack_segment = Segment()
-                ack_segment.unpack(ack_data)
-                if ack_segment.flags & Segment.ACK:
-                    if last_ack_received == ack_segment.ack_num and last_ack_received != -1:
-                        print(f"[!] [Client {client_address[0]}:{client_address[1]}] [Num={last_ack_received+1}] Not acked. Found duplicate ack.")
-                        print(f"[!] [Client {client_address[0]}:{client_address[1]}] Resending frame...")
-                        sequence_num = sequence_base
-                        file.seek((sequence_num - 1) * Segment.DATA_SIZE, 0)
-                        eof_reached = False
-                    else:
-                        print(f"[!] [Client {client_address[0]}:{client_address[1]}] [Num={ack_segment.ack_num}] ACK received.")
-                        sequence_base = max(sequence_base, ack_segment.ack_num + 1)
-                        sequence_max = sequence_base + window_size
-                        print(f"Debug: Updated sequence_base={sequence_base}")
-                    last_ack_received = ack_segment.ack_num
+            if self.trace is not None:
+                self.trace.dump(self.trace_path)
+            _log.info("Server socket closed.")
+
+
+    def serve_forever(self, filename, max_clients=AdmissionQueue.DEFAULT_MAX_CLIENTS,
+                      queue_depth=AdmissionQueue.DEFAULT_QUEUE_DEPTH):
+        """Function to run headless: SYNs are admitted any time, each transfer starts right after its SYN"""
+        self.conn.bind()
+        _log.info("Server started at %s:%d (daemon, max %d clients, queue %d)", self.ip, self.port,
+                  max_clients, queue_depth)
+        _log.info("Source file | %s | %d bytes", filename, self.filesize(filename))
+        admission = AdmissionQueue(max_clients, queue_depth)
+        self.persistent = True
+        try:
+            self._run({}, filename, admission)
+        except KeyboardInterrupt:
+            print("\nServer is shutting down.")
+        finally:
+            self.conn.close()
+            if self.trace is not None:
+                self.trace.dump(self.trace_path)
+            _log.info("Server socket closed.")
+
+    def serve_once(self, filename):
+        """Function to run headless for a single client: the first SYN gets the transfer, then the server stops
+
+        Meant for a Stream (server.py <port> - reads stdin), which can only be sent once anyway.
+        """
+        self.conn.bind()
+        _log.info("Server started at %s:%d (one client)", self.ip, self.port)
+        if isinstance(filename, Stream):
+            _log.info("Source stream | %s | sent as it is read", filename.name)
+        else:
+            _log.info("Source file | %s | %d bytes", filename, self.filesize(filename))
+        try:
+            while True:
+                syn_request, client_address = self.conn.recvfrom(quiet=True)
+                if syn_request and Segment.unpack_header(syn_request)[2] == Segment.SYN:
+                    segment = Segment.from_bytes(syn_request)
+                    if segment.validate_checksum():
+                        break
+            _log.info("Received request from %s:%d", client_address[0], client_address[1])
+            self.serve_clients([(client_address, segment.seq_num, decode_options(segment.data))], filename)
+        except KeyboardInterrupt:
+            print("\nServer is shutting down.")
+        finally:
+            self.conn.close()
+            if self.trace is not None:
+                self.trace.dump(self.trace_path)
+            _log.info("Server socket closed.")
+
+    def serve_clients(self, client_list, filename):
+        """Function to run every client's handshake, transfer and close concurrently"""
+        sessions = {}
+        if self.fanout:
+            self.group = FanOutGroup(self.conn, filename, DEFAULT_CHECKSUM, self.multicast_group, self.segment_size,
+                                     self.segment_cache)
+            if self.multicast_group:
+                self.conn.enable_multicast(self.ip)
+        for client_address, seq_num, requested in client_list:
+            self._open_session(sessions, client_address, seq_num, requested, filename)
+        try:
+            self._run(sessions, filename)
+        finally:
+            if self.group is not None:
+                self.group.close()
+
+    def _open_session(self, sessions, client_address, seq_num, requested, filename):
+        # A stream is read once: one session gets it (a fan-out group reads it once for everyone)
+        if isinstance(filename, Stream) and self.group is None:
+            if filename.claimed:
+                _log.warning("Stream already sent to another client, ignoring %s:%d", client_address[0],
+                             client_address[1])
+                return None
+            filename.claimed = True
+        options = self.negotiate_options(requested)
+        if self.fanout:
+            # Nothing per client in a fan-out group (codec, parity, digest, ranges), say so instead of dropping it
+            ignored = [key for key in Server.FANOUT_IGNORED if key in requested]
+            if requested.get("checksum", DEFAULT_CHECKSUM) != DEFAULT_CHECKSUM:
+                ignored.append("checksum")
+            if ignored:
+                _log.info("Fan-out ignores %s:%d's %s", client_address[0], client_address[1], ", ".join(ignored))
+        stripe = self.negotiate_stripe(requested, filename, int(options["mss"]))
+        fetch = self.negotiate_fetch(requested, filename) if stripe is None else None
+        resume_check = self.negotiate_resume(requested, filename) if stripe is None and fetch is None else None
+        if stripe is not None:
+            _log.info("Sending bytes %d-%d to %s:%d (stripe %s)", stripe[0], stripe[1], client_address[0],
+                      client_address[1], requested["stripe"])
+            options["range"] = f"{stripe[0]}-{stripe[1]}"
+        if fetch is not None:
+            _log.info("Sending bytes %d-%d to %s:%d again (failed verification)", fetch[0], fetch[1],
+                      client_address[0], client_address[1])
+            options["range"] = f"{fetch[0]}-{fetch[1]}"
+        if "verify" in options and isinstance(filename, str):
+            # Chunk digests only for a single file, the client can fetch a chunk of it again. Sized for the
+            # whole file, the resume offset is not known yet
+            start, end = stripe or fetch or (0, self.filesize(filename))
+            options["chunk"] = chunk_size_for(end - start)
+            if self.persistent:
+                options["refetch"] = 1
+        if self.group is not None:
+            session = FanOutSession(self.conn, client_address, seq_num, filename, options=options,
+                                    congestion=self.congestion, trace=self.trace, group=self.group)
+        else:
+            session_class = SelectiveRepeatSession if options["arq"] == Segment.SELECTIVE_REPEAT else ServerSession
+            session = session_class(self.conn, client_address, seq_num, filename, options=options,
+                                    congestion=self.congestion, trace=self.trace, cache=self.segment_cache)
+        # The SYN ACK waits for the prefix hash (worker thread), it carries the resume decision
+        session.resume_check = resume_check
+        sessions[client_address] = session
+        self.metrics.add(session.metrics)
+        session.start()
+        return session
 
-            if eof_reached and sequence_base >= sequence_num:
-                print("Debug: All segments sent and ACKed. Exiting loop.")
-                break
+    def _run(self, sessions, filename, admission=None):
+        # Without admission: until every session is closed. With admission: forever, closed sessions
+        # are dropped and queued SYNs take their place
+        selector = selectors.DefaultSelector()
+        selector.register(self.conn.socket, selectors.EVENT_READ)
+        try:
+            while admission is not None or not all(session.is_closed() for session in sessions.values()):
+                deadlines = [session.next_deadline() for session in sessions.values()]
+                deadlines = [deadline for deadline in deadlines if deadline is not None]
+                timeout = self.conn.gettimeout()
+                if deadlines:
+                    timeout = min(timeout, max(min(deadlines) - time.monotonic(), 0))
+                if self.stats.deadline() is not None:
+                    timeout = min(timeout, max(self.stats.deadline() - time.monotonic(), 0))
+
+                if selector.select(timeout):
+                    self._dispatch(sessions, filename, admission)
+                elif not deadlines and admission is None:
+                    _log.info("Socket timed out")
+
+                now = time.monotonic()
+                for session in sessions.values():
+                    session.on_timer(now)
+                if admission is not None:
+                    self._admit(sessions, filename, admission, now)
+                self.stats.poll(now)
+        finally:
+            selector.close()
+            self.stats.report()
+
+    def _admit(self, sessions, filename, admission, now):
+        for client_address in [address for address, session in sessions.items() if session.is_closed()]:
+            session = sessions.pop(client_address)
+            self.metrics.retire(session.metrics)
+            admission.release(client_address, session.client_seq_num, now)
+        for client_address, seq_num, requested in admission.admit(len(sessions), now):
+            _log.info("Admitting client %s:%d (%d active, %d queued)", client_address[0], client_address[1],
+                      len(sessions) + 1, len(admission))
+            self._open_session(sessions, client_address, seq_num, requested, filename)
 
-        print(f"[!] [Client {client_address[0]}:{client_address[1]}] End of file transmission. Closing connection.")
-        self.perform_close_connection(client_address, sequence_num)
+    def _dispatch(self, sessions, filename, admission=None):
+        # Drain every queued ACK first (recvmmsg), then refill each touched window once
+        touched = []
+        for data, client_address in self.conn.recv_batch(quiet=True):
+            session = sessions.get(client_address)
+            # Header only, a SYN is the one thing worth building a Segment for
+            seq_num, _, flags = Segment.unpack_header(data)[:3]
+            if flags == Segment.SYN and (session is None or seq_num != session.client_seq_num):
+                self._on_syn(sessions, client_address, data, filename, admission)
+                continue
+            if session is None:
+                _log.debug("Ignoring segment from unknown client %s:%d", client_address[0], client_address[1])
+                continue
+            if flags == Segment.SYN and session.state != ServerSession.HANDSHAKE:
+                # Late copy of the SYN this session was opened with
+                continue
+
+            # Bukan header-only: header + view ke payload di-unpack ke satu Segment yang dipake ulang
+            # (sessions never keep it), checksum lengkapnya tetap dicek session di on_segment
+            self._segment.unpack(data)
+            session.on_segment(self._segment)
+            if session not in touched:
+                touched.append(session)
+        for session in touched:
+            session.pump()
+
+    def _on_syn(self, sessions, client_address, data, filename, admission=None):
+        # SYN from a new client, or from one starting over on the same port (new SYN seq num, say a --resume
+        # after an interrupt): its old session is dead, the client goes through admission / the handshake again
+        segment = Segment.from_bytes(data)
+        if not segment.validate_checksum():
+            return
+        session = sessions.get(client_address)
+        if session is not None:
+            if session.is_closed() and admission is None:
+                # Clients picked at startup get the file once
+                return
+            if not session.is_closed():
+                session.reset()
+            self.metrics.retire(sessions.pop(client_address).metrics)
+            if admission is None:
+                # Straight to a new handshake (a fan-out group can't take a late receiver)
+                if self.group is None:
+                    self._open_session(sessions, client_address, segment.seq_num, decode_options(segment.data),
+                                       filename)
+                return
+            # TIME_WAIT keeps late copies of the old SYN out, this one has a new seq num
+            admission.release(client_address, session.client_seq_num)
+        if admission is None:
+            _log.debug("Ignoring SYN from unknown client %s:%d", client_address[0], client_address[1])
+        elif admission.request(client_address, segment.seq_num, decode_options(segment.data)):
+            _log.info("Received request from %s:%d", client_address[0], client_address[1])
+
+    def negotiate_options(self, requested):
+        """Function to pick the handshake options the server agrees to"""
+        arq = requested.get("arq", Segment.GO_BACK_N)
+        if arq not in (Segment.GO_BACK_N, Segment.SELECTIVE_REPEAT):
+            arq = Segment.GO_BACK_N
+        checksum = requested.get("checksum", DEFAULT_CHECKSUM)
+        if checksum not in CHECKSUMS:
+            checksum = DEFAULT_CHECKSUM
+        if self.fanout:
+            # One packed datagram for everyone: same checksum, and receivers must buffer repairs (selective repeat)
+            options = {"arq": Segment.SELECTIVE_REPEAT, "checksum": DEFAULT_CHECKSUM, "mss": self.segment_size}
+            if self.multicast_group and requested.get("multicast") == "1":
+                options["multicast"] = self.multicast_group
+            return options
+        # Segment size: the smaller of what the client can take and our max, never below the probe fallback
+        try:
+            mss = int(requested.get("mss", self.segment_size))
+        except ValueError:
+            mss = self.segment_size
+        options = {"arq": arq, "checksum": checksum, "mss": max(min(mss, self.segment_size), pmtu.BASE_SIZE)}
+        if self.pmtud:
+            options["pmtud"] = 1
+        # Compression only if we know the codec, otherwise the client gets raw segments
+        if requested.get("compress") in CODECS:
+            options["compress"] = requested["compress"]
+        # FEC: the receiver has to hold the segments around a loss until the parity comes, so selective repeat
+        if requested.get("fec") == "1":
+            options["fec"] = ParityEncoder.DEFAULT_K
+            options["arq"] = Segment.SELECTIVE_REPEAT
+        # End-to-end digest of the data in the FIN, checked by the client
+        if requested.get("verify") in HASHES:
+            options["verify"] = requested["verify"]
+        return options
+
+    def negotiate_stripe(self, requested, filename, segment_size):
+        """Function to get the (start, end) bytes a striped client asked for with stripe=<index>/<count>
+
+        Any worker can serve any stripe, the range only depends on the file size and the negotiated
+        segment size (the same for every stripe, they all ask for the same mss). None means the whole
+        file (no stripe asked, or a fan-out / multi-file session).
+        """
+        stripe = parse_stripe(requested.get("stripe"))
+        if stripe is None or self.fanout or isinstance(filename, (Manifest, Stream)):
+            return None
+        # Starts on the session's own segment boundaries, a smaller probed size (pmtud) only costs the
+        # stripe one short last segment
+        return stripe_range(self.filesize(filename), stripe[0], stripe[1], segment_size - Segment.HEADER_SIZE)
+
+    def negotiate_fetch(self, requested, filename):
+        """Function to get the (start, end) bytes a client asks for again with fetch=<start>-<end>
+
+        Sent after a chunk failed verification, the end is clipped to the file. None means the whole file
+        (no fetch asked, a range outside the file, or a fan-out / multi-file / stream session).
+        """
+        fetch = parse_fetch(requested.get("fetch"))
+        if fetch is None or self.fanout or isinstance(filename, (Manifest, Stream)):
+            return None
+        size = self.filesize(filename)
+        if fetch[0] >= size:
+            return None
+        return fetch[0], min(fetch[1], size)
+
+    def negotiate_resume(self, requested, filename):
+        """Function to check a client's resume request, returns a PrefixCheck (None = from scratch)
+
+        The client sends resume=<bytes it has> and resume_hash=<sha256 of them>, we only agree if our
+        file has the same prefix. That hash runs on a worker thread, the session waits for it before its
+        SYN ACK. Fan-out (lockstep) and multi-file sessions always start from scratch.
+        """
+        try:
+            offset = int(requested.get("resume", 0))
+        except ValueError:
+            return None
+        if offset <= 0 or self.fanout or isinstance(filename, (Manifest, Stream)) \
+                or offset > self.filesize(filename):
+            return None
+        return PrefixCheck(filename, offset, requested.get("resume_hash"))
 
     def filesize(self,filename):
-        """Function to get size of a file"""
+        """Function to get size of a file (or every file of a manifest), -1 if unknown (missing file, stream)"""
+        if isinstance(filename, Manifest):
+            return filename.total_size
+        if isinstance(filename, Stream):
+            return -1
         return os.path.getsize(filename) if os.path.exists(filename) else -1
 
-    def perform_close_connection(self, client_address, seq_num):
-        fin_segment = Segment(seq_num=seq_num, flags=Segment.FIN|Segment.ACK)
-        self.conn.sendto(fin_segment.pack(), client_address)
 
-        expected_ack_num = seq_num + 1
+class AsyncServer(Server):
+    """Class to serve clients from an asyncio event loop: await accept() then send_file() for each one
+
+    Every transfer is the same ServerSession as in the blocking server, driven by lib.aio.ServerProtocol,
+    so any number of transfers share one loop and one socket. Fan-out needs the whole client list before
+    the first segment, it stays with the blocking server.
+    """
+    def __init__(self, ip, port, **kwargs):
+        super().__init__(ip, port, **kwargs)
+        if self.fanout:
+            raise ValueError("fan-out needs the blocking server (serve_clients)")
+        self.protocol = None
+        self._stats_timer = None
+
+    async def start(self):
+        """Function to bind the socket and start receiving on the running loop"""
+        loop = asyncio.get_running_loop()
+        # Our socket (DF, receive buffer already set up) handed over to the loop
+        self.conn.bind()
+        _, self.protocol = await loop.create_datagram_endpoint(aio.ServerProtocol, sock=self.conn.socket)
+        self.conn = self.protocol.conn
+        _log.info("Server started at %s:%d (asyncio)", self.ip, self.port)
+        self._stats_timer = aio.Timer(loop, self._poll_stats)
+        self._poll_stats()
+
+    async def accept(self):
+        """Function to wait for a client's SYN, returns the client to pass to send_file"""
+        return await self.protocol.syns.get()
+
+    async def send_file(self, client, filename):
+        """Function to run one accepted client's handshake, transfer and close, returns its metrics"""
+        client_address, seq_num, requested = client
+        session = self._open_session(self.protocol.sessions, client_address, seq_num, requested, filename)
+        if session is None:
+            raise ValueError("the stream was sent to another client already")
+        session = await self.protocol.watch(session)
+        self.metrics.retire(session.metrics)
+        return session.metrics
+
+    async def serve(self, filename, max_clients=AdmissionQueue.DEFAULT_MAX_CLIENTS):
+        """Function to accept and serve clients until cancelled, at most max_clients transfers at a time"""
+        slots = asyncio.Semaphore(max_clients)
+        tasks = set()
+        self.persistent = True
+
+        def on_done(task):
+            tasks.discard(task)
+            slots.release()
+
+        try:
+            while True:
+                # SYNs of clients over the limit wait in the protocol's queue (the client keeps retrying)
+                await slots.acquire()
+                client = await self.accept()
+                task = asyncio.ensure_future(self.send_file(client, filename))
+                tasks.add(task)
+                task.add_done_callback(on_done)
+        finally:
+            for task in tasks:
+                task.cancel()
 
-        while True:
-            ack_from_client, recv_client_address = self.conn.recvfrom()
-            if ack_from_client and recv_client_address == client_address:
-                segment = Segment()
-                segment.unpack(ack_from_client)
-                if segment.flags == (Segment.FIN|Segment.ACK) and segment.ack_num == expected_ack_num:
-                    print(f"[!] Closed connection with {client_address[0]}:{client_address[1]}")
-                    break
+    def close(self):
+        """Function to close the socket, write the final stats and the trace"""
+        if self._stats_timer is not None:
+            self._stats_timer.cancel()
+        self.conn.close()
+        self.stats.report()
+        if self.trace is not None:
+            self.trace.dump(self.trace_path)
+        _log.info("Server socket closed.")
+
+    def _poll_stats(self):
+        self.stats.poll(time.monotonic())
+        self._stats_timer.arm(self.stats.deadline())
+
+
+def source_from_paths(paths, stream_buffer=Stream.DEFAULT_BUFFER_SIZE):
+    """Function to pick what to send: a single file as is, several files or directories as a Manifest, - for stdin"""
+    if paths == ["-"]:
+        return Stream(sys.stdin.buffer, "stdin", stream_buffer)
+    if len(paths) == 1 and os.path.isfile(paths[0]):
+        return paths[0]
+    return Manifest.from_paths(paths)
+
+
+def serve_worker(index, ip, port, source, args):
+    """Function to run one daemon worker process on its own port (--workers)"""
+    log.setup(args.log_level)
+    server = Server(ip,port,congestion=args.congestion,trace_path=worker_path(args.trace, index),
+                    stats_interval=args.stats_interval,stats_path=worker_path(args.stats_file, index),
+                    segment_size=args.segment_size,pmtud=args.pmtud,cache_size=args.cache_size << 20,
+                    cache_dir=args.cache_dir)
+    server.serve_forever(source, args.max_clients, args.queue_depth)
+
+
+async def serve_async(ip, port, source, args):
+    """Function to run the asyncio server from the command line (--asyncio) until interrupted"""
+    server = AsyncServer(ip,port,congestion=args.congestion,trace_path=args.trace,
+                         stats_interval=args.stats_interval,stats_path=args.stats_file,
+                         segment_size=args.segment_size,pmtud=args.pmtud,cache_size=args.cache_size << 20,
+                         cache_dir=args.cache_dir)
+    await server.start()
+    _log.info("Source file | %s | %d bytes", source, server.filesize(source))
+    try:
+        await server.serve(source, args.max_clients)
+    finally:
+        server.close()
+
+
+# Keys of the config file's [server] section (long flag names, - or _) and how their values are read.
+# Kept in step with the add_argument calls below, bool = store_true flag
+CONFIG_TYPES = {
+    "congestion": str, "log_level": str, "trace": str, "stats_interval": float, "stats_file": str,
+    "daemon": bool, "max_clients": int, "queue_depth": int, "fanout": bool, "multicast": str, "workers": int,
+    "segment_size": int, "pmtud": bool, "cache_size": int, "cache_dir": str, "stream_buffer": float,
+    "asyncio": bool,
+}
+
+
+def load_config(path, parser):
+    """Function to read the [server] section of an INI file into argparse defaults"""
+    config = configparser.ConfigParser()
+    if not config.read(path):
+        parser.error(f"cannot read config file {path}")
+    if not config.has_section("server"):
+        return {}
+    defaults = {}
+    for key, value in config.items("server"):
+        dest = key.replace("-", "_")
+        value_type = CONFIG_TYPES.get(dest)
+        if value_type is None:
+            parser.error(f"unknown option {key} in {path}")
+        try:
+            defaults[dest] = config.getboolean("server", key) if value_type is bool else value_type(value)
+        except ValueError:
+            parser.error(f"bad value {value!r} for {key} in {path}")
+    return defaults
 
 
 if __name__ == "__main__":
     DEFAULT_IP_ADDRESS = "127.0.0.1"
 
-    if len(sys.argv) != 3:
-        print("Format: python server.py <port> <filename>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="TCP over UDP file sender")
+    parser.add_argument("port", type=int)
+    parser.add_argument("filename", nargs="+",
+                        help="file to send, several files / directories sent in one session, or - to stream stdin "
+                             "to the first client")
+    parser.add_argument("--congestion", choices=list(CONTROLLERS), default=RenoController.name,
+                        help="congestion controller used for every client")
+    parser.add_argument("--log-level", choices=log.LEVELS, default="INFO",
+                        help="DEBUG prints every segment, slow on big files")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write a binary event trace (read it with python -m lib.trace FILE)")
+    parser.add_argument("--stats-interval", type=float, metavar="S",
+                        help="log a stats line (and rewrite --stats-file) every S seconds")
+    parser.add_argument("--stats-file", metavar="FILE",
+                        help="JSON snapshot of the transfer counters, rewritten on every report")
+    parser.add_argument("--daemon", action="store_true",
+                        help="no prompt, admit clients continuously and keep serving until interrupted")
+    parser.add_argument("--max-clients", type=int, default=AdmissionQueue.DEFAULT_MAX_CLIENTS,
+                        help="daemon: clients served at the same time")
+    parser.add_argument("--queue-depth", type=int, default=AdmissionQueue.DEFAULT_QUEUE_DEPTH,
+                        help="daemon: SYNs waiting for a free slot, more than this are dropped")
+    parser.add_argument("--fanout", action="store_true",
+                        help="pack every segment once and send it to all clients, repair per client "
+                             "(no per-client options: clients' --compress, --fec, --verify, --resume, "
+                             "--checksum and --pmtud are ignored)")
+    parser.add_argument("--multicast", metavar="GROUP",
+                        help="fan-out to this IP multicast group (clients started with --multicast)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="daemon: processes serving ports port .. port+N-1 (for striped clients)")
+    parser.add_argument("--segment-size", type=int, default=Segment.MAX_SEGMENT_SIZE, metavar="BYTES",
+                        help="largest datagram to send (header included), clients may negotiate it down")
+    parser.add_argument("--pmtud", action="store_true",
+                        help="probe every client's path MTU after the handshake (DF set, no IP fragmentation)")
+    parser.add_argument("--cache-size", type=int, default=SegmentCache.DEFAULT_SIZE >> 20, metavar="MB",
+                        help="memory for packed segments shared by all clients (0 = pack per client)")
+    parser.add_argument("--cache-dir", metavar="DIR",
+                        help="keep fully packed files here too, reused by the next server run")
+    parser.add_argument("--stream-buffer", type=float, default=Stream.DEFAULT_BUFFER_SIZE / (1 << 20), metavar="MB",
+                        help="stdin (-): unacked data kept for retransmission, also caps the window")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="serve clients as they come from one asyncio event loop (no prompt, like --daemon)")
+    parser.add_argument("--config", metavar="FILE",
+                        help="INI file with a [server] section, keys are the long flag names (max_clients = 8)")
+    args = parser.parse_args()
+    if args.config:
+        parser.set_defaults(**load_config(args.config, parser))
+        args = parser.parse_args()
+    log.setup(args.log_level)
+    streaming = "-" in args.filename
+    if streaming and (len(args.filename) > 1 or args.daemon or args.asyncio or args.fanout or args.multicast):
+        parser.error("- streams stdin to one client, not together with files, --daemon, --asyncio or --fanout")
+    missing = [path for path in args.filename if path != "-" and not os.path.exists(path)]
+    if missing:
+        parser.error(f"no such file or directory: {', '.join(missing)}")
+    if args.stream_buffer <= 0:
+        parser.error("--stream-buffer must be positive")
+    source = source_from_paths(args.filename, int(args.stream_buffer * (1 << 20)))
+    if (args.daemon or args.asyncio) and (args.fanout or args.multicast):
+        parser.error("--fanout / --multicast need the interactive client list, not --daemon / --asyncio")
+    if args.asyncio and (args.daemon or args.workers > 1):
+        parser.error("--asyncio is its own serving mode, not combined with --daemon / --workers")
+    if not pmtu.BASE_SIZE <= args.segment_size <= Connection.MAX_DATAGRAM_SIZE:
+        parser.error(f"--segment-size must be between {pmtu.BASE_SIZE} and {Connection.MAX_DATAGRAM_SIZE}")
+    if args.cache_size < 0:
+        parser.error("--cache-size can't be negative")
+    if args.workers < 1 or (args.workers > 1 and not args.daemon):
+        parser.error("--workers needs --daemon (and at least 1 worker)")
 
-    try:
-        PORT = int(sys.argv[1])
-    except ValueError:
-        print("Error: Port number must be an integer.")
-        sys.exit(1)
-
-    FILENAME = sys.argv[2]
-    server = Server(DEFAULT_IP_ADDRESS,PORT)
-    server.start_udp_server(FILENAME)
+    if args.asyncio:
+        try:
+            asyncio.run(serve_async(DEFAULT_IP_ADDRESS, args.port, source, args))
+        except KeyboardInterrupt:
+            print("\nServer is shutting down.")
+    else:
+        server = Server(DEFAULT_IP_ADDRESS,args.port,congestion=args.congestion,trace_path=args.trace,
+                        stats_interval=args.stats_interval,stats_path=args.stats_file,
+                        fanout=args.fanout,multicast_group=args.multicast,segment_size=args.segment_size,
+                        pmtud=args.pmtud,cache_size=args.cache_size << 20,cache_dir=args.cache_dir)
+        if args.daemon:
+            # Extra workers are separate processes (one core each), worker 0 is this one
+            workers = [multiprocessing.Process(target=serve_worker,
+                                               args=(index, DEFAULT_IP_ADDRESS, args.port + index, source, args))
+                       for index in range(1, args.workers)]
+            for worker in workers:
+                worker.start()
+            try:
+                server.serve_forever(source, args.max_clients, args.queue_depth)
+            finally:
+                for worker in workers:
+                    worker.join()
+        elif streaming:
+            server.serve_once(source)
+        else:
+            server.start_udp_server(source)
@@ -0,0 +1,43 @@
+from lib import ack
+from lib.ack import DelayedAck
+
+
+def fake_clock(monkeypatch, start=10.0):
+    now = [start]
+    monkeypatch.setattr(ack.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_acks_every_n_in_order_segments(monkeypatch):
+    fake_clock(monkeypatch)
+    delayed = DelayedAck(every=3, delay=0.04)
+    assert not delayed.on_in_order()
+    assert not delayed.on_in_order()
+    assert delayed.on_in_order()
+    delayed.sent()
+    assert delayed.pending == 0
+    assert not delayed.due(100.0)
+
+
+def test_lone_segment_is_acked_after_the_delay(monkeypatch):
+    now = fake_clock(monkeypatch)
+    delayed = DelayedAck(every=2, delay=0.04)
+    assert not delayed.on_in_order()
+    # The deadline counts from the first unACKed segment, later ones don't push it back
+    now[0] += 0.03
+    delayed.on_out_of_order()
+    assert not delayed.due(now[0])
+    assert delayed.due(10.04)
+
+
+def test_out_of_order_sets_a_deadline_without_counting(monkeypatch):
+    fake_clock(monkeypatch)
+    delayed = DelayedAck()
+    delayed.on_out_of_order()
+    assert delayed.pending == 0
+    assert delayed.due(10.0 + DelayedAck.DEFAULT_DELAY)
+
+
+def test_every_is_at_least_one():
+    delayed = DelayedAck(every=0)
+    assert delayed.on_in_order()
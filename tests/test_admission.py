@@ -0,0 +1,52 @@
+from lib.admission import AdmissionQueue
+
+A, B, C = ("127.0.0.1", 9101), ("127.0.0.1", 9102), ("127.0.0.1", 9103)
+
+
+def test_admits_in_order_up_to_the_limit():
+    queue = AdmissionQueue(max_clients=2, queue_depth=8)
+    for seq_num, address in enumerate((A, B, C)):
+        assert queue.request(address, seq_num, {}, now=0)
+    assert [address for address, _, _ in queue.admit(0, now=1)] == [A, B]
+    assert queue.admit(2, now=1) == []
+    assert queue.admit(1, now=1) == [(C, 2, {})]
+
+
+def test_duplicate_syn_and_full_queue():
+    queue = AdmissionQueue(max_clients=1, queue_depth=1)
+    assert queue.request(A, 0, {}, now=0)
+    assert not queue.request(A, 0, {}, now=0.5)
+    assert not queue.request(B, 0, {}, now=0.5)
+    assert queue.rejected == 1
+    assert len(queue) == 1
+
+
+def test_stale_syn_is_not_admitted():
+    queue = AdmissionQueue()
+    queue.request(A, 0, {}, now=0)
+    assert queue.admit(0, now=AdmissionQueue.QUEUE_TIMEOUT + 1) == []
+
+
+def test_time_wait_ignores_a_closed_clients_syn_for_a_while():
+    queue = AdmissionQueue()
+    queue.release(A, 7, now=10)
+    assert not queue.request(A, 7, {}, now=10 + AdmissionQueue.TIME_WAIT / 2)
+    assert queue.request(A, 7, {}, now=10 + AdmissionQueue.TIME_WAIT)
+    # Old entries are dropped on the next release
+    queue.release(B, 0, now=100)
+    assert A not in queue.time_wait
+
+
+def test_new_connection_gets_past_time_wait():
+    queue = AdmissionQueue()
+    queue.release(A, 7, now=10)
+    assert queue.request(A, 8, {"resume": "1"}, now=10.1)
+
+
+def test_client_starting_over_keeps_its_place_in_the_queue():
+    queue = AdmissionQueue(max_clients=1)
+    queue.request(A, 1, {}, now=0)
+    queue.request(B, 1, {}, now=0)
+    assert not queue.request(B, 2, {"resume": "1"}, now=1)
+    assert queue.admit(0, now=2) == [(A, 1, {})]
+    assert queue.admit(0, now=2) == [(B, 2, {"resume": "1"})]
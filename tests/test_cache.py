@@ -0,0 +1,102 @@
+import os
+import pytest
+from lib.cache import SegmentCache
+from lib.source import FileSource
+
+HEADER = bytes(14)
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "source.bin"
+    path.write_bytes(bytes(range(256)) * 40)
+    return str(path)
+
+
+def stream_of(cache, path, segment_size=1024, checksum="crc16", codec=None):
+    source = FileSource(path, segment_size)
+    try:
+        return cache.stream(source, checksum, codec)
+    finally:
+        source.close()
+
+
+def test_same_file_and_options_share_a_stream(source_file):
+    cache = SegmentCache()
+    stream = stream_of(cache, source_file)
+    assert stream_of(cache, source_file) is stream
+    assert stream_of(cache, source_file, checksum="crc32") is not stream
+    assert stream_of(cache, source_file, segment_size=512) is not stream
+
+
+def test_packed_segments(source_file):
+    stream = stream_of(SegmentCache(), source_file)
+    assert stream.packed(0, b"raw") is None
+    stream.store(0, HEADER)
+    stream.store(1, HEADER, b"compressed")
+    assert stream.packed(0, b"raw") == (HEADER, b"raw")
+    assert stream.packed(1, b"raw") == (HEADER, b"compressed")
+    assert stream.is_complete(2)
+    assert not stream.is_complete(3)
+
+
+def test_least_recently_used_stream_is_evicted(source_file):
+    cache = SegmentCache(max_bytes=3 * (SegmentCache.ENTRY_OVERHEAD + len(HEADER)))
+    first = stream_of(cache, source_file)
+    second = stream_of(cache, source_file, checksum="crc32")
+    first.store(0, HEADER)
+    second.store(0, HEADER)
+    # Touch first, second is now the oldest
+    assert stream_of(cache, source_file) is first
+    first.store(1, HEADER)
+    first.store(2, HEADER)
+    assert second.evicted
+    assert not first.evicted
+    assert cache.size == first.size
+    # Evicted streams stop growing
+    second.store(1, HEADER)
+    assert 1 not in second.segments
+
+
+def test_changed_file_drops_the_old_stream(source_file):
+    cache = SegmentCache()
+    old = stream_of(cache, source_file)
+    with open(source_file, "ab") as file:
+        file.write(b"more")
+    assert stream_of(cache, source_file) is not old
+    assert old.evicted
+
+
+def test_sidecar_survives_a_restart(source_file, tmp_path):
+    directory = str(tmp_path / "cache")
+    stream = stream_of(SegmentCache(directory=directory), source_file)
+    stream.store(0, HEADER)
+    stream.store(1, HEADER, b"compressed")
+    stream.cache.save(stream, 2)
+    assert stream.saved
+
+    loaded = stream_of(SegmentCache(directory=directory), source_file)
+    assert loaded.packed(0, b"raw") == (HEADER, b"raw")
+    assert loaded.packed(1, b"raw") == (HEADER, b"compressed")
+
+
+def test_sidecar_of_a_changed_file_is_not_used(source_file, tmp_path):
+    directory = str(tmp_path / "cache")
+    stream = stream_of(SegmentCache(directory=directory), source_file)
+    stream.store(0, HEADER)
+    stream.cache.save(stream, 1)
+    stat = os.stat(source_file)
+    os.utime(source_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert stream_of(SegmentCache(directory=directory), source_file).segments == {}
+
+
+def test_broken_sidecar_is_ignored(source_file, tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = SegmentCache(directory=directory)
+    stream = stream_of(cache, source_file)
+    stream.store(0, HEADER, b"compressed")
+    cache.save(stream, 1)
+    [name] = os.listdir(directory)
+    with open(os.path.join(directory, name), "r+b") as file:
+        file.truncate(os.path.getsize(file.name) - 3)
+    assert stream_of(SegmentCache(directory=directory), source_file).segments == {}
@@ -0,0 +1,71 @@
+import os
+import pytest
+from lib.util import crc16
+from lib.segment import Segment
+from lib.checksum import CHECKSUMS
+
+
+def crc16_bitwise(data, crc=0xFFFF):
+    # CRC-16/MODBUS one bit at a time, the reference for the slicing-by-8 tables
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def test_crc16_check_value():
+    assert crc16(b"123456789") == 0x4B37
+
+
+@pytest.mark.parametrize("length", [0, 1, 7, 8, 9, 15, 16, 17, 64, 1001])
+def test_crc16_matches_bitwise(length):
+    data = os.urandom(length)
+    assert crc16(data) == crc16_bitwise(data)
+
+
+def test_crc16_continues_across_calls():
+    header, data = os.urandom(14), os.urandom(333)
+    assert crc16(data, crc16(header)) == crc16(header + data)
+
+
+@pytest.mark.parametrize("name", list(CHECKSUMS))
+@pytest.mark.parametrize("length", [0, 1, 2, 1185])
+def test_backends_validate_and_catch_a_flipped_bit(name, length):
+    algorithm = CHECKSUMS[name]
+    packed = bytearray(Segment(seq_num=7, ack_num=3, segment_type=Segment.FILEDATA,
+                               data=os.urandom(length)).pack(algorithm))
+    assert Segment.from_bytes(bytes(packed)).validate_checksum(algorithm)
+    packed[-1 if length else 0] ^= 0x01
+    assert not Segment.from_bytes(bytes(packed)).validate_checksum(algorithm)
+
+
+def inet_words(data):
+    # RFC 1071 reference: add 16 bit words, end-around carry, complement
+    if len(data) % 2:
+        data += b"\0"
+    total = 0
+    for index in range(0, len(data), 2):
+        total += int.from_bytes(data[index:index + 2], "big")
+        while total >> 16:
+            total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def test_inet_rfc1071_example():
+    # Words 0001 f203 f4f5 f6f7 sum to ddf2 after the carries
+    assert CHECKSUMS["inet"](b"", bytes.fromhex("0001f203f4f5f6f7")) == 0xFFFF - 0xDDF2
+
+
+@pytest.mark.parametrize("data, expected", [
+    (b"\xff\xff" * 4, 0x0000), (b"\xff\xff", 0x0000), (b"\x00\x00" * 3, 0xFFFF), (b"", 0xFFFF),
+])
+def test_inet_edge_sums(data, expected):
+    assert CHECKSUMS["inet"](b"", data) == expected
+    assert inet_words(data) == expected
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 3, 14, 1001, 32754])
+def test_inet_matches_word_loop(length):
+    header, data = os.urandom(14), os.urandom(length)
+    assert CHECKSUMS["inet"](header, data) == inet_words(header + data)
@@ -0,0 +1,43 @@
+import os
+import pytest
+from lib.compression import CODECS, Compressor, decompress
+
+TEXT = b"segment payload " * 100
+
+
+@pytest.mark.parametrize("name", list(CODECS))
+def test_round_trip(name):
+    compressor = Compressor(name)
+    payload, compressed = compressor.compress(TEXT)
+    assert compressed and len(payload) < len(TEXT)
+    assert decompress(name, payload, len(TEXT)) == TEXT
+
+
+def test_incompressible_data_is_sent_raw():
+    compressor = Compressor("zlib")
+    data = os.urandom(1000)
+    assert compressor.compress(data) == (data, False)
+
+
+def test_skips_after_misses_then_tries_again():
+    compressor = Compressor("zlib")
+    for _ in range(Compressor.MISS_LIMIT):
+        compressor.compress(os.urandom(1000))
+    assert compressor.skipping == Compressor.SKIP
+    # Even compressible data goes raw while skipping
+    for _ in range(Compressor.SKIP):
+        assert compressor.compress(TEXT) == (TEXT, False)
+    assert compressor.compress(TEXT)[1]
+
+
+def test_decompress_never_exceeds_max_length():
+    payload, _ = Compressor("zlib").compress(TEXT)
+    assert len(decompress("zlib", payload, 100)) == 100
+
+
+def test_summary_counts_bytes():
+    compressor = Compressor("zlib")
+    payload, _ = compressor.compress(TEXT)
+    compressor.count(len(TEXT), len(payload))
+    assert compressor.raw_bytes == 2 * len(TEXT)
+    assert compressor.sent_bytes == 2 * len(payload)
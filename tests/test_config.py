@@ -0,0 +1,35 @@
+import argparse
+import pytest
+from server import load_config
+
+
+def write_config(tmp_path, text):
+    path = tmp_path / "server.ini"
+    path.write_text(text)
+    return str(path)
+
+
+def test_values_get_their_flag_types(tmp_path):
+    path = write_config(tmp_path, "[server]\nmax_clients = 8\nqueue-depth = 4\ndaemon = yes\npmtud = off\n"
+                                  "stream_buffer = 0.5\ncongestion = cubic\n")
+    assert load_config(path, argparse.ArgumentParser()) == {
+        "max_clients": 8, "queue_depth": 4, "daemon": True, "pmtud": False, "stream_buffer": 0.5,
+        "congestion": "cubic",
+    }
+
+
+def test_no_server_section(tmp_path):
+    assert load_config(write_config(tmp_path, "[client]\narq = sr\n"), argparse.ArgumentParser()) == {}
+
+
+@pytest.mark.parametrize("text", [
+    "[server]\nbogus = 1\n", "[server]\nport = 9000\n", "[server]\nmax_clients = many\n", "[server]\ndaemon = maybe\n",
+])
+def test_bad_config_is_a_usage_error(tmp_path, text):
+    with pytest.raises(SystemExit):
+        load_config(write_config(tmp_path, text), argparse.ArgumentParser())
+
+
+def test_missing_file_is_a_usage_error(tmp_path):
+    with pytest.raises(SystemExit):
+        load_config(str(tmp_path / "missing.ini"), argparse.ArgumentParser())
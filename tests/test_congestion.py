@@ -0,0 +1,73 @@
+import pytest
+from lib import congestion
+from lib.congestion import CongestionController, CubicController, RenoController, create_controller
+
+
+def test_create_controller_by_name():
+    for name, cls in congestion.CONTROLLERS.items():
+        assert type(create_controller(name)) is cls
+    with pytest.raises(KeyError):
+        create_controller("vegas")
+
+
+def test_fixed_window_never_moves():
+    cc = CongestionController()
+    cc.on_ack(10)
+    cc.on_loss()
+    cc.on_timeout()
+    assert cc.window == CongestionController.INITIAL_WINDOW
+
+
+def test_reno_slow_start_then_congestion_avoidance():
+    cc = RenoController()
+    cc.on_ack(4)
+    assert cc.window == 8
+    cc.ssthresh = 8
+    cc.on_ack(8)
+    # One segment per window of ACKs past ssthresh
+    assert cc.cwnd == pytest.approx(9)
+
+
+def test_reno_fast_recovery():
+    cc = RenoController(initial_window=20)
+    cc.on_loss()
+    assert cc.ssthresh == 10
+    assert cc.cwnd == 13
+    # A second loss signal in the same window doesn't halve again
+    cc.on_loss()
+    cc.on_duplicate_ack()
+    assert cc.cwnd == 14
+    cc.on_ack(1)
+    assert not cc.in_recovery
+    assert cc.cwnd == 10
+
+
+def test_reno_timeout_goes_back_to_one_segment():
+    cc = RenoController(initial_window=3)
+    cc.on_timeout()
+    assert cc.window == 1
+    assert cc.ssthresh == RenoController.MIN_SSTHRESH
+
+
+def test_cubic_backs_off_less_than_reno():
+    cc = CubicController(initial_window=20)
+    cc.on_loss()
+    assert cc.w_max == 20
+    assert cc.ssthresh == pytest.approx(20 * CubicController.BETA)
+    cc.on_ack(1)
+    assert cc.cwnd == pytest.approx(14)
+
+
+def test_cubic_grows_back_towards_w_max(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(congestion.time, "monotonic", lambda: now[0])
+    cc = CubicController(initial_window=20)
+    cc.on_loss()
+    cc.on_ack(1)
+    windows = []
+    for _ in range(40):
+        now[0] += 0.1
+        cc.on_ack(int(cc.cwnd), rtt=0.1)
+        windows.append(cc.cwnd)
+    assert windows == sorted(windows)
+    assert windows[-1] > cc.w_max
@@ -0,0 +1,48 @@
+import pytest
+from lib import batch
+from lib.connection import Connection
+
+
+@pytest.fixture
+def pair():
+    receiver = Connection("127.0.0.1", 0, timeout=1)
+    receiver.bind()
+    sender = Connection("127.0.0.1", 0, timeout=1)
+    yield sender, receiver, receiver.socket.getsockname()
+    sender.close()
+    receiver.close()
+
+
+def test_recvfrom_reuses_its_buffer(pair):
+    sender, receiver, addr = pair
+    sender.sendto(b"first", addr)
+    sender.sendto(b"second", addr)
+    first, _ = receiver.recvfrom()
+    assert bytes(first) == b"first"
+    second, from_addr = receiver.recvfrom()
+    assert bytes(second) == b"second"
+    assert from_addr[1] == sender.socket.getsockname()[1]
+    # Same buffer: the first view now sees the second datagram
+    assert bytes(first) == b"secon"
+
+
+@pytest.mark.parametrize("recvmmsg", [True, False])
+def test_recv_batch_takes_every_queued_datagram(pair, monkeypatch, recvmmsg):
+    if recvmmsg and not batch.AVAILABLE:
+        pytest.skip("recvmmsg not available")
+    monkeypatch.setattr(batch, "AVAILABLE", recvmmsg)
+    sender, receiver, addr = pair
+    messages = [bytes([i]) * (i + 1) for i in range(5)]
+    sender.send_batch(messages, addr)
+    received = []
+    while len(received) < len(messages):
+        batch_received = receiver.recv_batch(quiet=True)
+        assert batch_received
+        received += [bytes(data) for data, _ in batch_received]
+    assert received == messages
+
+
+def test_recv_batch_times_out_empty(pair):
+    _, receiver, _ = pair
+    receiver.settimeout(0.05)
+    assert receiver.recv_batch(quiet=True) == []
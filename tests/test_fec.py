@@ -0,0 +1,128 @@
+import os
+import pytest
+from lib.segment import Segment
+from lib.compression import Compressor, decompress
+from lib.fec import ParityEncoder, ParityDecoder
+
+FIRST = 100
+
+
+def make_block(payloads, flags):
+    # Data segments as the session packs them, and their parity as the receiver unpacks it
+    encoder = ParityEncoder(ParityEncoder.MAX_K)
+    segments = []
+    for index, (payload, segment_flags) in enumerate(zip(payloads, flags)):
+        segment = Segment(seq_num=FIRST + index, flags=segment_flags, segment_type=Segment.FILEDATA, data=payload)
+        encoder.add(segment.seq_num, segment.pack_header(), segment.data)
+        segments.append(segment)
+    parity = Segment.from_bytes(encoder.parity().pack())
+    return segments, parity
+
+
+def mixed_block():
+    # Compressed and raw payloads of different lengths, one ending in zero bytes, a short last segment
+    compressor = Compressor("zlib")
+    text, _ = compressor.compress(b"abcd" * 300)
+    payloads = [os.urandom(1000), text, os.urandom(700) + bytes(24), os.urandom(1000), b"tail"]
+    flags = [0, Segment.COMPRESSED, 0, 0, 0]
+    return payloads, flags
+
+
+@pytest.mark.parametrize("lost", range(5))
+def test_recover_each_position(lost):
+    payloads, flags = mixed_block()
+    segments, parity = make_block(payloads, flags)
+    decoder = ParityDecoder()
+    # Before the loss: delivered in order, after it: held out of order
+    for segment in segments[:lost]:
+        decoder.keep(segment)
+    buffered = {segment.seq_num: segment for segment in segments[lost + 1:]}
+
+    recovered = decoder.recover(parity, FIRST + lost, buffered)
+
+    assert recovered is not None
+    assert recovered.seq_num == FIRST + lost
+    assert recovered.segment_type == Segment.FILEDATA
+    assert recovered.flags == flags[lost]
+    assert bytes(recovered.data) == payloads[lost]
+    assert (decoder.covered, decoder.missing) == (5, 1)
+
+
+def test_recovered_compressed_segment_decompresses():
+    payloads, flags = mixed_block()
+    segments, parity = make_block(payloads, flags)
+    decoder = ParityDecoder()
+    decoder.keep(segments[0])
+    recovered = decoder.recover(parity, FIRST + 1, {s.seq_num: s for s in segments[2:]})
+    # Round trip through the wire format too, like the client does with a rebuilt segment
+    unpacked = Segment.from_bytes(recovered.pack())
+    assert unpacked.flags & Segment.COMPRESSED
+    assert decompress("zlib", unpacked.data, 2000) == b"abcd" * 300
+
+
+def test_two_losses_need_arq():
+    payloads, flags = mixed_block()
+    segments, parity = make_block(payloads, flags)
+    decoder = ParityDecoder()
+    buffered = {segment.seq_num: segment for segment in segments[2:]}
+    assert decoder.recover(parity, FIRST, buffered) is None
+    assert decoder.missing == 2
+
+
+def test_nothing_lost():
+    payloads, flags = mixed_block()
+    segments, parity = make_block(payloads, flags)
+    decoder = ParityDecoder()
+    for segment in segments:
+        decoder.keep(segment)
+    assert decoder.recover(parity, FIRST + len(segments), {}) is None
+    assert decoder.missing == 0
+
+
+def test_history_too_short():
+    payloads, flags = mixed_block()
+    segments, parity = make_block(payloads, flags)
+    decoder = ParityDecoder()
+    for segment in segments[:2]:
+        decoder.keep(segment)
+    # Segment 100 was delivered so long ago it left the history
+    del decoder.delivered[FIRST]
+    buffered = {segment.seq_num: segment for segment in segments[3:]}
+    assert decoder.recover(parity, FIRST + 2, buffered) is None
+
+
+def test_history_is_bounded():
+    decoder = ParityDecoder()
+    for seq_num in range(3 * ParityDecoder.HISTORY):
+        decoder.keep(Segment(seq_num=seq_num, segment_type=Segment.FILEDATA, data=b"x"))
+    assert len(decoder.delivered) == ParityDecoder.HISTORY
+    # Metadata is never covered by parity
+    decoder.keep(Segment(seq_num=1000, segment_type=Segment.METADATA, data=b"name"))
+    assert 1000 not in decoder.delivered
+
+
+def test_block_fills_at_k_and_restarts():
+    encoder = ParityEncoder(ParityEncoder.MIN_K)
+    header = Segment(segment_type=Segment.FILEDATA).pack_header()
+    full = [encoder.add(seq_num, header, b"data") for seq_num in range(ParityEncoder.MIN_K)]
+    assert full == [False] * (ParityEncoder.MIN_K - 1) + [True]
+    assert encoder.holds(0)
+    parity = encoder.parity()
+    assert (parity.seq_num, parity.ack_num) == (0, ParityEncoder.MIN_K)
+    assert not encoder.holds(0)
+    assert encoder.parity() is None
+
+
+def test_k_follows_reported_loss():
+    encoder = ParityEncoder()
+    # Lossless reports grow the block, heavy loss shrinks it, always within MIN_K .. MAX_K
+    for covered in range(1000, 20001, 1000):
+        encoder.on_report(covered, 0)
+    assert encoder.k == ParityEncoder.MAX_K
+    for covered in range(21000, 40001, 1000):
+        encoder.on_report(covered, (covered - 20000) // 5)
+    assert encoder.k == ParityEncoder.MIN_K
+    # An older report overtaken by a newer one changes nothing
+    k, loss = encoder.k, encoder.loss
+    encoder.on_report(100, 0)
+    assert (encoder.k, encoder.loss) == (k, loss)
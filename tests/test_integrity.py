@@ -0,0 +1,69 @@
+import hashlib
+import os
+import pytest
+from lib.integrity import (StreamHasher, decode_digests, chunk_size_for, parse_fetch, MAX_CHUNKS,
+                           MIN_CHUNK_SIZE, DIGEST_SIZE, CHUNK_DIGEST_SIZE)
+from lib import pmtu
+from lib.segment import Segment
+
+CHUNK = 1000
+
+
+def hashed(data, chunk_size=CHUNK, piece=333):
+    # Fed in pieces that don't line up with chunk boundaries, like segment payloads
+    hasher = StreamHasher("sha256", chunk_size)
+    for offset in range(0, len(data), piece):
+        hasher.update(data[offset:offset + piece])
+    return hasher
+
+
+def test_whole_digest_is_plain_sha256():
+    data = os.urandom(5500)
+    assert hashed(data).digest() == hashlib.sha256(data).digest()
+
+
+def test_fin_payload_round_trip():
+    hasher = hashed(os.urandom(5500))
+    digest, chunks = decode_digests(hasher.encode())
+    assert digest == hasher.digest()
+    # 5 whole chunks and a short last one
+    assert len(chunks) == 6 and all(len(chunk) == CHUNK_DIGEST_SIZE for chunk in chunks)
+    assert decode_digests(b"") == (b"", [])
+
+
+def test_identical_data_has_no_bad_ranges():
+    data = os.urandom(5500)
+    assert hashed(data).bad_ranges(hashed(data).chunks) == []
+
+
+def test_bad_ranges_merge_adjacent_chunks_and_add_the_start():
+    data = bytearray(os.urandom(5500))
+    sent = hashed(bytes(data))
+    sent.digest()
+    for offset in (10, 1500, 2999, 5400):
+        data[offset] ^= 0xFF
+    received = hashed(bytes(data), piece=1024)
+    # Chunks 0, 1, 2 and 5 are bad, the first three become one range
+    assert received.bad_ranges(sent.chunks, start=7000) == [(7000, 10000), (12000, 13000)]
+
+
+def test_short_receive_marks_the_missing_chunks_bad():
+    data = os.urandom(5500)
+    sent = hashed(data)
+    sent.digest()
+    assert hashed(data[:2000]).bad_ranges(sent.chunks) == [(2000, 6000)]
+
+
+def test_chunk_digests_fit_one_fin():
+    assert chunk_size_for(10) == MIN_CHUNK_SIZE
+    size = 10 ** 11 + 7
+    assert -(-size // chunk_size_for(size)) <= MAX_CHUNKS
+    assert DIGEST_SIZE + MAX_CHUNKS * CHUNK_DIGEST_SIZE <= pmtu.BASE_SIZE - Segment.HEADER_SIZE
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("0-10", (0, 10)), ("5-6", (5, 6)), (None, None), ("", None), ("10-5", None), ("5-5", None),
+    ("-1-5", None), ("a-b", None), ("5", None),
+])
+def test_parse_fetch(value, expected):
+    assert parse_fetch(value) == expected
@@ -0,0 +1,65 @@
+import os
+import pytest
+from lib.manifest import Manifest, ManifestWriter, safe_path
+
+ROOT = os.path.join(os.sep, "tmp", "out")
+
+
+@pytest.mark.parametrize("name", [
+    "",
+    "../escape.txt",
+    "a/../../escape.txt",
+    "..\\escape.txt",
+    "a\\..\\..\\escape.txt",
+    "/etc/passwd",
+    "\\etc\\passwd",
+    "..",
+])
+def test_rejects_paths_outside_root(name):
+    assert safe_path(ROOT, name) is None
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("file.bin", "file.bin"),
+    ("dir/sub/file.bin", os.path.join("dir", "sub", "file.bin")),
+    ("dir\\file.bin", os.path.join("dir", "file.bin")),
+    ("dir/../file.bin", "file.bin"),
+    ("./file.bin", "file.bin"),
+])
+def test_keeps_paths_under_root(name, expected):
+    assert safe_path(ROOT, name) == os.path.join(ROOT, expected)
+
+
+def test_sibling_with_same_prefix_is_outside():
+    # /tmp/out-other starts with /tmp/out but is not under it
+    assert safe_path(ROOT, "../out-other/file.bin") is None
+
+
+def manifest_writer(root, entries):
+    writer = ManifestWriter(str(root))
+    writer.add_manifest(Manifest([(name, size, None) for name, size in entries]).encode())
+    return writer
+
+
+def test_writer_cuts_the_stream_into_files(tmp_path):
+    writer = manifest_writer(tmp_path, [("a.txt", 3), ("empty", 0), ("dir/b.txt", 4), ("last_empty", 0)])
+    writer.write(b"abc")
+    writer.write(b"defg")
+    writer.close()
+    assert (tmp_path / "a.txt").read_bytes() == b"abc"
+    assert (tmp_path / "dir" / "b.txt").read_bytes() == b"defg"
+    assert (tmp_path / "empty").read_bytes() == b""
+    # Nothing in the stream for trailing empty files, close creates them
+    assert (tmp_path / "last_empty").read_bytes() == b""
+
+
+def test_interrupted_writer_leaves_missing_files_out(tmp_path):
+    (tmp_path / "c.txt").write_bytes(b"older copy")
+    writer = manifest_writer(tmp_path, [("a.txt", 3), ("b.txt", 4), ("c.txt", 5), ("empty", 0)])
+    writer.write(b"abcde")
+    writer.close(completed=False)
+    assert (tmp_path / "a.txt").read_bytes() == b"abc"
+    # Partly received file stays as it is, the ones not reached are neither created nor truncated
+    assert (tmp_path / "b.txt").read_bytes() == b"de"
+    assert (tmp_path / "c.txt").read_bytes() == b"older copy"
+    assert not (tmp_path / "empty").exists()
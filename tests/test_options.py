@@ -0,0 +1,19 @@
+import pytest
+from lib.options import encode_options, decode_options
+
+
+def test_options_round_trip():
+    options = {"arq": "sr", "checksum": "crc32", "mss": 1472, "verify": "sha256"}
+    decoded = decode_options(encode_options(options))
+    assert decoded == {key: str(value) for key, value in options.items()}
+
+
+@pytest.mark.parametrize("data, expected", [
+    (b"", {}), (b"garbage", {}), (b"\xff\xfearq=sr", {"arq": "sr"}), (b"a=1;;junk;b=2", {"a": "1", "b": "2"}),
+])
+def test_decode_options_ignores_garbage(data, expected):
+    assert decode_options(data) == expected
+
+
+def test_decode_options_keeps_equals_in_value():
+    assert decode_options(b"resume_hash=ab=c") == {"resume_hash": "ab=c"}
@@ -0,0 +1,35 @@
+import errno
+from client import Client
+from lib import pmtu
+from lib.segment import Segment
+
+
+def test_candidates_end_with_base_size():
+    assert pmtu.candidates(32768) == [32768, 8972, 1472, 1464, 1252, pmtu.BASE_SIZE]
+    assert pmtu.candidates(1472) == [1472, 1464, 1252, pmtu.BASE_SIZE]
+
+
+def test_candidates_at_base_size():
+    # The negotiated mss never goes below BASE_SIZE, probing it alone still tells a too small path apart
+    assert pmtu.candidates(pmtu.BASE_SIZE) == [pmtu.BASE_SIZE]
+
+
+def test_is_too_big():
+    assert pmtu.is_too_big(OSError(errno.EMSGSIZE, "Message too long"))
+    assert not pmtu.is_too_big(OSError(errno.ECONNREFUSED, "Connection refused"))
+
+
+def test_client_window_counts_probed_segments():
+    client = Client(0, "127.0.0.1", 9, segment_size=32768)
+    try:
+        client._start_receive(None)
+        buffer = client.conn.receive_buffer_size()
+        assert client.advertised_window() == max(buffer // 32768, 1)
+        # The 32768 byte probe didn't make it, the server settles on 8972 at most
+        for size in (8972, 1472):
+            probe = Segment(seq_num=size, segment_type=Segment.PROBE, data=bytes(size - Segment.HEADER_SIZE))
+            client._on_datagram(probe.pack(client.algorithm))
+        assert client.segment_size == 8972
+        assert client.advertised_window() == max(buffer // 8972, 1)
+    finally:
+        client.conn.close()
@@ -0,0 +1,77 @@
+import json
+import time
+import pytest
+from lib.resume import Checkpoint, PrefixCheck, prefix_hash
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def output(tmp_path):
+    path = tmp_path / "out.bin"
+    path.write_bytes(DATA)
+    return str(path)
+
+
+def wait(check):
+    deadline = time.monotonic() + 5
+    while not check.done() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert check.done()
+
+
+def test_prefix_hash(output):
+    assert prefix_hash(output, 100) != prefix_hash(output, 101)
+    assert prefix_hash(output, 0) == prefix_hash(output, 0)
+    assert prefix_hash(output, len(DATA) + 1) is None
+
+
+def test_prefix_check_matches(output):
+    check = PrefixCheck(output, 500, prefix_hash(output, 500))
+    wait(check)
+    assert check.result() == 500
+
+
+@pytest.mark.parametrize("offset", [500, len(DATA) + 1])
+def test_prefix_check_starts_over_on_mismatch(output, offset):
+    # Different content, or a file shorter than the client's copy
+    check = PrefixCheck(output, offset, "0" * 64)
+    wait(check)
+    assert check.result() == 0
+
+
+def test_prefix_check_missing_file(tmp_path):
+    check = PrefixCheck(str(tmp_path / "gone.bin"), 10, "0" * 64)
+    wait(check)
+    assert check.result() == 0
+
+
+def test_checkpoint_round_trip(output):
+    checkpoint = Checkpoint(output)
+    assert checkpoint.load() is None
+    checkpoint.update(output, 1000, force=True)
+    assert Checkpoint(output).load() == (output, 1000)
+    checkpoint.remove()
+    assert Checkpoint(output).load() is None
+
+
+def test_checkpoint_writes_at_most_every_interval(output):
+    checkpoint = Checkpoint(output)
+    checkpoint.update(output, 1000, force=True)
+    checkpoint.update(output, 2000)
+    assert checkpoint.offset == 2000
+    assert Checkpoint(output).load() == (output, 1000)
+
+
+def test_checkpoint_never_claims_more_than_the_file(output):
+    checkpoint = Checkpoint(output)
+    checkpoint.update(output, len(DATA) * 2, force=True)
+    assert checkpoint.load() == (output, len(DATA))
+
+
+@pytest.mark.parametrize("content", ["not json", json.dumps({"output": "x"}), json.dumps([1, 2])])
+def test_broken_checkpoint_is_ignored(output, content):
+    checkpoint = Checkpoint(output)
+    with open(checkpoint.path, "w") as file:
+        file.write(content)
+    assert checkpoint.load() is None
@@ -0,0 +1,55 @@
+import pytest
+from lib.rtt import RttEstimator
+from lib.session import ServerSession
+from tests.test_session import CLIENT, FakeConn
+
+
+def test_first_sample_sets_srtt_and_rttvar():
+    rtt = RttEstimator()
+    assert rtt.rto == RttEstimator.INITIAL_RTO
+    rtt.sample(0.4)
+    assert rtt.srtt == 0.4
+    assert rtt.rttvar == 0.2
+    assert rtt.rto == pytest.approx(0.4 + 4 * 0.2)
+
+
+def test_later_samples_are_smoothed():
+    rtt = RttEstimator()
+    rtt.sample(0.4)
+    rtt.sample(0.8)
+    assert rtt.rttvar == pytest.approx(0.75 * 0.2 + 0.25 * 0.4)
+    assert rtt.srtt == pytest.approx(0.875 * 0.4 + 0.125 * 0.8)
+    assert rtt.rto == pytest.approx(rtt.srtt + 4 * rtt.rttvar)
+
+
+def test_rto_is_clamped():
+    rtt = RttEstimator()
+    for _ in range(20):
+        rtt.sample(0.001)
+    assert rtt.rto == RttEstimator.MIN_RTO
+    for _ in range(20):
+        rtt.backoff()
+    assert rtt.rto == RttEstimator.MAX_RTO
+
+
+def test_backoff_doubles_the_timeout():
+    rtt = RttEstimator()
+    rtt.sample(1.0)
+    rto = rtt.rto
+    rtt.backoff()
+    assert rtt.rto == 2 * rto
+
+
+def test_retransmitted_segment_gives_no_sample(tmp_path):
+    path = tmp_path / "source.bin"
+    path.write_bytes(bytes(1024))
+    session = ServerSession(FakeConn(), CLIENT, 77, str(path))
+    # Karn: segment 1 went out twice, its ACK can't tell which copy it acks
+    session._mark_sent(1, 100)
+    session._mark_sent(1, 100)
+    session._sample_rtt(1)
+    assert session.rtt.srtt is None
+    session._mark_sent(2, 100)
+    session._sample_rtt(2)
+    assert session.rtt.srtt is not None
+    assert session.send_times == {}
@@ -0,0 +1,57 @@
+import pytest
+from lib.checksum import CHECKSUMS
+from lib.segment import Segment
+
+FIELDS = ("seq_num", "ack_num", "flags", "segment_type", "window", "checksum")
+
+
+def segment(data=b"payload"):
+    return Segment(seq_num=0xFFFFFFFF, ack_num=7, flags=Segment.ACK | Segment.COMPRESSED,
+                   segment_type=Segment.FILEDATA, data=data, window=0xFFFF)
+
+
+def fields(unpacked):
+    return [getattr(unpacked, name) for name in FIELDS]
+
+
+@pytest.mark.parametrize("name", [None] + sorted(CHECKSUMS))
+def test_pack_unpack_round_trip(name):
+    algorithm = CHECKSUMS[name] if name else None
+    sent = segment()
+    data = sent.pack(algorithm)
+    assert len(data) == Segment.HEADER_SIZE + len(b"payload")
+    received = Segment.from_bytes(data)
+    assert fields(received) == fields(sent)
+    assert bytes(received.data) == b"payload"
+    assert received.validate_checksum(algorithm)
+
+
+def test_pack_into_matches_pack():
+    buffer = bytearray(100)
+    length = segment().pack_into(buffer, offset=10)
+    assert bytes(buffer[10:10 + length]) == segment().pack()
+    assert segment().pack_header() == segment().pack()[:Segment.HEADER_SIZE]
+
+
+def test_unpack_header_without_a_segment():
+    data = segment().pack()
+    assert list(Segment.unpack_header(data)) == fields(Segment.from_bytes(data))
+
+
+def test_unpack_into_a_reused_segment():
+    scratch = Segment()
+    scratch.unpack(segment(b"first, longer payload").pack())
+    scratch.unpack(segment(b"").pack())
+    assert bytes(scratch.data) == b""
+    assert scratch.validate_checksum()
+
+
+def test_flipped_bit_fails_the_checksum():
+    data = bytearray(segment().pack())
+    data[-1] ^= 0x01
+    assert not Segment.from_bytes(data).validate_checksum()
+
+
+def test_no_instance_dict():
+    with pytest.raises(AttributeError):
+        segment().extra = 1
@@ -0,0 +1,71 @@
+import pytest
+from lib.segment import Segment
+from lib.session import ServerSession
+from server import Server
+from tests.test_session import FakeConn
+
+A, B, C = ("127.0.0.1", 9101), ("127.0.0.1", 9102), ("127.0.0.1", 9103)
+
+
+class QueueConn(FakeConn):
+    """FakeConn whose recv_batch hands out the datagrams queued with deliver"""
+    def __init__(self):
+        super().__init__()
+        self.queued = []
+
+    def deliver(self, segment, addr):
+        self.queued.append((segment.pack(), addr))
+
+    def recv_batch(self, max_n=64, quiet=False):
+        queued, self.queued = self.queued, []
+        return queued
+
+
+@pytest.fixture
+def server():
+    server = Server("127.0.0.1", 0, cache_size=0)
+    server.conn.close()
+    server.conn = QueueConn()
+    return server
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "source.bin"
+    path.write_bytes(bytes(range(256)) * 40)
+    return str(path)
+
+
+def handshake_ack(seq_num):
+    return Segment(seq_num=seq_num + 1, ack_num=1, flags=Segment.ACK, window=64)
+
+
+def test_each_client_gets_its_own_session(server, source_file):
+    sessions = {}
+    server._open_session(sessions, A, 10, {}, source_file)
+    server._open_session(sessions, B, 20, {}, source_file)
+    # One SYN ACK each, acking its own SYN
+    assert [segment.ack_num for segment in server.conn.segments(A)] == [11]
+    assert [segment.ack_num for segment in server.conn.segments(B)] == [21]
+
+    # Only A finishes its handshake, B is still waiting while A's data goes out
+    server.conn.deliver(handshake_ack(10), A)
+    server._dispatch(sessions, source_file)
+    assert sessions[A].state == ServerSession.TRANSFER
+    assert sessions[B].state == ServerSession.HANDSHAKE
+    assert any(segment.segment_type == Segment.FILEDATA for segment in server.conn.segments(A))
+    assert not any(segment.segment_type == Segment.FILEDATA for segment in server.conn.segments(B))
+
+    server.conn.deliver(handshake_ack(20), B)
+    server._dispatch(sessions, source_file)
+    assert sessions[B].state == ServerSession.TRANSFER
+
+
+def test_segment_from_unknown_client_is_ignored(server, source_file):
+    sessions = {}
+    server._open_session(sessions, A, 10, {}, source_file)
+    server.conn.deliver(handshake_ack(10), C)
+    server._dispatch(sessions, source_file)
+    assert list(sessions) == [A]
+    assert sessions[A].state == ServerSession.HANDSHAKE
+    assert server.conn.segments(C) == []
@@ -0,0 +1,51 @@
+import pytest
+from lib.segment import Segment
+from lib.session import ServerSession
+
+CLIENT = ("127.0.0.1", 9101)
+SYN_SEQ_NUM = 77
+
+
+class FakeConn:
+    """Send side of a connection that keeps every datagram instead of sending it"""
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, message, addr):
+        self.sent.append((bytes(message), addr))
+
+    def send_batch(self, messages, addr):
+        for message in messages:
+            self.sendto(b"".join(message) if isinstance(message, (list, tuple)) else message, addr)
+
+    def segments(self, addr=CLIENT):
+        return [Segment.from_bytes(data) for data, to in self.sent if to == addr]
+
+
+def handshake_ack():
+    # Packed like the client does (Sender.send_ack_segment): always the default checksum
+    return Segment.from_bytes(Segment(seq_num=SYN_SEQ_NUM + 1, ack_num=1, flags=Segment.ACK, window=64).pack())
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "source.bin"
+    path.write_bytes(bytes(range(256)) * 40)
+    return str(path)
+
+
+def test_repeated_handshake_ack_is_not_a_bad_checksum(source_file):
+    conn = FakeConn()
+    session = ServerSession(conn, CLIENT, SYN_SEQ_NUM, source_file,
+                            options={"arq": Segment.GO_BACK_N, "checksum": "crc32", "mss": 1200})
+    session.start()
+    session.on_segment(handshake_ack())
+    assert session.state == ServerSession.TRANSFER
+    session.pump()
+    sent = len(conn.sent)
+
+    # A late duplicate SYN ACK made the client send its handshake ACK again
+    session.on_segment(handshake_ack())
+    assert session.metrics.checksum_failures == 0
+    assert session.state == ServerSession.TRANSFER
+    assert len(conn.sent) == sent
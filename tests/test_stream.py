@@ -0,0 +1,82 @@
+import io
+import pytest
+from lib.segment import Segment
+from lib.session import ServerSession
+from lib.source import StreamSource, open_source
+from lib.stream import Stream, StreamWriter
+from tests.test_session import CLIENT, SYN_SEQ_NUM, FakeConn, handshake_ack
+
+DATA = bytes(range(256)) * 4
+
+
+def chunks():
+    # Uneven chunks with empty ones in between, none of them segment aligned
+    yield DATA[:100]
+    yield b""
+    yield DATA[100:101]
+    yield bytearray(DATA[101:700])
+    yield b""
+    yield DATA[700:]
+
+
+@pytest.mark.parametrize("source", [lambda: io.BytesIO(DATA), chunks])
+def test_stream_reads_full_pieces(source):
+    stream = Stream(source())
+    pieces = iter(lambda: stream.read(300), b"")
+    assert [len(piece) for piece in pieces] == [300, 300, 300, len(DATA) - 900]
+    assert stream.read(300) == b""
+
+
+def test_stream_source_cuts_segments():
+    source = open_source(Stream(chunks(), name="gen"), 300)
+    assert isinstance(source, StreamSource)
+    assert source.segment_data(0) == (b"gen", Segment.METADATA)
+    # Reading ahead to segment 3 keeps 1 and 2 around
+    assert source.segment_data(3) == (DATA[600:900], Segment.FILEDATA)
+    assert source.segment_data(1) == (DATA[:300], Segment.FILEDATA)
+    assert source.segment_data(4) == (DATA[900:], Segment.FILEDATA)
+    assert source.segment_data(5) == (b"", Segment.FILEDATA)
+
+
+def test_released_segments_are_dropped():
+    source = StreamSource(Stream(io.BytesIO(DATA)), 300)
+    source.segment_data(3)
+    source.release(3)
+    assert source.segment_data(3) == (DATA[600:900], Segment.FILEDATA)
+    with pytest.raises(ValueError):
+        source.segment_data(2)
+    assert list(source._segments) == [3]
+
+
+def test_release_past_what_was_read():
+    source = StreamSource(Stream(io.BytesIO(DATA)), 300)
+    source.segment_data(1)
+    source.release(10)
+    # Nothing read past segment 1 is skipped
+    assert source.segment_data(2) == (DATA[300:600], Segment.FILEDATA)
+
+
+@pytest.mark.parametrize("buffer_size, capacity", [(8 << 20, (8 << 20) // 1458), (3000, 2), (100, 1)])
+def test_capacity_in_segments(buffer_size, capacity):
+    assert StreamSource(Stream(io.BytesIO(DATA), buffer_size=buffer_size), 1458).capacity == capacity
+
+
+def test_writer_copies_each_payload():
+    received = []
+    writer = StreamWriter(received.append)
+    buffer = bytearray(b"first")
+    writer.write(memoryview(buffer))
+    buffer[:] = b"again"
+    assert received == [b"first"]
+    assert writer.written == 5
+
+
+def test_session_window_stops_at_the_buffer():
+    conn = FakeConn()
+    stream = Stream(io.BytesIO(DATA * 10), buffer_size=2 * (1200 - Segment.HEADER_SIZE))
+    session = ServerSession(conn, CLIENT, SYN_SEQ_NUM, stream, options={"mss": 1200})
+    session.start()
+    session.on_segment(handshake_ack())
+    session.pump()
+    # Window of capacity (2) segments from the base: metadata + the first data segment, the rest waits for ACKs
+    assert [segment.seq_num for segment in conn.segments() if not segment.flags & Segment.SYN] == [0, 1]
@@ -0,0 +1,24 @@
+import pytest
+from lib.stripe import stripe_range, parse_stripe
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("0/1", (0, 1)), ("3/4", (3, 4)),
+    (None, None), ("", None), ("1", None), ("4/4", None), ("-1/4", None), ("0/0", None), ("a/b", None),
+])
+def test_parse_stripe(value, expected):
+    assert parse_stripe(value) == expected
+
+
+@pytest.mark.parametrize("size, count, segment_size", [
+    (0, 3, 100), (1, 3, 100), (999, 4, 100), (1000, 4, 100), (10 ** 7 + 13, 7, 1458), (250, 8, 100),
+])
+def test_stripes_cover_the_file_on_segment_boundaries(size, count, segment_size):
+    ranges = [stripe_range(size, index, count, segment_size) for index in range(count)]
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == size
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    for start, end in ranges:
+        assert start <= end
+        assert start % segment_size == 0 or start == size
@@ -0,0 +1,82 @@
+import errno
+import os
+import pytest
+from lib import writer
+from lib.writer import WriteBehind
+
+SIZE = 1024
+DATA = bytes(range(256)) * 20
+
+
+class DiskFull:
+    """os.write stand-in: writes until `room` bytes are on disk (a short write at the end), then ENOSPC"""
+    def __init__(self, room):
+        self.room = room
+        self.write = os.write
+
+    def __call__(self, fd, data):
+        if self.room <= 0:
+            raise OSError(errno.ENOSPC, "No space left on device")
+        written = self.write(fd, bytes(data[:self.room]))
+        self.room -= written
+        return written
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_round_trip(tmp_path, threaded):
+    path = tmp_path / "out.bin"
+    file = WriteBehind(open(path, "wb", buffering=0), size=SIZE, threaded=threaded)
+    for start in range(0, len(DATA), 100):
+        file.write(DATA[start:start + 100])
+    file.close()
+    assert path.read_bytes() == DATA
+    assert file.writes == -(-len(DATA) // SIZE)
+    assert file.on_disk == len(DATA)
+
+
+def test_starts_at_the_current_offset(tmp_path):
+    path = tmp_path / "out.bin"
+    path.write_bytes(b"prefix")
+    raw = open(path, "r+b", buffering=0)
+    raw.seek(6)
+    file = WriteBehind(raw, size=SIZE)
+    file.write(b"tail")
+    file.close()
+    assert path.read_bytes() == b"prefixtail"
+    assert file.on_disk == 10
+
+
+def test_partial_write_is_not_written_again(tmp_path, monkeypatch):
+    path = tmp_path / "out.bin"
+    file = WriteBehind(open(path, "wb", buffering=0), size=SIZE)
+    # First buffer fine, the second one gets 100 bytes out before the disk fills up
+    monkeypatch.setattr(writer.os, "write", DiskFull(SIZE + 100))
+    with pytest.raises(OSError):
+        file.write(DATA[:2 * SIZE])
+    with pytest.raises(OSError):
+        file.flush()
+    with pytest.raises(OSError):
+        file.write(b"more")
+    with pytest.raises(OSError):
+        file.close()
+    assert file.on_disk == SIZE + 100
+    assert path.read_bytes() == DATA[:SIZE + 100]
+
+
+def test_thread_stops_at_the_failed_buffer(tmp_path, monkeypatch):
+    path = tmp_path / "out.bin"
+    monkeypatch.setattr(writer.os, "write", DiskFull(SIZE))
+    file = WriteBehind(open(path, "wb", buffering=0), size=SIZE, threaded=True)
+    try:
+        # Buffer 2 fails, buffer 3 must not take its place in the file
+        file.write(DATA[:2 * SIZE])
+        with pytest.raises(OSError):
+            file.write(DATA[2 * SIZE:4 * SIZE])
+            file.flush()
+        with pytest.raises(OSError):
+            file.flush()
+    finally:
+        with pytest.raises(OSError):
+            file.close()
+    assert file.on_disk == SIZE
+    assert path.read_bytes() == DATA[:SIZE]